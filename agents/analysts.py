@@ -1,9 +1,14 @@
 """
 分析师智能体
-包括：技术分析师、基本面分析师、新闻分析师
+包括：技术分析师、基本面分析师、新闻分析师、行业分析师
 """
-from typing import Dict, Any
+from typing import Dict, Any, List
 from .llm_client import DeepSeekClient
+from .prompt_builder import build_messages, render_peer_valuation
+from data.models import StockData
+from data.news_cache import NewsArticleCache, article_id
+from data.peer_valuation import PeerValuation
+from data.financial_cache import FinancialCache
 import json
 
 class TechnicalAnalyst:
@@ -13,45 +18,12 @@ class TechnicalAnalyst:
         self.llm = llm_client
         self.role = "技术分析师"
         
-    def analyze(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze(self, stock_data: StockData) -> Dict[str, Any]:
         """技术面分析"""
         print(f"\n📈 {self.role}正在分析...")
         
-        # 准备数据
-        ts_code = stock_data.get('ts_code', 'N/A')
-        basic_info = stock_data.get('basic_info', {}) or {}
-        daily_data = stock_data.get('daily_data', []) or []
-        realtime_quote = stock_data.get('realtime_quote', {}) or {}
-        intraday_data = stock_data.get('intraday_data', []) or []
-        is_trading_time = stock_data.get('is_trading_time', False)
-        
-        # 构建分析输入
-        data_summary = f"""
-股票代码: {ts_code}
-股票名称: {basic_info.get('name', 'N/A')}
-所属行业: {basic_info.get('industry', 'N/A')}
-数据获取时间: {stock_data.get('fetch_time', 'N/A')}
-是否交易时间: {'是' if is_trading_time else '否'}
-
-最新行情:
-- 收盘价: {realtime_quote.get('close', 'N/A')}
-- 涨跌幅: {realtime_quote.get('pct_chg', 'N/A')}%
-- 成交量: {realtime_quote.get('vol', 'N/A')}手
-- 成交额: {realtime_quote.get('amount', 'N/A')}千元
-
-近期行情数据（最近10个交易日）:
-{json.dumps(daily_data[-10:] if len(daily_data) > 10 else daily_data, ensure_ascii=False, indent=2)}
-"""
-        
-        # 如果有盘中数据，添加到分析中
-        if intraday_data:
-            data_summary += f"""
-
-盘中数据（最近1小时）:
-{json.dumps(intraday_data[-10:] if len(intraday_data) > 10 else intraday_data, ensure_ascii=False, indent=2)}
-"""
-        
-        system_prompt = """你是一位资深的股票技术分析师，擅长通过技术指标和K线形态判断股票走势。
+        # 行情、盘中数据已包含在共享的股票上下文中
+        role_prompt = """你是一位资深的股票技术分析师，擅长通过技术指标和K线形态判断股票走势。
 
 请基于提供的行情数据，进行全面的技术分析，包括：
 1. 价格趋势分析（上升/下降/震荡）
@@ -71,7 +43,7 @@ class TechnicalAnalyst:
     "summary": "技术面总结"
 }"""
         
-        response = self.llm.analyze_with_system_prompt(system_prompt, data_summary)
+        response = self.llm.chat(build_messages(stock_data, role_prompt), profile='technical')
         result = self.llm.parse_json_response(response)
         
         print(f"✅ 技术分析完成，评分: {result.get('technical_score', 'N/A')}/10")
@@ -79,42 +51,48 @@ class TechnicalAnalyst:
 
 
 class FundamentalAnalyst:
-    """基本面分析师"""
+    """基本面分析师
     
-    def __init__(self, llm_client: DeepSeekClient):
+    提供 peer_valuation 时，提示词附带该股在同行业中的 ROE、利润率、杠杆和估值百分位；
+    提供 financial_cache 时，报告期和同业估值截面日期均未变化则直接复用上次的分析结论
+    """
+    
+    def __init__(self, llm_client: DeepSeekClient, peer_valuation: PeerValuation = None,
+                 financial_cache: FinancialCache = None):
         self.llm = llm_client
         self.role = "基本面分析师"
+        self.peer_valuation = peer_valuation
+        self.financial_cache = financial_cache
         
-    def analyze(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze(self, stock_data: StockData) -> Dict[str, Any]:
         """基本面分析"""
         print(f"\n💰 {self.role}正在分析...")
         
-        ts_code = stock_data.get('ts_code', 'N/A')
-        basic_info = stock_data.get('basic_info', {}) or {}
-        financial_data = stock_data.get('financial_data', {}) or {}
-        financial_indicators = stock_data.get('financial_indicators', []) or []
+        peer_context, valuation_date = '', ''
+        if self.peer_valuation is not None:
+            peer = self.peer_valuation.compare(stock_data.ts_code, stock_data.industry)
+            if peer:
+                peer_context = render_peer_valuation(peer)
+                valuation_date = peer.get('trade_date', '')
         
-        data_summary = f"""
-股票代码: {ts_code}
-股票名称: {basic_info.get('name', 'N/A')}
-所属行业: {basic_info.get('industry', 'N/A')}
-上市日期: {basic_info.get('list_date', 'N/A')}
-
-财务数据:
-{json.dumps(financial_data, ensure_ascii=False, indent=2)}
-
-财务指标:
-{json.dumps(financial_indicators, ensure_ascii=False, indent=2)}
-"""
+        # 结论依赖同业估值百分位，估值截面更新后也需重新分析
+        period = stock_data.financial_period
+        if self.financial_cache is not None and period and not stock_data.financial_updated:
+            cached = self.financial_cache.fundamental(stock_data.ts_code, period, valuation_date)
+            if cached:
+                print(f"✅ 报告期 {period} 与同业估值无变化，复用基本面结论，"
+                      f"评分: {cached.get('fundamental_score', 'N/A')}/10")
+                return cached
         
-        system_prompt = """你是一位资深的基本面分析师，擅长通过财务报表和财务指标评估公司价值。
+        # 财务数据、财务指标已包含在共享的股票上下文中
+        role_prompt = """你是一位资深的基本面分析师，擅长通过财务报表和财务指标评估公司价值。
 
 请基于提供的财务数据，进行全面的基本面分析，包括：
 1. 盈利能力分析（营收、净利润增长）
 2. 财务健康度（资产负债率、流动比率）
 3. 盈利质量（ROE、ROA、毛利率）
 4. 现金流状况
-5. 估值水平判断
+5. 估值水平判断（如提供了同业对比，结合行业百分位判断相对估值和竞争地位）
 6. 基本面评分（1-10分）
 
 请以JSON格式输出，包含以下字段：
@@ -128,27 +106,39 @@ class FundamentalAnalyst:
     "summary": "基本面总结"
 }"""
         
-        response = self.llm.analyze_with_system_prompt(system_prompt, data_summary)
+        response = self.llm.chat(build_messages(stock_data, role_prompt, peer_context), profile='fundamental')
         result = self.llm.parse_json_response(response)
         
+        if self.financial_cache is not None and period and 'raw_response' not in result:
+            self.financial_cache.save_fundamental(stock_data.ts_code, period, result, valuation_date)
+        
         print(f"✅ 基本面分析完成，评分: {result.get('fundamental_score', 'N/A')}/10")
         return result
 
 
 class NewsAnalyst:
-    """新闻分析师"""
+    """新闻分析师
+
+    每篇新闻只由模型分类一次并写入文章缓存，个股新闻面结论由缓存中的逐篇结果聚合得出
+    """
     
-    def __init__(self, llm_client: DeepSeekClient):
+    # 单次分类请求的文章数上限
+    CLASSIFY_BATCH_SIZE = 20
+    # 分类输出按文章数预留 tokens（每篇逐条 JSON 约 100 tokens），另加外层结构的余量
+    TOKENS_PER_ARTICLE = 120
+    CLASSIFY_TOKEN_OVERHEAD = 200
+    SENTIMENT_VALUES = {"积极": 1, "中性": 0, "消极": -1}
+    
+    def __init__(self, llm_client: DeepSeekClient, article_cache: NewsArticleCache = None):
         self.llm = llm_client
         self.role = "新闻分析师"
+        self.article_cache = article_cache or NewsArticleCache()
         
-    def analyze(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze(self, stock_data: StockData) -> Dict[str, Any]:
         """新闻面分析"""
         print(f"\n📰 {self.role}正在分析...")
         
-        ts_code = stock_data.get('ts_code', 'N/A')
-        basic_info = stock_data.get('basic_info', {}) or {}
-        news_data = stock_data.get('news', []) or []
+        news_data = stock_data.news
         
         if not news_data:
             print("⚠️ 没有新闻数据，跳过新闻分析")
@@ -160,36 +150,167 @@ class NewsAnalyst:
                 "summary": "近期无重大新闻，市场情绪中性"
             }
         
-        data_summary = f"""
-股票代码: {ts_code}
-股票名称: {basic_info.get('name', 'N/A')}
+        # 只把未见过的文章发给模型
+        unseen = self.article_cache.missing(news_data)
+        print(f"   新闻 {len(news_data)} 条，缓存命中 {len(news_data) - len(unseen)} 条，待分类 {len(unseen)} 条")
+        for i in range(0, len(unseen), self.CLASSIFY_BATCH_SIZE):
+            self._classify(unseen[i:i + self.CLASSIFY_BATCH_SIZE])
+        
+        result = self._aggregate(stock_data, news_data)
+        
+        print(f"✅ 新闻分析完成，情绪: {result.get('sentiment', 'N/A')}, 评分: {result.get('news_score', 'N/A')}/10")
+        return result
+    
+    def _classify(self, articles: List[Dict[str, Any]]):
+        """批量分类文章（与具体股票无关，结果可被所有股票复用）"""
+        ids = [article_id(a) for a in articles]
+        payload = [
+            {"id": key, "title": a.get('title', ''), "content": str(a.get('content', ''))[:300]}
+            for key, a in zip(ids, articles)
+        ]
+        
+        role_prompt = """你是一位资深的财经新闻分析师，负责对新闻逐条做结构化分类。
 
-近期相关新闻:
-{json.dumps(news_data[:10], ensure_ascii=False, indent=2)}
-"""
+对每条新闻给出：
+1. sentiment: 对所涉及公司/行业的情绪（积极/中性/消极）
+2. importance: 对A股市场的重要程度（1-5分）
+3. companies: 提及的上市公司名称列表
+4. tickers: 提及的A股代码列表（如 600547.SH），没有则为空
+5. industries: 涉及的行业或商品（如 黄金、铜、铝、稀土）
+6. event: 一句话事件概括
+
+请以JSON格式输出：
+{
+    "articles": [
+        {"id": "新闻id", "sentiment": "积极/中性/消极", "importance": 1-5, "companies": [], "tickers": [], "industries": [], "event": "事件概括"}
+    ]
+}"""
+        
+        response = self.llm.analyze_with_system_prompt(
+            role_prompt, json.dumps(payload, ensure_ascii=False), profile='news_triage',
+            max_tokens=len(articles) * self.TOKENS_PER_ARTICLE + self.CLASSIFY_TOKEN_OVERHEAD
+        )
+        parsed = self.llm.parse_json_response(response)
+        
+        verdicts = {}
+        for item in parsed.get('articles', []) if isinstance(parsed, dict) else []:
+            if isinstance(item, dict) and item.get('id') in ids:
+                verdicts[item['id']] = item
+        self.article_cache.put_many(verdicts)
         
-        system_prompt = """你是一位资深的新闻分析师，擅长从新闻和舆情中判断市场情绪和事件影响。
+        if len(verdicts) < len(ids):
+            print(f"⚠️ {len(ids) - len(verdicts)} 条新闻分类失败，下次运行将重试")
+    
+    @staticmethod
+    def _importance(verdict: Dict[str, Any]) -> int:
+        try:
+            return int(verdict.get('importance', 0))
+        except (TypeError, ValueError):
+            return 0
+    
+    def _aggregate(self, stock_data: StockData, news_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """按与个股的相关度加权聚合逐篇结果"""
+        name = stock_data.name if stock_data.name != 'N/A' else ''
+        industry = stock_data.industry if stock_data.industry != 'N/A' else ''
+        code = stock_data.ts_code
+        
+        weighted = []
+        for article in news_data:
+            verdict = self.article_cache.get(article_id(article))
+            if not verdict:
+                continue
+            
+            if code in verdict.get('tickers', []) or (name and any(name in c for c in verdict.get('companies', []))):
+                relevance = 1.0
+            elif industry and any(industry in i or i in industry for i in verdict.get('industries', []) if i):
+                relevance = 0.5
+            elif self._importance(verdict) >= 4:
+                relevance = 0.2  # 重大宏观新闻
+            else:
+                continue
+            weighted.append((relevance, verdict))
+        
+        if not weighted:
+            return {
+                "sentiment": "中性",
+                "key_events": "无直接相关的重大新闻",
+                "impact_analysis": "近期新闻与该股关联度低，无明显影响",
+                "risk_assessment": "低",
+                "news_score": 5,
+                "summary": "近期无直接相关新闻，市场情绪中性",
+                "relevant_articles": 0
+            }
+        
+        total = sum(w for w, _ in weighted)
+        mean = sum(w * self.SENTIMENT_VALUES.get(v.get('sentiment'), 0) for w, v in weighted) / total
+        sentiment = "积极" if mean > 0.2 else "消极" if mean < -0.2 else "中性"
+        score = max(1, min(10, round(5 + 4 * mean)))
+        
+        ranked = sorted(weighted, key=lambda x: x[0] * max(self._importance(x[1]), 1), reverse=True)
+        key_events = [f"[{v.get('sentiment', '中性')}] {v.get('event', '')}" for _, v in ranked[:3]]
+        direct = sum(1 for w, _ in weighted if w == 1.0)
+        negative = [v for w, v in weighted if v.get('sentiment') == '消极' and w >= 0.5]
+        
+        return {
+            "sentiment": sentiment,
+            "key_events": "；".join(key_events),
+            "impact_analysis": f"相关新闻 {len(weighted)} 条（直接提及 {direct} 条），加权情绪 {mean:+.2f}",
+            "risk_assessment": "高" if len(negative) >= 2 else "中" if negative else "低",
+            "news_score": score,
+            "summary": f"{name}近期新闻面{sentiment}，" + (key_events[0] if key_events else ""),
+            "relevant_articles": len(weighted)
+        }
+
+
+class SectorAnalyst:
+    """行业分析师
 
-请基于提供的新闻数据，进行全面的新闻面分析，包括：
-1. 市场情绪分析（积极/中性/消极）
-2. 关键事件识别
-3. 事件影响程度
-4. 舆情风险评估
-5. 新闻面评分（1-10分，10分表示极度利好）
+    批量分析时每个行业只分析一次，结论作为共享的行业背景注入该行业所有股票的提示词
+    """
+    
+    def __init__(self, llm_client: DeepSeekClient):
+        self.llm = llm_client
+        self.role = "行业分析师"
+        
+    def analyze(self, industry: str, members: List[Dict[str, Any]],
+                news: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """行业背景分析"""
+        print(f"\n🏭 {self.role}正在分析行业: {industry}（{len(members)} 只股票）...")
+        
+        role_prompt = """你是一位资深的A股行业研究员，负责为同一行业的多只股票提供共享的行业背景判断。
+
+请基于行业名称、成分股和近期新闻，分析：
+1. 行业景气度和所处周期
+2. 相关大宗商品或上游原材料价格走势（如有）
+3. 政策与宏观环境影响
+4. 行业主要驱动因素和风险
+5. 行业整体评分（1-10分）
+
+只分析行业层面的共性因素，不评价单只股票。
 
 请以JSON格式输出，包含以下字段：
 {
-    "sentiment": "市场情绪(积极/中性/消极)",
-    "key_events": "关键事件总结",
-    "impact_analysis": "影响分析",
-    "risk_assessment": "舆情风险",
-    "news_score": 新闻面评分(1-10),
-    "summary": "新闻面总结"
+    "industry": "行业名称",
+    "cycle": "景气度与周期判断",
+    "commodity_outlook": "商品/原材料价格展望",
+    "macro_policy": "政策与宏观影响",
+    "drivers": ["主要驱动因素"],
+    "risks": ["主要风险"],
+    "sector_score": 行业评分(1-10),
+    "summary": "行业背景总结"
 }"""
         
-        response = self.llm.analyze_with_system_prompt(system_prompt, data_summary)
+        user_input = f"""行业: {industry}
+
+成分股:
+{json.dumps([{k: m.get(k) for k in ('ts_code', 'name', 'area', 'market')} for m in members], ensure_ascii=False)}
+
+近期新闻:
+{json.dumps([{"title": n.get('title', ''), "content": str(n.get('content', ''))[:200]} for n in news[:10]], ensure_ascii=False)}
+"""
+        
+        response = self.llm.analyze_with_system_prompt(role_prompt, user_input, profile='sector')
         result = self.llm.parse_json_response(response)
         
-        print(f"✅ 新闻分析完成，情绪: {result.get('sentiment', 'N/A')}, 评分: {result.get('news_score', 'N/A')}/10")
+        print(f"✅ 行业分析完成，评分: {result.get('sector_score', 'N/A')}/10")
         return result
-
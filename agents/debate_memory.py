@@ -0,0 +1,156 @@
+"""
+辩论记忆与收敛检测
+早期轮次滚动压缩为有界摘要，只保留最近一次交锋（双方各一次发言）原文，使每轮提示词长度基本恒定。
+摘要在每轮结束时更新：放得下时直接摘录，超出长度上限才调用一次LLM压缩
+"""
+from collections import deque
+from typing import Dict, Any, List
+from .llm_client import DeepSeekClient
+import json
+
+# 压缩进摘要时保留的观点字段
+VIEW_KEYS = (
+    'bull_points', 'catalysts', 'buy_thesis', 'bull_confidence',
+    'bear_points', 'negative_catalysts', 'sell_thesis', 'bear_confidence',
+    'summary',
+)
+
+
+def compact_view(view: Dict[str, Any], max_chars: int = 1200) -> str:
+    """初始观点只保留核心字段，避免每轮重复发送完整JSON"""
+    compact = {k: view[k] for k in VIEW_KEYS if k in view} or view
+    text = json.dumps(compact, ensure_ascii=False)
+    return text if len(text) <= max_chars else text[:max_chars] + '…'
+
+
+class DebateMemory:
+    """辩论记忆"""
+
+    def __init__(self, llm_client: DeepSeekClient, max_digest_chars: int = 800,
+                 max_turn_chars: int = 2000):
+        self.llm = llm_client
+        self.max_digest_chars = max_digest_chars
+        self.max_turn_chars = max_turn_chars
+
+        self.digest = ''
+        self.recent = deque(maxlen=2)
+        self.evicted: List[Dict[str, Any]] = []  # 移出最近一次交锋、尚未并入摘要的发言（至多一轮）
+        self.turns: List[Dict[str, Any]] = []
+        self.fold_calls = 0  # 压缩摘要的LLM调用次数
+
+    def add(self, round_num: int, speaker: str, content: str):
+        """记录一次发言；超出最近一次交锋的旧发言在本轮结束时并入摘要"""
+        if len(self.recent) == self.recent.maxlen:
+            self.evicted.append(self.recent[0])
+        turn = {"round": round_num, "speaker": speaker, "content": content}
+        self.recent.append(turn)
+        self.turns.append(turn)
+
+    def end_round(self):
+        """一轮结束（且还有下一轮）时把移出的发言并入摘要，每轮至多一次LLM调用"""
+        if not self.evicted:
+            return
+        extract = self._extract(self.evicted)
+        self.digest = extract if len(extract) <= self.max_digest_chars else self._fold(self.evicted)
+        self.evicted = []
+
+    def context(self) -> str:
+        """供下一轮使用的辩论上下文：摘要 + 最近一次交锋原文"""
+        if not self.recent:
+            return "（尚无辩论记录）"
+
+        parts = []
+        if self.digest:
+            parts.append(f"此前各轮要点摘要:\n{self.digest}")
+        for turn in self.evicted + list(self.recent):
+            side = "看涨方" if turn['speaker'] == 'bull' else "看跌方"
+            parts.append(f"第{turn['round']}轮 {side}发言:\n{self._clip(turn['content'])}")
+        return "\n\n".join(parts)
+
+    def _extract(self, turns: List[Dict[str, Any]]) -> str:
+        """摘录式摘要：已有摘要后逐条追加发言原文"""
+        lines = [self.digest] if self.digest else []
+        for turn in turns:
+            side = "看涨方" if turn['speaker'] == 'bull' else "看跌方"
+            lines.append(f"- 第{turn['round']}轮{side}: {turn['content']}")
+        return "\n".join(lines)
+
+    def _fold(self, turns: List[Dict[str, Any]]) -> str:
+        """将若干发言一次性并入摘要，摘要长度始终受 max_digest_chars 约束"""
+        system_prompt = f"""你负责维护一场投资辩论的滚动摘要。
+请把新的发言要点合并进已有摘要，保留双方仍然有效的核心论点和已被反驳的论点，删除重复内容。
+输出纯文本要点列表，不超过{self.max_digest_chars}字。"""
+        speeches = "\n\n".join(
+            f"第{t['round']}轮 {'看涨方' if t['speaker'] == 'bull' else '看跌方'}:\n{self._clip(t['content'])}"
+            for t in turns)
+        user_input = f"""已有摘要:
+{self.digest or '（空）'}
+
+新发言:
+{speeches}
+"""
+        self.fold_calls += 1
+        digest = self.llm.analyze_with_system_prompt(system_prompt, user_input,
+                                                     profile='debate_digest')
+        if not digest or digest.startswith("错误:"):
+            # 摘要失败时退化为截断拼接，保证长度有界
+            digest = self._extract(turns)
+        return self._clip(digest.strip(), self.max_digest_chars, keep_tail=True)
+
+    def _clip(self, text: str, limit: int = None, keep_tail: bool = False) -> str:
+        limit = limit or self.max_turn_chars
+        if len(text) <= limit:
+            return text
+        return '…' + text[-limit:] if keep_tail else text[:limit] + '…'
+
+
+def _bigrams(text: str) -> set:
+    text = ''.join(text.split())
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def text_similarity(a: str, b: str) -> float:
+    """字符二元组 Jaccard 相似度（中文无需分词，开销可忽略）"""
+    grams_a, grams_b = _bigrams(a), _bigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def _score(view: Dict[str, Any], key: str):
+    try:
+        return float(view.get(key))
+    except (TypeError, ValueError):
+        return None
+
+
+class ConvergenceDetector:
+    """辩论收敛检测：观点悬殊或发言重复时提前结束辩论"""
+
+    def __init__(self, similarity_threshold: float = 0.6, clear_cut_gap: float = 4.0):
+        self.similarity_threshold = similarity_threshold
+        self.clear_cut_gap = clear_cut_gap
+
+    def clear_cut(self, bull_view: Dict[str, Any], bear_view: Dict[str, Any]) -> str:
+        """多空信心差距悬殊时返回原因，否则返回空字符串"""
+        bull = _score(bull_view, 'bull_confidence')
+        bear = _score(bear_view, 'bear_confidence')
+        if bull is None or bear is None:
+            return ''
+        if abs(bull - bear) >= self.clear_cut_gap:
+            return f"多空信心悬殊（看涨 {bull:g} / 看跌 {bear:g}）"
+        return ''
+
+    def repeated(self, turns: List[Dict[str, Any]]) -> str:
+        """本轮各方发言与其上一次发言高度相似时返回原因"""
+        last_round = turns[-1]['round']
+        current = [t for t in turns if t['round'] == last_round]
+        compared = 0
+        for turn in current:
+            previous = [t for t in turns if t['speaker'] == turn['speaker'] and t['round'] < last_round]
+            if not previous:
+                continue
+            compared += 1
+            if text_similarity(turn['content'], previous[-1]['content']) < self.similarity_threshold:
+                return ''
+        return "本轮发言与上一轮高度重复，无新论点" if compared else ''
@@ -2,8 +2,10 @@
 决策智能体
 包括：交易员（综合决策）、风险管理员（风险评估）
 """
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .llm_client import DeepSeekClient
+from .prompt_builder import build_messages, render_analysts_dict, render_debate, render_portfolio_risk
+from data.models import StockData
 import json
 
 class Trader:
@@ -13,30 +15,17 @@ class Trader:
         self.llm = llm_client
         self.role = "资深交易员"
         
-    def make_decision(self, all_analysis: Dict[str, Any], stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    def make_decision(self, all_analysis: Dict[str, Any], stock_data: StockData) -> Dict[str, Any]:
         """做出最终交易决策"""
         print(f"\n💼 {self.role}正在做出决策...")
         
-        ts_code = stock_data.get('ts_code', 'N/A')
-        basic_info = stock_data.get('basic_info', {}) or {} or {}
-        realtime_quote = stock_data.get('realtime_quote', {}) or {}
+        # 股票数据 + 分析师意见 + 辩论结果 为共享前缀，与风险管理员命中同一缓存
+        shared_blocks = [
+            render_analysts_dict(all_analysis.get('analysts', {})),
+            render_debate(all_analysis.get('debate', {}))
+        ]
         
-        # 整合所有分析结果
-        context = f"""
-股票信息:
-- 代码: {ts_code}
-- 名称: {basic_info.get('name', 'N/A')}
-- 行业: {basic_info.get('industry', 'N/A')}
-- 当前价格: {realtime_quote.get('close', 'N/A')}元
-
-分析师团队意见:
-{json.dumps(all_analysis.get('analysts', {}), ensure_ascii=False, indent=2)}
-
-研究员辩论结果:
-{json.dumps(all_analysis.get('debate', {}), ensure_ascii=False, indent=2)}
-"""
-        
-        system_prompt = """你是一位经验丰富的股票交易员，负责做出最终的投资决策。
+        role_prompt = """你是一位经验丰富的股票交易员，负责做出最终的投资决策。
 
 你已经听取了技术分析师、基本面分析师、新闻分析师的专业意见，
 也参考了看涨和看跌研究员的深度辩论。
@@ -65,7 +54,8 @@ class Trader:
     "summary": "决策总结"
 }"""
         
-        response = self.llm.analyze_with_system_prompt(system_prompt, context, temperature=0.6)
+        response = self.llm.chat(build_messages(stock_data, role_prompt, shared_blocks=shared_blocks),
+                                 profile='trader')
         result = self.llm.parse_json_response(response)
         
         action = result.get('action', 'N/A')
@@ -83,27 +73,25 @@ class RiskManager:
         self.role = "风险管理员"
         
     def assess_risk(self, trading_decision: Dict[str, Any], all_analysis: Dict[str, Any], 
-                   stock_data: Dict[str, Any]) -> Dict[str, Any]:
-        """评估风险等级"""
+                   stock_data: StockData,
+                   portfolio_risk: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """评估风险等级
+
+        portfolio_risk 为批量分析预先算好的股票池组合风险画像，用于评估集中度风险
+        """
         print(f"\n🛡️ {self.role}正在评估风险...")
         
-        ts_code = stock_data.get('ts_code', 'N/A')
-        basic_info = stock_data.get('basic_info', {}) or {}
-        
-        context = f"""
-股票信息:
-- 代码: {ts_code}
-- 名称: {basic_info.get('name', 'N/A')}
-- 行业: {basic_info.get('industry', 'N/A')}
-
-交易决策:
+        shared_blocks = [
+            render_analysts_dict(all_analysis.get('analysts', {})),
+            render_debate(all_analysis.get('debate', {}))
+        ]
+        context = f"""交易决策:
 {json.dumps(trading_decision, ensure_ascii=False, indent=2)}
-
-完整分析:
-{json.dumps(all_analysis, ensure_ascii=False, indent=2)}
 """
+        if portfolio_risk:
+            context += "\n" + render_portfolio_risk(portfolio_risk)
         
-        system_prompt = """你是一位专业的风险管理员，负责评估投资风险并提供风险控制建议。
+        role_prompt = """你是一位专业的风险管理员，负责评估投资风险并提供风险控制建议。
 
 请从以下维度评估风险：
 
@@ -113,6 +101,7 @@ class RiskManager:
 4. 流动性风险: 成交量和流动性评估
 5. 估值风险: 当前估值是否合理
 6. 新闻舆情风险: 负面新闻和舆论风险
+7. 组合集中度风险: 如提供了股票池组合风险画像，结合与池内其他股票的相关性、Beta和风险贡献评估
 
 综合评估：
 - 总体风险等级: 低/中/高
@@ -127,6 +116,7 @@ class RiskManager:
     "liquidity_risk": "流动性风险评估",
     "valuation_risk": "估值风险评估",
     "sentiment_risk": "舆情风险评估",
+    "concentration_risk": "组合集中度风险评估（无组合数据时填“无”）",
     "overall_risk_level": "低/中/高",
     "risk_score": 风险评分(1-10),
     "risk_control_suggestions": ["建议1", "建议2", ...],
@@ -135,7 +125,8 @@ class RiskManager:
     "summary": "风险评估总结"
 }"""
         
-        response = self.llm.analyze_with_system_prompt(system_prompt, context, temperature=0.5)
+        response = self.llm.chat(build_messages(stock_data, role_prompt, context, shared_blocks),
+                                 profile='risk')
         result = self.llm.parse_json_response(response)
         
         risk_level = result.get('overall_risk_level', 'N/A')
@@ -0,0 +1,300 @@
+"""
+LLM 运行预算与用量台账
+按智能体配置（profile）累计一次运行的调用次数、token、成本和调用耗时；
+每次调用同时追加到按日切分的用量台账（JSONL），可按智能体、股票、运行、日汇总。
+运行成本超出预算后批量分析将剩余股票降级为筛查；超过运行硬上限或当日预算后拒绝新的调用
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+import json
+import os
+import threading
+
+# 当前正在分析的股票（由 analyze_stock 设置，用于台账归属）
+current_stock: ContextVar[str] = ContextVar('current_stock', default='')
+# 当前运行的预算（由 batch_analyze、队列工作进程设置）；未设置时LLM客户端使用其默认预算
+current_budget: ContextVar[Optional['RunBudget']] = ContextVar('current_budget', default=None)
+
+
+@contextmanager
+def usage_scope(stock_code: str):
+    """在该范围内发生的LLM调用记到 stock_code 名下"""
+    token = current_stock.set(stock_code)
+    try:
+        yield
+    finally:
+        current_stock.reset(token)
+
+
+@contextmanager
+def budget_scope(budget: 'RunBudget'):
+    """在该范围内发生的LLM调用计入 budget（同时发起的多次运行各自计数，互不清零）"""
+    token = current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        current_budget.reset(token)
+
+
+class BudgetExceeded(RuntimeError):
+    """超过运行硬上限或当日预算，拒绝新的LLM调用"""
+
+
+class UsageLedger:
+    """按日切分的LLM用量台账：每次调用一行 JSON，多进程追加写入同一文件"""
+
+    def __init__(self, ledger_dir: str):
+        self.ledger_dir = ledger_dir
+        self._lock = threading.Lock()
+        self._day = ''
+        self._offset = 0
+        self._day_cost = 0.0
+        self._runs: Dict[str, Dict[str, List[float]]] = {}  # 日期 → 运行 → [成本, 耗时]（已读取部分）
+
+    def _path(self, day: str) -> str:
+        return os.path.join(self.ledger_dir, f"{day}.jsonl")
+
+    def append(self, entry: Dict[str, Any]):
+        os.makedirs(self.ledger_dir, exist_ok=True)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock, open(self._path(entry['time'][:10]), 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    def entries(self, day: Optional[str] = None) -> List[Dict[str, Any]]:
+        day = day or datetime.now().strftime('%Y-%m-%d')
+        try:
+            with open(self._path(day), 'r', encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def _read(self, day: str, offset: int = 0):
+        """从 offset 处读取某日台账，返回 (已写完的记录, 新的 offset)"""
+        try:
+            with open(self._path(day), 'rb') as f:
+                f.seek(offset)
+                chunk = f.read()
+        except OSError:
+            return [], offset
+        complete = chunk[:chunk.rfind(b"\n") + 1]  # 跳过其他进程尚未写完的行
+        entries = []
+        for line in complete.splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries, offset + len(complete)
+
+    def _tally(self, day: str, entries: List[Dict[str, Any]]):
+        runs = self._runs.setdefault(day, {})
+        for entry in entries:
+            if entry.get('run'):
+                totals = runs.setdefault(entry['run'], [0.0, 0.0])
+                totals[0] += entry.get('cost', 0.0)
+                totals[1] += entry.get('seconds', 0.0)
+
+    def _refresh(self):
+        """增量读取当日新追加的行（含其他进程写入的记录）；跨日时先读完前一日（调用方持有锁）"""
+        day = datetime.now().strftime('%Y-%m-%d')
+        if day != self._day:
+            if self._day:
+                entries, _ = self._read(self._day, self._offset)
+                self._tally(self._day, entries)
+            self._day, self._offset, self._day_cost = day, 0, 0.0
+        entries, self._offset = self._read(day, self._offset)
+        self._day_cost += sum(entry.get('cost', 0.0) for entry in entries)
+        self._tally(day, entries)
+
+    def day_cost(self) -> float:
+        """当日累计成本（含其他进程写入的记录；只增量读取新追加的行）"""
+        with self._lock:
+            self._refresh()
+            return self._day_cost
+
+    def run_usage(self, run: str, since: Optional[str] = None) -> Dict[str, float]:
+        """某次运行自 since（YYYY-MM-DD，默认当日）起的累计成本和调用耗时，含其他进程、其他机器写入的记录
+
+        当日台账增量读取；更早的台账每个文件只读取一次
+        """
+        with self._lock:
+            self._refresh()
+            for day in self._days(since or self._day):
+                if day not in self._runs:
+                    self._tally(day, self._read(day)[0])
+            cost = seconds = 0.0
+            for day, runs in self._runs.items():
+                if day >= (since or self._day) and run in runs:
+                    cost += runs[run][0]
+                    seconds += runs[run][1]
+            return {'cost': cost, 'seconds': seconds}
+
+    def _days(self, since: str) -> List[str]:
+        """since 至前一日之间有台账文件的日期"""
+        try:
+            names = os.listdir(self.ledger_dir)
+        except OSError:
+            return []
+        return sorted(name[:-6] for name in names
+                      if name.endswith('.jsonl') and since <= name[:-6] < self._day)
+
+    def rollup(self, day: Optional[str] = None, by: str = 'agent') -> Dict[str, Dict[str, float]]:
+        """按 agent / stock / run / model 汇总某日用量"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for entry in self.entries(day):
+            stats = totals.setdefault(entry.get(by) or '-', {
+                'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0,
+                'cost': 0.0, 'seconds': 0.0,
+            })
+            stats['calls'] += 1
+            for key in ('prompt_tokens', 'cached_tokens', 'completion_tokens', 'cost', 'seconds'):
+                stats[key] += entry.get(key, 0)
+        return totals
+
+
+class RunBudget:
+    """单次运行的成本与耗时预算（线程安全）"""
+
+    def __init__(self, max_cost: Optional[float] = None, max_seconds: Optional[float] = None,
+                 pricing: Optional[Dict[str, Dict[str, float]]] = None, ledger: Optional[UsageLedger] = None,
+                 hard_max_cost: Optional[float] = None, daily_max_cost: Optional[float] = None):
+        """
+        Args:
+            max_cost: 成本上限（元），超出后剩余股票降级；None 为不限
+            max_seconds: 累计LLM调用耗时上限（秒），None 为不限
+            pricing: 模型 → {input, cached_input, output}（元/百万tokens）
+            ledger: 用量台账，每次调用追加一行
+            hard_max_cost: 运行成本硬上限（元），超出后拒绝新的调用
+            daily_max_cost: 当日成本上限（元，跨运行、跨进程），超出后拒绝新的调用
+        """
+        self.max_cost = max_cost
+        self.max_seconds = max_seconds
+        self.pricing = pricing or {}
+        self.ledger = ledger
+        self.hard_max_cost = hard_max_cost
+        self.daily_max_cost = daily_max_cost
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, label: str = '', since: Optional[str] = None):
+        """开始新的一次运行；since 为运行开始日期（YYYY-MM-DD），从台账统计运行总用量时计入该日起的记录"""
+        with self._lock:
+            self.label = label
+            self.since = since or datetime.now().strftime('%Y-%m-%d')
+            self.cost = 0.0
+            self.seconds = 0.0
+            self.by_profile: Dict[str, Dict[str, float]] = {}
+
+    def spawn(self, label: str, since: Optional[str] = None) -> 'RunBudget':
+        """按相同的限额、价格和台账为一次新运行创建独立的预算"""
+        budget = RunBudget(self.max_cost, self.max_seconds, self.pricing, self.ledger,
+                           self.hard_max_cost, self.daily_max_cost)
+        budget.reset(label, since)
+        return budget
+
+    def cost_of(self, model: str, usage: Dict[str, int]) -> float:
+        price = self.pricing.get(model)
+        if not price or not usage:
+            return 0.0
+        cached = usage.get('cached_tokens', 0)
+        fresh = usage.get('prompt_tokens', 0) - cached
+        return (fresh * price.get('input', 0) + cached * price.get('cached_input', price.get('input', 0))
+                + usage.get('completion_tokens', 0) * price.get('output', 0)) / 1_000_000
+
+    def record(self, profile: Optional[str], model: str, usage: Dict[str, int], seconds: float,
+               endpoint: str = '', estimated: bool = False) -> float:
+        """记录一次调用（同时写入台账），返回该次成本
+
+        estimated: 用量为估算值（被对冲请求取代而中断的请求，服务端未返回用量）
+        """
+        cost = self.cost_of(model, usage)
+        if self.ledger is not None:
+            self.ledger.append({
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'run': self.label,
+                'stock': current_stock.get(),
+                'agent': profile or 'default',
+                'model': model,
+                'endpoint': endpoint,
+                'prompt_tokens': usage.get('prompt_tokens', 0),
+                'cached_tokens': usage.get('cached_tokens', 0),
+                'completion_tokens': usage.get('completion_tokens', 0),
+                'cost': round(cost, 6),
+                'seconds': round(seconds, 3),
+                **({'estimated': True} if estimated else {}),
+            })
+        with self._lock:
+            self.cost += cost
+            self.seconds += seconds
+            stats = self.by_profile.setdefault(profile or 'default', {
+                'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0, 'seconds': 0.0,
+            })
+            stats['calls'] += 1
+            stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+            stats['completion_tokens'] += usage.get('completion_tokens', 0)
+            stats['cost'] += cost
+            stats['seconds'] += seconds
+        return cost
+
+    def run_usage(self) -> Dict[str, float]:
+        """本次运行的累计成本和耗时：有台账时按运行标签从台账汇总（含同一运行的其他工作进程），否则为本进程的计数"""
+        if self.ledger is not None and self.label:
+            return self.ledger.run_usage(self.label, self.since)
+        with self._lock:
+            return {'cost': self.cost, 'seconds': self.seconds}
+
+    @property
+    def exhausted(self) -> Optional[str]:
+        """超出预算时返回原因，否则 None"""
+        if self.max_cost is None and self.max_seconds is None:
+            return None
+        usage = self.run_usage()
+        if self.max_cost is not None and usage['cost'] >= self.max_cost:
+            return f"LLM成本 ¥{usage['cost']:.2f} 已达预算 ¥{self.max_cost:.2f}"
+        if self.max_seconds is not None and usage['seconds'] >= self.max_seconds:
+            return f"LLM累计耗时 {usage['seconds']:.0f}秒 已达预算 {self.max_seconds:.0f}秒"
+        return None
+
+    def hard_limit(self) -> Optional[str]:
+        """超过运行硬上限或当日预算时返回原因，否则 None"""
+        run_cost = self.run_usage()['cost'] if self.hard_max_cost is not None else 0.0
+        if self.hard_max_cost is not None and run_cost >= self.hard_max_cost:
+            return f"本次运行LLM成本 ¥{run_cost:.2f} 已达硬上限 ¥{self.hard_max_cost:.2f}"
+        if self.daily_max_cost is not None and self.ledger is not None:
+            day_cost = self.ledger.day_cost()
+            if day_cost >= self.daily_max_cost:
+                return f"今日LLM成本 ¥{day_cost:.2f} 已达上限 ¥{self.daily_max_cost:.2f}"
+        return None
+
+    def check(self):
+        """调用前检查硬上限，超出时抛出 BudgetExceeded"""
+        reason = self.hard_limit()
+        if reason:
+            raise BudgetExceeded(reason)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'label': self.label,
+                'cost': round(self.cost, 4),
+                'max_cost': self.max_cost,
+                'seconds': round(self.seconds, 1),
+                'max_seconds': self.max_seconds,
+                'by_profile': {k: dict(v) for k, v in self.by_profile.items()},
+            }
+
+    def report_lines(self) -> List[str]:
+        """预算消耗明细（按智能体）"""
+        summary = self.summary()
+        cost_limit = f" / ¥{summary['max_cost']:.2f}" if summary['max_cost'] is not None else ""
+        time_limit = f" / {summary['max_seconds']:.0f}秒" if summary['max_seconds'] is not None else ""
+        lines = [f"LLM成本 ¥{summary['cost']:.2f}{cost_limit}，累计调用耗时 {summary['seconds']:.0f}秒{time_limit}"]
+        run_cost = self.run_usage()['cost']
+        if run_cost - summary['cost'] >= 0.005:
+            lines[0] += f"（本次运行合计 ¥{run_cost:.2f}，含其他进程的调用）"
+        for profile, stats in sorted(summary['by_profile'].items(), key=lambda kv: -kv[1]['cost']):
+            lines.append(f"  {profile:<15} {stats['calls']:>4} 次  输入 {stats['prompt_tokens']:>8}  "
+                         f"输出 {stats['completion_tokens']:>7}  ¥{stats['cost']:.3f}  "
+                         f"平均 {stats['seconds'] / stats['calls']:.1f}秒")
+        return lines
@@ -1,47 +1,346 @@
 """
 DeepSeek LLM客户端
-用于与DeepSeek API交互
+用于与DeepSeek API交互；可配置多个 OpenAI 兼容端点，按健康度加权路由，
+主请求超过该端点近期 p95 延迟仍未返回时向另一端点发出对冲请求，取先返回者并关闭落后请求的连接；
+落后请求已消耗的 tokens 按估算计入预算
 """
 from openai import OpenAI
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import List, Dict, Any, Optional
 import json
+import math
+import random
+import threading
+import time
+
+from .llm_budget import current_stock, current_budget
+from data.call_stats import CallStats
+
+
+class Endpoint:
+    """单个 OpenAI 兼容端点及其健康统计"""
+    
+    def __init__(self, name: str, base_url: str, api_key: str, models: Optional[Dict[str, str]] = None,
+                 window: int = 50, max_retries: int = 2, timeout: Optional[float] = None):
+        self.name = name
+        options = {'timeout': timeout} if timeout else {}
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=max_retries, **options)
+        self.models = models or {}  # 逻辑模型名 → 该端点上的模型名
+        self.latencies = deque(maxlen=window)
+        self.success_rate = 1.0  # 指数加权成功率
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self._lock = threading.Lock()
+    
+    def model_for(self, model: str) -> str:
+        return self.models.get(model, model)
+    
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.success_rate = 0.8 * self.success_rate + 0.2 * (1.0 if ok else 0.0)
+            if ok:
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= 3:
+                    self.cooldown_until = time.monotonic() + 60  # 连续失败后暂停路由 60 秒
+    
+    def record_censored(self, seconds: float):
+        """被对冲取代而中断的请求：真实延迟未知但不短于已耗时和对冲触发点，
+        按 max(已耗时, p95) 记为一次慢样本（不影响成功率），避免被反复对冲的慢端点延迟统计越来越低"""
+        p95 = self.p95()
+        with self._lock:
+            self.latencies.append(max(seconds, p95 or seconds))
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < 5:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+    
+    def weight(self) -> float:
+        """路由权重：成功率 / 中位延迟；冷却中的端点权重为 0"""
+        if time.monotonic() < self.cooldown_until:
+            return 0.0
+        with self._lock:
+            median = sorted(self.latencies)[len(self.latencies) // 2] if self.latencies else 1.0
+        return max(self.success_rate, 0.05) / max(median, 0.1)
+
+
+class _Attempt:
+    """一次端点请求的状态；被对冲请求取代时由胜出方 cancel()，直接关闭其 HTTP 响应"""
+    
+    CHARS_PER_TOKEN = 1.5  # 估算被中断请求的输出 tokens（中文约 1.5 字/token）
+    
+    def __init__(self, endpoint: Endpoint):
+        self.endpoint = endpoint
+        self.cancelled = threading.Event()
+        self.chars = 0  # 已收到的输出字符数
+        self._response = None
+        self._lock = threading.Lock()
+    
+    def attach(self, response):
+        """登记流式响应；已被取消时立即关闭"""
+        with self._lock:
+            self._response = response
+        if self.cancelled.is_set():
+            self._close()
+    
+    def cancel(self):
+        self.cancelled.set()
+        self._close()
+    
+    def _close(self):
+        with self._lock:
+            response, self._response = self._response, None
+        if response is not None:
+            try:
+                response.close()  # 阻塞在读取上的工作线程随之返回，服务端停止生成
+            except Exception:
+                pass
+    
+    def estimated_usage(self, prompt_tokens: int) -> Dict[str, int]:
+        """被中断请求的估算用量：输入与胜出请求相同（不计缓存命中），输出按已收到的字符数折算"""
+        return {'prompt_tokens': prompt_tokens, 'cached_tokens': 0,
+                'completion_tokens': math.ceil(self.chars / self.CHARS_PER_TOKEN)}
+
 
 class DeepSeekClient:
     """DeepSeek客户端"""
     
-    def __init__(self, api_key: str, base_url: str = "https://api.deepseek.com/v1", model: str = "deepseek-chat"):
-        """初始化DeepSeek客户端"""
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+    def __init__(self, api_key: str, base_url: str = "https://api.deepseek.com/v1", model: str = "deepseek-chat",
+                 endpoints: Optional[List[Dict[str, Any]]] = None, hedge: bool = True,
+                 hedge_delay: float = 30.0, min_hedge_delay: float = 2.0, timeout: Optional[float] = None,
+                 defaults: Optional[Dict[str, Any]] = None, profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+                 budget=None, cassette=None):
+        """初始化DeepSeek客户端
+        
+        Args:
+            defaults: 默认生成参数（temperature / max_tokens / top_p 等）
+            profiles: 智能体配置名 → 覆盖参数（可含 model / stop / response_format）
+            budget: 默认的 RunBudget，记录每次调用的成本和耗时；超过硬上限时 chat 抛出 BudgetExceeded。
+                    在 budget_scope 范围内调用时改为计入该范围的预算
+            cassette: 录制/回放卡带（data.cassette.Cassette），回放时不发出请求
+            endpoints: 多端点配置 [{"name", "base_url", "api_key", "models": {逻辑模型: 端点模型}}]，
+                       为空时只使用 api_key / base_url 一个端点
+            hedge: 是否启用对冲请求（至少两个端点时生效）
+            hedge_delay: 端点延迟样本不足时的对冲等待时间（秒）
+            min_hedge_delay: 对冲等待时间下限（秒）
+            timeout: 请求的连接/读取超时（秒），None 为 SDK 默认值
+        """
+        endpoints = endpoints or [{"name": "deepseek", "base_url": base_url, "api_key": api_key}]
+        # 多端点时由切换端点代替 SDK 内置重试，失败的端点不再被重复请求
+        retries = 2 if len(endpoints) == 1 else 0
+        self.endpoints = [
+            Endpoint(e.get("name") or e["base_url"], e["base_url"], e.get("api_key") or api_key,
+                     e.get("models"), max_retries=retries, timeout=timeout)
+            for e in endpoints
+        ]
+        self.client = self.endpoints[0].client
         self.model = model
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.defaults = defaults or {"temperature": 0.7, "max_tokens": 4000}
+        self.profiles = profiles or {}
+        self.budget = budget
+        self.cassette = cassette
+        self.stats = CallStats()  # 调用延迟、进行中数量及 tokens 计数（实时看板使用）
+        self.last_usage: Dict[str, int] = {}
+        self._executor = ThreadPoolExecutor(max_workers=8 * len(self.endpoints), thread_name_prefix='llm')
+        
+    @staticmethod
+    def _extract_usage(usage) -> Dict[str, int]:
+        """提取token用量；DeepSeek 返回 prompt_cache_hit_tokens，OpenAI 兼容接口返回 cached_tokens"""
+        if usage is None:
+            return {}
+        cached = getattr(usage, 'prompt_cache_hit_tokens', None)
+        if cached is None:
+            details = getattr(usage, 'prompt_tokens_details', None)
+            cached = getattr(details, 'cached_tokens', 0) if details else 0
+        return {
+            'prompt_tokens': usage.prompt_tokens or 0,
+            'completion_tokens': usage.completion_tokens or 0,
+            'cached_tokens': cached or 0,
+        }
+    
+    def chat(self, messages: List[Dict[str, str]], temperature: Optional[float] = None,
+             max_tokens: Optional[int] = None, profile: Optional[str] = None) -> str:
+        """发送聊天请求
+        
+        生成参数优先级：显式传入 > 智能体配置 profile > 默认值
+        """
+        params = {**self.defaults, **self.profiles.get(profile, {})}
+        if temperature is not None:
+            params['temperature'] = temperature
+        if max_tokens is not None:
+            params['max_tokens'] = max_tokens
+        model = params.pop('model', self.model)
+        
+        budget = current_budget.get() or self.budget
+        if budget is not None:
+            budget.check()  # 超过硬上限时直接抛出，不以错误文本冒充模型输出
         
-    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 4000) -> str:
-        """发送聊天请求"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-            return response.choices[0].message.content
+            reply = self._reply(messages, model, params, profile)
+            content = reply['content']
+            self.last_usage = reply['usage']
+            if budget is not None:
+                budget.record(profile, model, reply['usage'], reply['seconds'], reply['endpoint'])
+                for hedge in reply.get('hedged', []):
+                    budget.record(profile, model, hedge['usage'], 0.0, hedge['endpoint'], estimated=True)
+            if self.last_usage:
+                prompt_tokens = self.last_usage['prompt_tokens']
+                cached = self.last_usage['cached_tokens']
+                hit_rate = cached / prompt_tokens * 100 if prompt_tokens else 0
+                print(f"   🧮 tokens: 输入 {prompt_tokens}（缓存命中 {cached}, {hit_rate:.0f}%）"
+                      f" / 输出 {self.last_usage['completion_tokens']}" +
+                      (f" [{reply['endpoint']}]" if len(self.endpoints) > 1 else ""))
+            return content
         except Exception as e:
             print(f"❌ DeepSeek API调用失败: {e}")
             return f"错误: {str(e)}"
     
+    def _reply(self, messages: List[Dict[str, str]], model: str, params: Dict[str, Any],
+               profile: Optional[str]) -> Dict[str, Any]:
+        """完成一次请求，返回 {content, usage, endpoint, seconds, hedged}；启用卡带时经由卡带录制或回放
+
+        hedged 为被中断的落后请求 [{endpoint, usage(估算)}]
+        """
+        def complete():
+            start = time.monotonic()
+            content, usage, endpoint, losers = self._complete(messages, model, params)
+            return {'content': content, 'usage': usage, 'endpoint': endpoint.name,
+                    'seconds': round(time.monotonic() - start, 3),
+                    'hedged': [{'endpoint': a.endpoint.name,
+                                'usage': a.estimated_usage(usage.get('prompt_tokens', 0))} for a in losers]}
+        
+        with self.stats.track():
+            if self.cassette is None:
+                reply = complete()
+            else:
+                request = {'model': model, 'messages': messages, 'params': params}
+                reply = self.cassette.call('llm', request, complete, loose=f"{profile}|{current_stock.get()}")
+        self.stats.count(prompt_tokens=reply['usage'].get('prompt_tokens', 0),
+                         cached_tokens=reply['usage'].get('cached_tokens', 0))
+        return reply
+    
+    # ---------- 路由与对冲 ----------
+    
+    def _pick(self, exclude: List[Endpoint]) -> Optional[Endpoint]:
+        """按健康度加权随机选择端点（全部冷却时仍选出一个，避免无端点可用）"""
+        candidates = [e for e in self.endpoints if e not in exclude]
+        if not candidates:
+            return None
+        weights = [e.weight() for e in candidates]
+        if not any(weights):
+            return min(candidates, key=lambda e: e.cooldown_until)
+        return random.choices(candidates, weights=weights)[0]
+    
+    def _complete(self, messages: List[Dict[str, str]], model: str, params: Dict[str, Any]):
+        """路由请求；主请求超过 p95 未返回时对冲到另一端点，失败时立即切换端点
+        
+        返回 (内容, token用量, 胜出端点, 被中断的落后请求)
+        """
+        primary = self._pick([])
+        tried = [primary]
+        attempts: Dict[Any, _Attempt] = {}
+        started = time.monotonic()
+        
+        def launch(endpoint: Endpoint):
+            attempt = _Attempt(endpoint)
+            future = self._executor.submit(self._attempt, attempt, messages, model, params)
+            attempts[future] = attempt
+            return future
+        
+        first = launch(primary)
+        running = {first}
+        hedge_at = time.monotonic() + max(primary.p95() or self.hedge_delay, self.min_hedge_delay)
+        hedged = False
+        last_error = None
+        
+        while running:
+            timeout = max(hedge_at - time.monotonic(), 0) if self.hedge and not hedged else None
+            done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                try:
+                    content, usage, endpoint = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                losers = [attempts[loser] for loser in running]
+                for attempt in losers:
+                    attempt.cancel()
+                if first in running:
+                    # 主请求被对冲请求取代：按删失的慢样本计入，而非中断时偏短的耗时
+                    primary.record_censored(time.monotonic() - started)
+                return content, usage, endpoint, losers
+            
+            # 全部失败时切换到下一个端点；超过 p95 仍未返回时发出对冲请求
+            if not running or (self.hedge and not hedged and time.monotonic() >= hedge_at):
+                backup = self._pick(tried)
+                hedged = hedged or bool(running)
+                if backup is None:
+                    continue
+                if running:
+                    print(f"   ⏱️ {tried[-1].name} 超过 p95 延迟未返回，对冲请求 {backup.name}")
+                elif len(self.endpoints) > 1:
+                    print(f"   🔁 {tried[-1].name} 调用失败，切换到 {backup.name}: {last_error}")
+                tried.append(backup)
+                running.add(launch(backup))
+        
+        raise last_error
+    
+    def _attempt(self, attempt: _Attempt, messages: List[Dict[str, str]], model: str,
+                 params: Dict[str, Any]):
+        """在一个端点上流式完成请求；被取消时胜出方关闭连接，服务端随之停止生成"""
+        endpoint, cancel = attempt.endpoint, attempt.cancelled
+        start = time.monotonic()
+        try:
+            stream = endpoint.client.chat.completions.create(
+                model=endpoint.model_for(model),
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **params,
+            )
+            attempt.attach(getattr(stream, 'response', stream))
+            parts, usage = [], None
+            with stream:
+                for chunk in stream:
+                    if cancel.is_set():
+                        break
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        attempt.chars += len(parts[-1])
+                    if getattr(chunk, 'usage', None):
+                        usage = chunk.usage
+        except Exception:
+            if not cancel.is_set():
+                endpoint.record(time.monotonic() - start, ok=False)
+            raise
+        if cancel.is_set():
+            # 被中断的请求耗时偏短，不作为延迟样本（由胜出方按删失样本记录）
+            raise RuntimeError(f"{endpoint.name} 请求已被对冲请求取代")
+        endpoint.record(time.monotonic() - start, ok=True)
+        return ''.join(parts), self._extract_usage(usage), endpoint
+    
     def analyze_with_system_prompt(self, system_prompt: str, user_input: str, 
-                                   temperature: float = 0.7, max_tokens: int = 4000) -> str:
+                                   temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                                   profile: Optional[str] = None) -> str:
         """使用系统提示词进行分析"""
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_input}
         ]
-        return self.chat(messages, temperature, max_tokens)
+        return self.chat(messages, temperature, max_tokens, profile=profile)
     
     def structured_analysis(self, role: str, task: str, data: str, 
-                          output_format: str = "JSON", temperature: float = 0.7) -> str:
+                          output_format: str = "JSON", temperature: Optional[float] = None) -> str:
         """结构化分析"""
         system_prompt = f"""你是一位专业的{role}。
 你的任务是：{task}
@@ -67,7 +366,7 @@ class DeepSeekClient:
             return {"raw_response": response}
     
     def multi_round_dialogue(self, system_prompt: str, conversation: List[Dict[str, str]], 
-                            temperature: float = 0.7) -> str:
+                            temperature: Optional[float] = None) -> str:
         """多轮对话"""
         messages = [{"role": "system", "content": system_prompt}] + conversation
         return self.chat(messages, temperature)
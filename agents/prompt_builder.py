@@ -0,0 +1,129 @@
+"""
+提示词组装
+所有智能体使用同一前缀布局：固定系统指令 → 股票上下文 → 共享分析结果 → 角色专属任务，
+同一只股票的多次调用前缀逐字节一致，可命中 DeepSeek 上下文缓存（缓存命中的输入token计费更低、响应更快）
+"""
+from typing import Dict, Any, List, Sequence
+import json
+
+from data.models import StockData, AnalystResults
+
+# 固定系统指令：所有角色、所有股票共用，不得包含任何变量
+SHARED_SYSTEM_PROMPT = """你是A股多智能体投资分析系统中的一名成员。系统依次由技术分析师、基本面分析师、新闻分析师、
+看涨研究员、看跌研究员、辩论协调器、交易员和风险管理员协作完成一只股票的分析。
+
+通用要求：
+1. 只基于用户消息中提供的数据和前序分析结论进行判断，数据缺失时明确说明，不得编造数据
+2. 保持专业、客观，结论要有数据或逻辑支撑
+3. 用户消息最后的【当前角色任务】部分规定了你本次扮演的角色和输出格式，必须严格遵守"""
+
+ROLE_MARKER = "【当前角色任务】"
+
+
+def _dump(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, indent=2, default=str)
+
+
+def render_stock_context(stock_data: StockData) -> str:
+    """股票上下文：同一 StockData 每次渲染结果完全相同"""
+    basic_info = stock_data.basic_info or {}
+    realtime_quote = stock_data.realtime_quote or {}
+
+    context = f"""【股票数据】
+股票代码: {stock_data.ts_code}
+股票名称: {basic_info.get('name', 'N/A')}
+所属行业: {basic_info.get('industry', 'N/A')}
+上市日期: {basic_info.get('list_date', 'N/A')}
+数据获取时间: {stock_data.fetch_time}
+是否交易时间: {'是' if stock_data.is_trading_time else '否'}
+
+最新行情:
+- 收盘价: {realtime_quote.get('close', 'N/A')}
+- 涨跌幅: {realtime_quote.get('pct_chg', 'N/A')}%
+- 成交量: {realtime_quote.get('vol', 'N/A')}手
+- 成交额: {realtime_quote.get('amount', 'N/A')}千元
+
+近期行情数据（最近10个交易日）:
+{_dump(stock_data.recent_daily(10))}
+"""
+
+    intraday = stock_data.recent_intraday(10)
+    if intraday:
+        context += f"""
+盘中数据（最近1小时）:
+{_dump(intraday)}
+"""
+
+    context += f"""
+财务数据:
+{_dump(stock_data.financial_data or {})}
+
+财务指标:
+{_dump(stock_data.indicator_records())}
+
+近期相关新闻:
+{_dump(stock_data.news[:10])}
+"""
+
+    if stock_data.sector_context:
+        context += f"""
+行业背景分析（同行业股票共享）:
+{_dump(stock_data.sector_context)}
+"""
+    return context
+
+
+def render_analysts(analysts: AnalystResults) -> str:
+    """分析师结论（研究员、辩论、交易员、风险管理员共享）"""
+    return render_analysts_dict(analysts.to_dict())
+
+
+def render_analysts_dict(analysts: Dict[str, Any]) -> str:
+    return f"""【分析师团队意见】
+技术分析: {_dump(analysts.get('technical', {}))}
+
+基本面分析: {_dump(analysts.get('fundamental', {}))}
+
+新闻分析: {_dump(analysts.get('news', {}))}
+"""
+
+
+def render_debate(debate: Dict[str, Any]) -> str:
+    """辩论结果（交易员、风险管理员共享）"""
+    return f"""【研究员辩论结果】
+{_dump(debate)}
+"""
+
+
+def render_peer_valuation(peer: Dict[str, Any]) -> str:
+    """同业估值对比（仅基本面分析师使用，放在角色任务之后不影响共享前缀）"""
+    lines = [f"同业对比（{peer['industry']}，{peer['peer_count']} 家公司，财报期 {peer['period']}，"
+             f"估值日 {peer['trade_date']}；百分位越高表示在行业内越优）:"]
+    for label, metric in peer['metrics'].items():
+        lines.append(f"- {label}: {metric['value']}（行业中位数 {metric['industry_median']}，"
+                     f"行业百分位 {metric['percentile']:.0%}）")
+    lines.append("行业市值前列公司及本股（roe/毛利率/净利率/资产负债率单位为%）:")
+    lines.extend(json.dumps(row, ensure_ascii=False, default=str) for row in peer['peers'])
+    return "\n".join(lines)
+
+
+def render_portfolio_risk(portfolio_risk: Dict[str, Any]) -> str:
+    """股票池组合风险画像（仅风险管理员使用，放在角色任务之后不影响共享前缀）"""
+    return f"""股票池组合风险画像（年化波动率、Beta、最大回撤、与池内其他股票的相关性）:
+{_dump(portfolio_risk)}
+"""
+
+
+def build_messages(stock_data: StockData, role_prompt: str, role_input: str = '',
+                   shared_blocks: Sequence[str] = ()) -> List[Dict[str, str]]:
+    """按 固定指令 → 股票上下文 → 共享块 → 角色任务 的顺序组装消息"""
+    parts = [render_stock_context(stock_data)]
+    parts.extend(shared_blocks)
+    parts.append(f"{ROLE_MARKER}\n{role_prompt}")
+    if role_input:
+        parts.append(role_input)
+
+    return [
+        {"role": "system", "content": SHARED_SYSTEM_PROMPT},
+        {"role": "user", "content": "\n\n".join(parts)},
+    ]
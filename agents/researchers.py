@@ -4,7 +4,9 @@
 """
 from typing import Dict, Any, List
 from .llm_client import DeepSeekClient
-import json
+from .debate_memory import DebateMemory, ConvergenceDetector, compact_view
+from .prompt_builder import build_messages, render_analysts
+from data.models import StockData, AnalystResults, DebateResult
 
 class BullResearcher:
     """看涨研究员 - 寻找买入理由"""
@@ -13,29 +15,14 @@ class BullResearcher:
         self.llm = llm_client
         self.role = "看涨研究员"
         
-    def research(self, analysis_results: Dict[str, Any], stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    def research(self, analysis_results: AnalystResults, stock_data: StockData) -> Dict[str, Any]:
         """从看涨角度研究"""
         print(f"\n🐂 {self.role}正在研究...")
         
-        ts_code = stock_data.get('ts_code', 'N/A')
-        basic_info = stock_data.get('basic_info', {}) or {}
+        # 股票数据和分析师结论作为共享前缀，看涨/看跌研究员可命中同一缓存
+        shared_blocks = [render_analysts(analysis_results)]
         
-        # 整合分析结果
-        context = f"""
-股票信息:
-- 代码: {ts_code}
-- 名称: {basic_info.get('name', 'N/A')}
-- 行业: {basic_info.get('industry', 'N/A')}
-
-各分析师观点:
-技术分析: {json.dumps(analysis_results.get('technical', {}), ensure_ascii=False, indent=2)}
-
-基本面分析: {json.dumps(analysis_results.get('fundamental', {}), ensure_ascii=False, indent=2)}
-
-新闻分析: {json.dumps(analysis_results.get('news', {}), ensure_ascii=False, indent=2)}
-"""
-        
-        system_prompt = """你是一位看涨研究员，你的任务是从乐观的角度评估投资机会。
+        role_prompt = """你是一位看涨研究员，你的任务是从乐观的角度评估投资机会。
 
 请基于各分析师的观点，从看涨角度进行深度研究：
 1. 找出所有利好因素和投资亮点
@@ -55,7 +42,8 @@ class BullResearcher:
     "summary": "看涨观点总结"
 }"""
         
-        response = self.llm.analyze_with_system_prompt(system_prompt, context)
+        response = self.llm.chat(build_messages(stock_data, role_prompt, shared_blocks=shared_blocks),
+                                 profile='bull')
         result = self.llm.parse_json_response(response)
         
         print(f"✅ 看涨研究完成，信心指数: {result.get('bull_confidence', 'N/A')}/10")
@@ -69,28 +57,14 @@ class BearResearcher:
         self.llm = llm_client
         self.role = "看跌研究员"
         
-    def research(self, analysis_results: Dict[str, Any], stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    def research(self, analysis_results: AnalystResults, stock_data: StockData) -> Dict[str, Any]:
         """从看跌角度研究"""
         print(f"\n🐻 {self.role}正在研究...")
         
-        ts_code = stock_data.get('ts_code', 'N/A')
-        basic_info = stock_data.get('basic_info', {}) or {}
-        
-        context = f"""
-股票信息:
-- 代码: {ts_code}
-- 名称: {basic_info.get('name', 'N/A')}
-- 行业: {basic_info.get('industry', 'N/A')}
-
-各分析师观点:
-技术分析: {json.dumps(analysis_results.get('technical', {}), ensure_ascii=False, indent=2)}
-
-基本面分析: {json.dumps(analysis_results.get('fundamental', {}), ensure_ascii=False, indent=2)}
-
-新闻分析: {json.dumps(analysis_results.get('news', {}), ensure_ascii=False, indent=2)}
-"""
+        # 股票数据和分析师结论作为共享前缀，看涨/看跌研究员可命中同一缓存
+        shared_blocks = [render_analysts(analysis_results)]
         
-        system_prompt = """你是一位看跌研究员，你的任务是从谨慎的角度评估投资风险。
+        role_prompt = """你是一位看跌研究员，你的任务是从谨慎的角度评估投资风险。
 
 请基于各分析师的观点，从看跌角度进行深度研究：
 1. 识别所有风险因素和利空点
@@ -110,7 +84,8 @@ class BearResearcher:
     "summary": "看跌观点总结"
 }"""
         
-        response = self.llm.analyze_with_system_prompt(system_prompt, context)
+        response = self.llm.chat(build_messages(stock_data, role_prompt, shared_blocks=shared_blocks),
+                                 profile='bear')
         result = self.llm.parse_json_response(response)
         
         print(f"✅ 看跌研究完成，担忧指数: {result.get('bear_confidence', 'N/A')}/10")
@@ -120,19 +95,24 @@ class BearResearcher:
 class DebateCoordinator:
     """辩论协调器 - 组织看涨和看跌研究员辩论"""
     
-    def __init__(self, llm_client: DeepSeekClient):
+    def __init__(self, llm_client: DeepSeekClient, convergence: ConvergenceDetector = None):
         self.llm = llm_client
         self.role = "辩论协调器"
+        self.convergence = convergence or ConvergenceDetector()
         
     def coordinate_debate(self, bull_view: Dict[str, Any], bear_view: Dict[str, Any], 
-                         stock_data: Dict[str, Any], max_rounds: int = 2) -> Dict[str, Any]:
+                         stock_data: StockData, max_rounds: int = 2,
+                         analysts: AnalystResults = None) -> DebateResult:
         """协调多轮辩论"""
         print(f"\n⚖️ {self.role}正在组织辩论...")
         
-        ts_code = stock_data.get('ts_code', 'N/A')
-        basic_info = stock_data.get('basic_info', {}) or {}
+        # 与研究员共享 股票数据 + 分析师结论 前缀
+        shared_blocks = [render_analysts(analysts)] if analysts is not None else []
         
-        debate_history = []
+        # 早期轮次滚动摘要 + 最近一次交锋原文，提示词长度不随轮次增长
+        memory = DebateMemory(self.llm)
+        rounds_completed = 0
+        stop_reason = ''
         
         for round_num in range(1, max_rounds + 1):
             print(f"\n  📢 第 {round_num}/{max_rounds} 轮辩论")
@@ -141,48 +121,64 @@ class DebateCoordinator:
             if round_num > 1:
                 bull_rebuttal = self._get_rebuttal(
                     "看涨方", bull_view, bear_view, 
-                    debate_history, stock_data
+                    memory, stock_data, shared_blocks
                 )
-                debate_history.append({"round": round_num, "speaker": "bull", "content": bull_rebuttal})
+                memory.add(round_num, "bull", bull_rebuttal)
             
             # 看跌方反驳
             bear_rebuttal = self._get_rebuttal(
                 "看跌方", bear_view, bull_view,
-                debate_history, stock_data
+                memory, stock_data, shared_blocks
             )
-            debate_history.append({"round": round_num, "speaker": "bear", "content": bear_rebuttal})
+            memory.add(round_num, "bear", bear_rebuttal)
+            rounds_completed = round_num
+            
+            # 收敛检测：观点悬殊或不再产生新论点时提前结束
+            if round_num < max_rounds:
+                stop_reason = (self.convergence.clear_cut(bull_view, bear_view) if round_num == 1
+                               else self.convergence.repeated(memory.turns))
+                if stop_reason:
+                    print(f"  🛑 辩论提前结束: {stop_reason}")
+                    break
+                memory.end_round()
         
         # 总结辩论
-        debate_summary = self._summarize_debate(bull_view, bear_view, debate_history, stock_data)
-        
-        print(f"✅ 辩论完成，共 {max_rounds} 轮")
-        
-        return {
-            "bull_initial": bull_view,
-            "bear_initial": bear_view,
-            "debate_rounds": debate_history,
-            "debate_summary": debate_summary
-        }
+        debate_summary = self._summarize_debate(bull_view, bear_view, memory, stock_data, shared_blocks)
+        
+        # 每个跳过的轮次节省看涨、看跌两次反驳调用；实际调用含反驳、摘要压缩和总结
+        saved_calls = (max_rounds - rounds_completed) * 2
+        llm_calls = len(memory.turns) + memory.fold_calls + 1
+        print(f"✅ 辩论完成，共 {rounds_completed}/{max_rounds} 轮，{llm_calls} 次LLM调用" +
+              (f"（其中摘要压缩 {memory.fold_calls} 次）" if memory.fold_calls else "") +
+              (f"，节省 {saved_calls} 次" if saved_calls else ""))
+        
+        return DebateResult(
+            bull_initial=bull_view,
+            bear_initial=bear_view,
+            debate_rounds=memory.turns,
+            debate_summary=debate_summary,
+            rounds_completed=rounds_completed,
+            stop_reason=stop_reason,
+            saved_calls=saved_calls,
+            llm_calls=llm_calls
+        )
     
     def _get_rebuttal(self, side: str, own_view: Dict[str, Any], 
-                     opponent_view: Dict[str, Any], history: List[Dict],
-                     stock_data: Dict[str, Any]) -> str:
+                     opponent_view: Dict[str, Any], memory: DebateMemory,
+                     stock_data: StockData, shared_blocks: List[str]) -> str:
         """生成辩论反驳"""
         
-        context = f"""
-股票: {stock_data.get('basic_info', {}).get('name', 'N/A')} ({stock_data.get('ts_code', 'N/A')})
-
-你的初始观点（{side}）:
-{json.dumps(own_view, ensure_ascii=False, indent=2)}
+        context = f"""你的初始观点（{side}）:
+{compact_view(own_view)}
 
 对方观点:
-{json.dumps(opponent_view, ensure_ascii=False, indent=2)}
+{compact_view(opponent_view)}
 
 辩论历史:
-{json.dumps(history, ensure_ascii=False, indent=2)}
+{memory.context()}
 """
         
-        system_prompt = f"""你是{side}的代表，在进行投资辩论。
+        role_prompt = f"""你是{side}的代表，在进行投资辩论。
 
 请针对对方的观点进行反驳和补充论证：
 1. 指出对方观点的不足或偏颇之处
@@ -192,27 +188,26 @@ class DebateCoordinator:
 
 请直接输出反驳内容，无需JSON格式。"""
         
-        rebuttal = self.llm.analyze_with_system_prompt(system_prompt, context, temperature=0.8)
+        rebuttal = self.llm.chat(build_messages(stock_data, role_prompt, context, shared_blocks),
+                                 profile='rebuttal')
         return rebuttal
     
     def _summarize_debate(self, bull_view: Dict[str, Any], bear_view: Dict[str, Any],
-                         history: List[Dict], stock_data: Dict[str, Any]) -> Dict[str, Any]:
+                         memory: DebateMemory, stock_data: StockData,
+                         shared_blocks: List[str]) -> Dict[str, Any]:
         """总结辩论结果"""
         
-        context = f"""
-股票: {stock_data.get('basic_info', {}).get('name', 'N/A')} ({stock_data.get('ts_code', 'N/A')})
-
-看涨观点:
-{json.dumps(bull_view, ensure_ascii=False, indent=2)}
+        context = f"""看涨观点:
+{compact_view(bull_view)}
 
 看跌观点:
-{json.dumps(bear_view, ensure_ascii=False, indent=2)}
+{compact_view(bear_view)}
 
-完整辩论过程:
-{json.dumps(history, ensure_ascii=False, indent=2)}
+辩论过程:
+{memory.context()}
 """
         
-        system_prompt = """你是一位客观的投资顾问，需要总结看涨和看跌双方的辩论。
+        role_prompt = """你是一位客观的投资顾问，需要总结看涨和看跌双方的辩论。
 
 请提供一个平衡的总结：
 1. 双方的核心论点
@@ -232,7 +227,8 @@ class DebateCoordinator:
     "confidence_level": "建议信心(1-10)"
 }"""
         
-        response = self.llm.analyze_with_system_prompt(system_prompt, context)
+        response = self.llm.chat(build_messages(stock_data, role_prompt, context, shared_blocks),
+                                 profile='debate_summary')
         result = self.llm.parse_json_response(response)
         
         return result
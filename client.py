@@ -0,0 +1,142 @@
+"""
+常驻分析服务客户端
+只依赖标准库，不导入 pandas / tushare / openai，启动开销可忽略
+"""
+import json
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Any, Optional
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.config import DAEMON_HOST, DAEMON_PORT
+
+
+class DaemonClient:
+    """分析服务 HTTP 客户端"""
+
+    def __init__(self, host: str = DAEMON_HOST, port: int = DAEMON_PORT, timeout: float = 10):
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return json.loads(e.read() or b'{}') or {'error': str(e)}
+
+    def health(self) -> Dict[str, Any]:
+        return self._request('GET', '/health')
+
+    def analyze(self, stock_code: str, analysis_mode: str = 'standard', force: bool = False) -> Dict[str, Any]:
+        return self._request('POST', '/analyze', {'stock_code': stock_code, 'analysis_mode': analysis_mode,
+                                                  'force': force})
+
+    def decision(self, stock_code: str) -> Dict[str, Any]:
+        return self._request('GET', f'/decision/{stock_code}')
+
+    def reports(self, stock_code: str = None, limit: int = 20) -> Dict[str, Any]:
+        query = f"?limit={limit}" + (f"&stock={stock_code}" if stock_code else "")
+        return self._request('GET', f'/reports{query}')
+
+    def job(self, job_id: str) -> Dict[str, Any]:
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def jobs(self) -> Dict[str, Any]:
+        return self._request('GET', '/jobs')
+
+    def wait(self, job_id: str, poll_seconds: float = 2.0) -> Dict[str, Any]:
+        """轮询直到任务结束"""
+        while True:
+            job = self.job(job_id)
+            if job.get('status') not in ('queued', 'running'):
+                return job
+            time.sleep(poll_seconds)
+
+
+def _print_job(job: Dict[str, Any]):
+    if job.get('error') and 'job_id' not in job:
+        print(f"❌ {job['error']}")
+        return
+    tag = '（缓存结果）' if job.get('cached') else '（合并到进行中的任务）' if job.get('deduplicated') else ''
+    print(f"🔖 {job.get('job_id')} {job.get('stock_code')} [{job.get('status')}]{tag}")
+    decision = job.get('decision') or {}
+    if decision:
+        print(f"   决策: {decision.get('action', 'N/A')}，信心 {decision.get('confidence', 'N/A')}/10")
+        print(f"   风险: {(job.get('risk_assessment') or {}).get('overall_risk_level', 'N/A')}")
+        print(f"   报告: {job.get('report_file')}")
+    if job.get('status') == 'failed':
+        print(f"   错误: {job.get('error')}")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='常驻分析服务客户端（需先运行 python daemon.py）')
+    parser.add_argument('--host', default=DAEMON_HOST)
+    parser.add_argument('--port', type=int, default=DAEMON_PORT)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    analyze = sub.add_parser('analyze', help='提交分析任务')
+    analyze.add_argument('stock_codes', nargs='+')
+    analyze.add_argument('--mode', '-m', default='standard')
+    analyze.add_argument('--wait', '-w', action='store_true', help='等待任务完成并输出结果')
+    analyze.add_argument('--force', '-f', action='store_true', help='忽略本交易时段已有结果，重新分析')
+
+    decision = sub.add_parser('decision', help='查询个股最新决策')
+    decision.add_argument('stock_code')
+
+    reports = sub.add_parser('reports', help='报告列表')
+    reports.add_argument('stock_code', nargs='?')
+    reports.add_argument('--limit', type=int, default=20)
+
+    status = sub.add_parser('status', help='查询任务状态')
+    status.add_argument('job_id')
+
+    sub.add_parser('jobs', help='最近任务列表')
+    sub.add_parser('health', help='服务状态')
+
+    args = parser.parse_args()
+    client = DaemonClient(args.host, args.port)
+
+    try:
+        if args.command == 'analyze':
+            submitted = [client.analyze(code, args.mode, args.force) for code in args.stock_codes]
+            for job in submitted:
+                _print_job(client.wait(job['job_id']) if args.wait and 'job_id' in job else job)
+        elif args.command == 'status':
+            _print_job(client.job(args.job_id))
+        elif args.command == 'decision':
+            result = client.decision(args.stock_code)
+            if 'error' in result:
+                print(f"❌ {result['error']}")
+            else:
+                decision, risk = result.get('decision') or {}, result.get('risk_assessment') or {}
+                print(f"📌 {args.stock_code} {result.get('analysis_time')}")
+                print(f"   决策: {decision.get('action', 'N/A')}，信心 {decision.get('confidence', 'N/A')}/10")
+                print(f"   风险: {risk.get('overall_risk_level', 'N/A')}")
+                print(f"   报告: {result.get('report_file')}")
+        elif args.command == 'reports':
+            for report in client.reports(args.stock_code, args.limit).get('reports', []):
+                print(f"{report['stock_code']:<8} {report['date']} {report['time']}  {report['markdown']}")
+        elif args.command == 'jobs':
+            for job in client.jobs().get('jobs', []):
+                print(f"{job['job_id']}  {job['stock_code']:<10} {job['analysis_mode']:<12} "
+                      f"{job['status']:<8} {job['submitted_at']}")
+        else:
+            print(json.dumps(client.health(), ensure_ascii=False, indent=2))
+    except urllib.error.URLError as e:
+        print(f"❌ 无法连接分析服务 {client.base_url}（请先运行 python daemon.py）: {e.reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,23 @@ TUSHARE_TOKEN = os.getenv("TUSHARE_TOKEN", "")
 DEEPSEEK_API_BASE = "https://api.deepseek.com/v1"
 DEEPSEEK_MODEL = "deepseek-chat"
 
+# 多端点配置（OpenAI 兼容接口）：按健康度加权路由，主请求超过近期 p95 延迟时对冲到另一端点
+# models 为 逻辑模型名 → 该端点上的模型名 的映射，未列出时沿用逻辑模型名
+LLM_ENDPOINTS = [
+    {"name": "deepseek", "base_url": DEEPSEEK_API_BASE, "api_key": DEEPSEEK_API_KEY},
+]
+if os.getenv("LLM_BACKUP_BASE_URL"):
+    LLM_ENDPOINTS.append({
+        "name": "backup",
+        "base_url": os.getenv("LLM_BACKUP_BASE_URL"),
+        "api_key": os.getenv("LLM_BACKUP_API_KEY", ""),
+        "models": {DEEPSEEK_MODEL: os.getenv("LLM_BACKUP_MODEL", DEEPSEEK_MODEL)},
+    })
+LLM_HEDGE_ENABLED = True  # 多端点时启用对冲请求
+LLM_HEDGE_DELAY = 30.0  # 延迟样本不足时的对冲等待（秒）
+LLM_HEDGE_MIN_DELAY = 2.0  # 对冲等待下限（秒）
+LLM_STREAM_TIMEOUT = 120.0  # 流式请求的连接/读取超时（秒）：超过该时间收不到数据视为卡住，不再等到 SDK 默认的 600 秒
+
 # 股票池配置 - 可以在这里配置要监控的股票
 STOCK_WATCHLIST = [
     "600547.SH",  # 山东黄金
@@ -29,9 +46,43 @@ STOCK_WATCHLIST = [
     "300523.SZ",  # 辰安科技
 ]
 
-# 定时任务配置 - 双时段分析
+# 定时任务配置 - 多时段分析
 PRE_MARKET_TIME = "07:30"   # 开盘前分析时间
 MIDDAY_TIME = "12:00"       # 中午分析时间
+POST_MARKET_TIME = "15:30"  # 收盘后分析时间
+
+# 调度任务: (执行时间, 分析模式)
+SCHEDULE_JOBS = [
+    (PRE_MARKET_TIME, "pre_market"),
+    (MIDDAY_TIME, "midday"),
+    (POST_MARKET_TIME, "post_market"),
+]
+SCHEDULER_WORKERS = 3  # 任务线程池大小，避免长任务阻塞后续时段
+
+# 批量分析优先级与截止时间
+HELD_POSITIONS = [c.strip() for c in os.getenv("HELD_POSITIONS", "").split(",") if c.strip()]  # 持仓股票，最先分析
+PRIORITY_GAP_THRESHOLD = 3.0  # 上一交易日涨跌幅绝对值(%)超过该值优先分析
+PRIORITY_NEWS_MIN_MENTIONS = 1  # 隔夜新闻提及次数达到该值优先分析
+MODE_DEADLINES = {  # 各分析模式的完成截止时间，来不及时后续低优先级股票降级（减少辩论轮次 → 仅分析师筛查）
+    "pre_market": "09:25",
+    "midday": "12:55",
+}
+BATCH_WORKERS = 3  # 批量分析并发股票数
+STOCK_ESTIMATE_SECONDS = 180  # 单只股票完整分析耗时的初始估计（秒），运行中按实际耗时修正
+
+# 常驻分析服务（python daemon.py / python client.py）
+DAEMON_HOST = "127.0.0.1"  # 只监听本机
+DAEMON_PORT = int(os.getenv("DAEMON_PORT", "8765"))
+DAEMON_WORKERS = 2  # 并发分析任务数
+
+# 分析模式: 模式 -> (emoji, 名称)
+ANALYSIS_MODES = {
+    "pre_market": ("🌅", "开盘前分析"),
+    "midday": ("🕐", "中午分析"),
+    "post_market": ("🌆", "收盘后分析"),
+    "intraday": ("⚡", "盘中异动分析"),
+    "standard": ("📊", "标准分析"),
+}
 
 # 兼容性保持
 DAILY_REPORT_TIME = PRE_MARKET_TIME
@@ -39,20 +90,87 @@ DAILY_REPORT_TIME = PRE_MARKET_TIME
 # 报告配置
 REPORT_DIR = "reports"
 LOG_DIR = "logs"
+LLM_LEDGER_DIR = os.path.join(LOG_DIR, "llm_usage")  # LLM用量台账（每日一个 JSONL）
 DATA_CACHE_DIR = "data/cache"
+CHECKPOINT_DIR = "data/checkpoints"  # 批量分析断点续跑检查点
+
+# 持久化任务队列（python main.py --batch ... --queue / python worker.py）
+# 多机协作时 CHECKPOINT_DIR、REPORT_DIR 与队列文件需位于同一共享文件系统
+BATCH_USE_QUEUE = False  # 批量分析是否默认通过任务队列分发
+QUEUE_DB_PATH = os.getenv("QUEUE_DB_PATH", "data/queue/jobs.db")
+QUEUE_VISIBILITY_TIMEOUT = 900  # 租约时长（秒），工作进程定期续约，崩溃后超时由其他进程接手
+QUEUE_MAX_ATTEMPTS = 3  # 单只股票最大尝试次数
+QUEUE_POLL_SECONDS = 5  # 空闲时轮询间隔
+
+# 性能剖析（python main.py ... --profile / python scheduler.py --profile）
+PROFILE_SAMPLE_INTERVAL = 0.005  # 调用栈采样间隔（秒）
+PROFILE_TOP_ALLOCATIONS = 15  # 每个阶段列出的内存分配最多的代码行数
+
+# 实时看板（python main.py ... --dashboard / python scheduler.py --dashboard）
+DASHBOARD_REFRESH_PER_SECOND = 2  # 刷新频率
+DASHBOARD_MAX_ROWS = 20  # 股票表最多显示的行数（进行中优先）
+DASHBOARD_LOG_DIR = os.path.join(LOG_DIR, "runs")  # 看板期间的详细输出写入该目录的结构化日志（JSON Lines）
 
 # 分析配置
-MAX_DEBATE_ROUNDS = 2  # 辩论轮次
+MAX_DEBATE_ROUNDS = 2  # 辩论轮次（上限）
+DEBATE_SIMILARITY_THRESHOLD = 0.6  # 相邻两轮发言相似度超过该值视为收敛，提前结束
+DEBATE_CLEAR_CUT_GAP = 4  # 多空信心差距达到该值时第1轮后即结束
 ENABLE_NEWS_ANALYSIS = True  # 是否启用新闻分析
+ENABLE_SECTOR_ANALYSIS = True  # 批量分析时按行业共享一次行业背景分析
+SECTOR_MIN_MEMBERS = 2  # 同一行业至少有几只股票才做行业分析
+ENABLE_PORTFOLIO_RISK = True  # 批量分析时计算股票池组合风险供风险管理员参考
+PORTFOLIO_BENCHMARK = "000300.SH"  # Beta 基准指数（沪深300）
+PORTFOLIO_RISK_DAYS = 180  # 组合风险回看自然日数
+PORTFOLIO_VOL_WINDOW = 20  # 近期波动率窗口（交易日）
+ENABLE_PEER_VALUATION = True  # 基本面分析附带同行业估值百分位对比
 ANALYSIS_HISTORY_DAYS = 60  # 分析历史数据天数
 
-# LLM配置
+# 全市场扫描配置（python main.py --scan）
+SCAN_TOP_N = 10  # 扫描后进入批量分析的股票数
+SCAN_MOMENTUM_DAYS = 20  # 动量回看交易日数
+SCAN_MIN_MARKET_CAP = 50  # 最小总市值（亿元）
+SCAN_MIN_LIST_DAYS = 120  # 排除上市不足该天数的次新股
+
+# 盘中监控配置
+MONITOR_POLL_SECONDS = 60         # 轮询间隔（秒）
+MONITOR_WINDOW_MINUTES = 30       # 滚动窗口长度（分钟K线根数）
+MONITOR_PRICE_THRESHOLD = 2.0     # 窗口内涨跌幅超过该值(%)触发重新分析
+MONITOR_VOLUME_MULTIPLIER = 3.0   # 单分钟成交量超过窗口均量的倍数触发重新分析
+MONITOR_COOLDOWN_MINUTES = 30     # 同一股票两次触发的最小间隔
+
+# LLM配置：默认生成参数
 LLM_CONFIG = {
     "temperature": 0.7,
     "max_tokens": 4000,
     "top_p": 0.95,
 }
 
+# 各智能体的生成配置（覆盖默认值）：model / temperature / max_tokens / stop / response_format
+# 输出短、结构固定的角色（辩论反驳、摘要、新闻筛选）使用更小的 max_tokens；输出 JSON 的角色启用 JSON 模式
+JSON_MODE = {"type": "json_object"}
+AGENT_PROFILES = {
+    "technical": {"temperature": 0.5, "max_tokens": 2000, "response_format": JSON_MODE},
+    "fundamental": {"temperature": 0.5, "max_tokens": 2000, "response_format": JSON_MODE},
+    "news_triage": {"temperature": 0.2, "response_format": JSON_MODE},  # max_tokens 按每批文章数计算
+    "sector": {"temperature": 0.3, "max_tokens": 1500, "response_format": JSON_MODE},
+    "bull": {"temperature": 0.7, "max_tokens": 2000, "response_format": JSON_MODE},
+    "bear": {"temperature": 0.7, "max_tokens": 2000, "response_format": JSON_MODE},
+    "rebuttal": {"temperature": 0.8, "max_tokens": 800},
+    "debate_digest": {"temperature": 0.3, "max_tokens": 600},
+    "debate_summary": {"temperature": 0.5, "max_tokens": 1500, "response_format": JSON_MODE},
+    "trader": {"temperature": 0.6, "max_tokens": 2000, "response_format": JSON_MODE},
+    "risk": {"temperature": 0.5, "max_tokens": 2000, "response_format": JSON_MODE},
+}
+
+# 价格（元/百万tokens），用于成本预算
+LLM_PRICING = {
+    "deepseek-chat": {"input": 2.0, "cached_input": 0.5, "output": 8.0},
+}
+LLM_RUN_BUDGET_COST = 20.0  # 单次批量运行的LLM成本上限（元），超出后剩余股票只做筛查；None 为不限
+LLM_RUN_BUDGET_SECONDS = None  # 单次批量运行累计LLM调用耗时上限（秒）；None 为不限
+LLM_RUN_HARD_LIMIT_COST = 40.0  # 单次运行成本硬上限（元），超出后拒绝新的LLM调用并停止剩余股票；None 为不限
+LLM_DAILY_BUDGET_COST = 100.0  # 当日成本上限（元，跨运行、跨进程累计）；None 为不限
+
 # 验证配置
 def validate_config():
     """验证配置是否完整"""
@@ -0,0 +1,266 @@
+"""
+常驻分析服务
+进程常驻并保持 StockAnalysisSystem 预热（依赖已导入、客户端已认证、交易日历/新闻/财报缓存常驻内存），
+通过本机 HTTP 接口异步提交分析、轮询状态、查询最新决策和报告列表，可同时运行定时调度，临时任务与定时任务共享同一份缓存；
+同一股票、同一分析模式在同一交易时段内的请求合并为一次分析，已完成的结果直接返回
+客户端见 client.py
+"""
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, List
+from urllib.parse import parse_qs
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.config import (
+    ANALYSIS_MODES,
+    DAEMON_HOST,
+    DAEMON_PORT,
+    DAEMON_WORKERS,
+    validate_config
+)
+
+
+class AnalysisDaemon:
+    """常驻分析服务：任务表 + 线程池 + 按交易时段去重的结果缓存"""
+
+    MAX_JOBS = 500  # 任务表保留的最近任务数
+
+    def __init__(self, analysis_system, max_workers: int = DAEMON_WORKERS):
+        self.system = analysis_system
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='daemon')
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.started_at = datetime.now().isoformat()
+        self._lock = threading.Lock()
+        # (股票代码, 分析模式, 交易时段) → 任务ID：排队/运行中或已完成的任务
+        self._by_key: Dict[tuple, str] = {}
+
+    def _key(self, stock_code: str, analysis_mode: str) -> tuple:
+        return stock_code, analysis_mode, self.system.tushare_client.calendar.session_key()
+
+    def submit(self, stock_code: str, analysis_mode: str = 'standard', force: bool = False) -> Dict[str, Any]:
+        """提交单只股票分析任务，立即返回任务信息
+
+        本交易时段内已有同一股票、同一模式的任务时直接返回该任务（运行中则合并，已完成则为缓存结果）；
+        force=True 时忽略已完成的结果重新分析
+        """
+        key = self._key(stock_code, analysis_mode)
+        with self._lock:
+            existing = self.jobs.get(self._by_key.get(key))
+            if existing and (existing['status'] in ('queued', 'running') or
+                             (existing['status'] == 'done' and not force)):
+                reply = dict(existing)
+                reply['deduplicated' if existing['status'] != 'done' else 'cached'] = True
+                print(f"♻️ 复用任务 {existing['job_id']}: {stock_code} ({analysis_mode}, {existing['status']})")
+                return reply
+
+            job = {
+                'job_id': uuid.uuid4().hex[:12],
+                'stock_code': stock_code,
+                'analysis_mode': analysis_mode,
+                'session': key[2],
+                'status': 'queued',
+                'submitted_at': datetime.now().isoformat(),
+            }
+            self.jobs[job['job_id']] = job
+            self._by_key[key] = job['job_id']
+            while len(self.jobs) > self.MAX_JOBS:
+                _, dropped = self.jobs.popitem(last=False)
+                self._by_key = {k: v for k, v in self._by_key.items() if v != dropped['job_id']}
+            reply = dict(job)
+
+        self.executor.submit(self._run, job)
+        print(f"📥 收到任务 {job['job_id']}: {stock_code} ({analysis_mode})")
+        return reply
+
+    def _run(self, job: Dict[str, Any]):
+        with self._lock:
+            job.update(status='running', started_at=datetime.now().isoformat())
+        try:
+            result = self.system.analyze_stock(job['stock_code'], analysis_mode=job['analysis_mode'],
+                                               run_label=f"daemon_{job['job_id']}")
+            update = {
+                'decision': result.decision,
+                'risk_assessment': result.risk_assessment,
+                'report_file': result.report_file,
+                'duration_seconds': result.duration_seconds,
+                'status': 'done',
+            }
+        except Exception as e:
+            print(f"❌ 任务 {job['job_id']} 失败: {e}")
+            update = {'error': str(e), 'status': 'failed'}
+        # 结果字段与状态一次性写入，查询方不会看到已完成但缺少结果的任务
+        update['finished_at'] = datetime.now().isoformat()
+        with self._lock:
+            job.update(update)
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {k: job.get(k) for k in ('job_id', 'stock_code', 'analysis_mode', 'status', 'submitted_at')}
+                for job in reversed(self.jobs.values())
+            ]
+
+    def latest_decision(self, stock_code: str) -> Optional[Dict[str, Any]]:
+        """最新决策：优先取本进程内最近完成的任务，否则读取最新一份报告"""
+        with self._lock:
+            for job in reversed(self.jobs.values()):
+                if job['stock_code'] == stock_code and job['status'] == 'done':
+                    return {
+                        'stock_code': stock_code,
+                        'decision': job['decision'],
+                        'risk_assessment': job['risk_assessment'],
+                        'analysis_time': job['finished_at'],
+                        'report_file': job['report_file'],
+                        'source': 'job',
+                    }
+        report = self.system.report_generator.latest_report(stock_code)
+        if not report:
+            return None
+        return {
+            'stock_code': stock_code,
+            'decision': report.get('decision', {}),
+            'risk_assessment': report.get('risk_assessment', {}),
+            'analysis_time': report.get('analysis_time', ''),
+            'report_file': report.get('report_file', ''),
+            'source': 'report',
+        }
+
+    def list_reports(self, stock_code: str = None, limit: int = 50) -> List[Dict[str, str]]:
+        return self.system.report_generator.list_reports(stock_code, limit)
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            statuses = [job['status'] for job in self.jobs.values()]
+        return {
+            'status': 'ok',
+            'started_at': self.started_at,
+            'running': statuses.count('running'),
+            'queued': statuses.count('queued'),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """本机 JSON 接口
+
+    GET  /health                      服务状态
+    GET  /jobs                        最近任务列表
+    GET  /jobs/<job_id>               任务状态与结果
+    GET  /decision/<stock_code>       最新决策
+    GET  /reports?stock=&limit=       报告列表
+    POST /analyze                     {"stock_code": "600519.SH", "analysis_mode": "standard", "force": false}
+    """
+
+    daemon: AnalysisDaemon = None
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        params = {k: v[-1] for k, v in parse_qs(query).items()}
+        parts = [p for p in path.split('/') if p]
+        if parts == ['health']:
+            return self._reply(200, self.daemon.health())
+        if parts == ['jobs']:
+            return self._reply(200, {'jobs': self.daemon.list_jobs()})
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job = self.daemon.job(parts[1])
+            return self._reply(200, job) if job else self._reply(404, {'error': '任务不存在'})
+        if len(parts) == 2 and parts[0] == 'decision':
+            decision = self.daemon.latest_decision(parts[1])
+            return self._reply(200, decision) if decision else self._reply(404, {'error': '该股票暂无分析结果'})
+        if parts == ['reports']:
+            try:
+                limit = int(params.get('limit', 50))
+            except ValueError:
+                return self._reply(400, {'error': 'limit 必须为整数'})
+            return self._reply(200, {'reports': self.daemon.list_reports(params.get('stock'), limit)})
+        self._reply(404, {'error': '未知接口'})
+
+    def do_POST(self):
+        if self.path.split('?')[0].rstrip('/') != '/analyze':
+            return self._reply(404, {'error': '未知接口'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._reply(400, {'error': '请求体不是合法JSON'})
+
+        stock_code = body.get('stock_code')
+        analysis_mode = body.get('analysis_mode', 'standard')
+        if not stock_code:
+            return self._reply(400, {'error': '缺少 stock_code'})
+        if analysis_mode not in ANALYSIS_MODES:
+            return self._reply(400, {'error': f'未知分析模式: {analysis_mode}'})
+        job = self.daemon.submit(stock_code, analysis_mode, force=bool(body.get('force')))
+        self._reply(200 if job['status'] == 'done' else 202, job)
+
+    def _reply(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # 任务日志由 AnalysisDaemon 输出
+
+
+def serve(daemon: AnalysisDaemon, host: str = DAEMON_HOST, port: int = DAEMON_PORT):
+    """启动 HTTP 服务（阻塞）"""
+    handler = type('BoundHandler', (DaemonRequestHandler,), {'daemon': daemon})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"🛰️ 分析服务已启动: http://{host}:{port}")
+    print("💡 提示: 按 Ctrl+C 停止服务\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n\n⏹️ 分析服务已停止")
+    finally:
+        server.server_close()
+        daemon.shutdown()
+
+
+def main():
+    """主函数"""
+    import argparse
+    from main import StockAnalysisSystem
+
+    parser = argparse.ArgumentParser(description='常驻分析服务')
+    parser.add_argument('--host', default=DAEMON_HOST, help=f'监听地址（默认 {DAEMON_HOST}）')
+    parser.add_argument('--port', type=int, default=DAEMON_PORT, help=f'监听端口（默认 {DAEMON_PORT}）')
+    parser.add_argument('--workers', type=int, default=DAEMON_WORKERS, help='并发分析任务数')
+    parser.add_argument('--with-scheduler', action='store_true',
+                        help='同时运行定时调度（与临时任务共享缓存）')
+
+    args = parser.parse_args()
+
+    validate_config()
+    system = StockAnalysisSystem()
+    system.warm_up()
+
+    if args.with_scheduler:
+        from scheduler import DailyScheduler
+        scheduler = DailyScheduler(analysis_system=system)
+        threading.Thread(target=scheduler.start, name='scheduler', daemon=True).start()
+
+    serve(AnalysisDaemon(system, max_workers=args.workers), args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+实时看板
+批量分析和定时调度的 rich 实时界面：逐股票的阶段进度、进行中的 LLM / Tushare 调用、滚动延迟分位数、
+缓存命中率和预计剩余时间。看板期间各模块的详细输出（print）改写入带缓冲的结构化日志（JSON Lines），不再逐行刷屏
+"""
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Dict, List, Set
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from rich.console import Console, Group
+from rich.live import Live
+from rich.table import Table
+from rich.text import Text
+
+from config.config import (
+    DASHBOARD_REFRESH_PER_SECOND,
+    DASHBOARD_MAX_ROWS,
+    DASHBOARD_LOG_DIR,
+    STOCK_ESTIMATE_SECONDS,
+    ANALYSIS_MODES,
+)
+from agents.llm_budget import current_stock
+from data.batch_planner import StockTask, DEPTH_LABELS
+from data.profiler import STAGE_LABELS
+
+STAGES = sorted(set(STAGE_LABELS.values()))
+STATUS_STYLES = {'queued': ('排队', 'dim'), 'running': ('进行中', 'cyan'), 'done': ('完成', 'green'),
+                 'failed': ('失败', 'red')}
+NOTABLE_PREFIXES = ('❌', '⚠️', '⛔', '💸', '⏱️', '🔁')  # 显示在看板底部的输出
+
+
+class StructuredLog:
+    """按行记录输出 {time, thread, stock, stream, text}，攒满一批再写入文件（线程安全）"""
+
+    def __init__(self, path: str, flush_lines: int = 200, recent: int = 6):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.flush_lines = flush_lines
+        self.lines = 0
+        self.recent = deque(maxlen=recent)  # 最近的警告/错误
+        self._file = open(path, 'a', encoding='utf-8')
+        self._partial: Dict[tuple, str] = {}  # print 会分多次写入，按 (线程, 流) 拼接成整行
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+
+    def stream(self, name: str) -> '_LogStream':
+        return _LogStream(self, name)
+
+    def write(self, text: str, stream: str):
+        key = (threading.get_ident(), stream)
+        with self._lock:
+            *lines, rest = (self._partial.pop(key, '') + text).split('\n')
+            if rest:
+                self._partial[key] = rest
+            for line in lines:
+                self._add(line.strip(), stream)
+            if len(self._pending) >= self.flush_lines:
+                self._flush()
+
+    def _add(self, line: str, stream: str):
+        if not line or not line.strip('=-'):  # 跳过空行和分隔线
+            return
+        self._pending.append(json.dumps({
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'thread': threading.current_thread().name,
+            'stock': current_stock.get(),
+            'stream': stream,
+            'text': line,
+        }, ensure_ascii=False))
+        self.lines += 1
+        if stream == 'stderr' or line.startswith(NOTABLE_PREFIXES):
+            self.recent.append(f"{datetime.now():%H:%M:%S} {current_stock.get() or '-':<9} {line}")
+
+    def _flush(self):
+        if self._pending:
+            self._file.write("\n".join(self._pending) + "\n")
+            self._file.flush()
+            self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            for (_, stream), rest in self._partial.items():
+                self._add(rest.strip(), stream)
+            self._partial.clear()
+            self._flush()
+            self._file.close()
+
+
+class _LogStream(io.TextIOBase):
+    """替代 sys.stdout / sys.stderr 的写入端"""
+
+    def __init__(self, log: StructuredLog, name: str):
+        self._log = log
+        self._name = name
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self._log.write(text, self._name)
+        return len(text)
+
+    def flush(self):
+        pass  # 由看板定期落盘
+
+
+@dataclass(slots=True)
+class StockRow:
+    """看板中一只股票的状态"""
+    ts_code: str
+    reasons: List[str] = field(default_factory=list)
+    status: str = 'queued'
+    depth: str = 'full'
+    done: Set[str] = field(default_factory=set)
+    current: str = ''
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+
+def _duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '-'
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes // 60}:{minutes % 60:02d}:{seconds:02d}" if minutes >= 60 else f"{minutes}:{seconds:02d}"
+
+
+class Dashboard:
+    """批量分析实时看板（事件接口线程安全）"""
+
+    def __init__(self, refresh_per_second: float = DASHBOARD_REFRESH_PER_SECOND,
+                 max_rows: int = DASHBOARD_MAX_ROWS, log_dir: str = DASHBOARD_LOG_DIR):
+        self.refresh_per_second = refresh_per_second
+        self.max_rows = max_rows
+        self.log_dir = log_dir
+        self.note = ''  # 空闲时显示的提示（如调度器的下次执行时间）
+        self.system = None
+        self.log: Optional[StructuredLog] = None
+        self._rows: Dict[str, StockRow] = {}
+        self._order: Dict[str, int] = {}
+        self._run_id = ''
+        self._mode = ''
+        self._budget = None  # 本次批量运行的 RunBudget
+        self._workers = 1
+        self._estimate = STOCK_ESTIMATE_SECONDS
+        self._batch_start: Optional[float] = None
+        self._live: Optional[Live] = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    # ---------- 生命周期 ----------
+
+    def start(self, system):
+        """接管终端输出并开始刷新；system 为 StockAnalysisSystem，用于读取调用、缓存和预算统计"""
+        self.system = system
+        self._stdout, self._stderr = sys.stdout, sys.stderr
+        self.log = StructuredLog(os.path.join(self.log_dir, f"{datetime.now():%Y%m%d_%H%M%S}.jsonl"))
+        console = Console(file=self._stdout)
+        sys.stdout, sys.stderr = self.log.stream('stdout'), self.log.stream('stderr')
+        self._live = Live(get_renderable=self.render, console=console,
+                          refresh_per_second=self.refresh_per_second,
+                          redirect_stdout=False, redirect_stderr=False)
+        self._live.start()
+
+    def stop(self):
+        """停止刷新（保留最后一帧），恢复终端输出"""
+        if self._live is not None:
+            self._live.stop()
+            if not self._live.console.is_terminal:
+                self._live.console.line()  # 非终端只输出最后一帧，且不带换行
+            self._live = None
+        sys.stdout, sys.stderr = self._stdout, self._stderr
+        if self.log is not None:
+            self.log.close()
+            print(f"📝 详细输出已写入 {self.log.path}（{self.log.lines} 行）")
+
+    # ---------- 事件 ----------
+
+    def begin_batch(self, run_id: str, analysis_mode: str, tasks: List[StockTask], workers: int,
+                    estimate_seconds: float = STOCK_ESTIMATE_SECONDS, budget=None):
+        with self._lock:
+            self._run_id = run_id
+            self._mode = analysis_mode
+            self._budget = budget
+            self._workers = max(workers, 1)
+            self._estimate = estimate_seconds
+            self._batch_start = time.time()
+            self._rows = {t.ts_code: StockRow(t.ts_code, list(t.reasons)) for t in tasks}
+            self._order = {t.ts_code: i for i, t in enumerate(tasks)}
+
+    def _row(self, stock_code: str) -> StockRow:
+        # 单只分析、队列任务等未经 begin_batch 登记的股票自动加入
+        if stock_code not in self._rows:
+            self._rows[stock_code] = StockRow(stock_code)
+            self._order[stock_code] = len(self._order)
+        return self._rows[stock_code]
+
+    def stock_started(self, stock_code: str, depth: str = 'full'):
+        with self._lock:
+            row = self._row(stock_code)
+            row.status, row.depth = 'running', depth
+            row.started, row.finished = time.time(), None
+            row.done.clear()
+
+    def stock_finished(self, stock_code: str, ok: bool):
+        with self._lock:
+            row = self._row(stock_code)
+            row.status = 'done' if ok else 'failed'
+            row.current = ''
+            row.finished = time.time()
+
+    @contextmanager
+    def stage(self, stock_code: str, stage: str):
+        label = STAGE_LABELS.get(stage, stage)
+        with self._lock:
+            self._row(stock_code).current = label
+        try:
+            yield
+        finally:
+            with self._lock:
+                row = self._row(stock_code)
+                row.done.add(label)
+                row.current = ''
+
+    # ---------- 渲染 ----------
+
+    def _loaded(self, name: str):
+        """已创建的组件（不触发惰性创建）"""
+        return self.system.__dict__.get(name) if self.system is not None else None
+
+    def render(self) -> Group:
+        now = time.time()
+        if self.log is not None and now - self._last_flush >= 2:
+            self.log.flush()
+            self._last_flush = now
+        with self._lock:
+            rows = [StockRow(r.ts_code, r.reasons, r.status, r.depth, set(r.done), r.current, r.started, r.finished)
+                    for r in self._rows.values()]
+            order = dict(self._order)
+        return Group(self._header(rows, now), self._stock_table(rows, order, now),
+                     self._calls_table(), self._footer())
+
+    def _header(self, rows: List[StockRow], now: float) -> Text:
+        counts = {status: sum(1 for r in rows if r.status == status) for status in STATUS_STYLES}
+        if not rows:
+            return Text(f"📊 等待分析任务 {self.note}", style='bold')
+        durations = [r.finished - r.started for r in rows if r.status == 'done' and r.started]
+        average = sum(durations) / len(durations) if durations else self._estimate
+        running_left = sum(max(average - (now - r.started), 0) for r in rows if r.status == 'running')
+        eta = (counts['queued'] * average + running_left) / self._workers
+        mode = ANALYSIS_MODES.get(self._mode, ('', self._mode))[1]
+        elapsed = now - self._batch_start if self._batch_start else None
+        text = Text.assemble(
+            (f"📊 {mode} {self._run_id}  ", 'bold'),
+            (f"完成 {counts['done']}/{len(rows)}  ", 'green'),
+            (f"失败 {counts['failed']}  ", 'red' if counts['failed'] else 'dim'),
+            f"进行中 {counts['running']}  排队 {counts['queued']}  ",
+            f"用时 {_duration(elapsed)}  ",
+            (f"预计剩余 {_duration(eta) if counts['queued'] + counts['running'] else '-'}", 'bold'),
+        )
+        if self.note and not counts['queued'] + counts['running']:
+            text.append(f"  {self.note}", style='dim')
+        return text
+
+    def _stock_table(self, rows: List[StockRow], order: Dict[str, int], now: float) -> Table:
+        rank = {'running': 0, 'queued': 1, 'failed': 2, 'done': 3}
+        rows.sort(key=lambda r: (rank[r.status], -(r.finished or 0), order.get(r.ts_code, 0)))
+        shown = rows[:self.max_rows]
+        table = Table(expand=True, box=None, pad_edge=False,
+                      caption=f"… 另有 {len(rows) - len(shown)} 只" if len(rows) > len(shown) else None)
+        for column in ('股票', '状态', '阶段', '当前', '深度', '用时', '优先原因'):
+            table.add_column(column, no_wrap=True)
+        for row in shown:
+            label, style = STATUS_STYLES[row.status]
+            marks = Text()
+            for stage in STAGES:
+                if stage == row.current:
+                    marks.append('●', style='cyan')
+                elif stage in row.done:
+                    marks.append('✔', style='green')
+                else:
+                    marks.append('·', style='dim')
+            elapsed = ((row.finished or now) - row.started) if row.started else None
+            table.add_row(row.ts_code, Text(label, style=style), marks, row.current[2:] if row.current else '',
+                          DEPTH_LABELS.get(row.depth, row.depth) if row.depth != 'full' else '',
+                          _duration(elapsed), '、'.join(row.reasons))
+        return table
+
+    def _calls_table(self) -> Table:
+        table = Table(title="外部调用（最近200次延迟）", title_justify='left', expand=True, box=None, pad_edge=False)
+        for column in ('类型', '进行中', '调用', '错误', 'p50', 'p95', 'p99'):
+            table.add_column(column, justify='left' if column == '类型' else 'right')
+        for name, component in (('LLM', self._loaded('llm_client')), ('Tushare', self._loaded('tushare_client'))):
+            stats = getattr(component, 'stats', None)
+            if stats is None:
+                continue
+            quantiles = stats.percentiles(0.5, 0.95, 0.99)
+            table.add_row(name, str(stats.in_flight), str(stats.calls),
+                          Text(str(stats.errors), style='red' if stats.errors else ''),
+                          *(f"{q:.2f}s" if q is not None else '-' for q in quantiles.values()))
+        return table
+
+    def _footer(self) -> Group:
+        parts = []
+        llm, tushare = self._loaded('llm_client'), self._loaded('tushare_client')
+        if llm is not None and getattr(llm, 'stats', None) is not None:
+            prompt = llm.stats.counters['prompt_tokens']
+            if prompt:
+                parts.append(f"LLM前缀缓存 {llm.stats.counters['cached_tokens'] / prompt:.0%}")
+        caches = (('财报缓存', getattr(getattr(tushare, 'financial_cache', None), 'hit_rate', None)),
+                  ('新闻分类缓存', getattr(getattr(self._loaded('news_analyst'), 'article_cache', None),
+                                     'hit_rate', None)))
+        for name, hit_rate in caches:
+            if hit_rate is not None and hit_rate.rate is not None:
+                parts.append(f"{name} {hit_rate.rate:.0%}（{hit_rate.hits}/{hit_rate.hits + hit_rate.misses}）")
+        budget = self._budget or self._loaded('run_budget')
+        if budget is not None:
+            limit = f" / ¥{budget.max_cost:.2f}" if budget.max_cost is not None else ""
+            parts.append(f"LLM成本 ¥{budget.cost:.2f}{limit}")
+
+        lines = [Text("  ".join(parts) or "缓存命中率: -", style='bold')]
+        if self.log is not None:
+            lines += [Text(line, style='yellow', overflow='ellipsis', no_wrap=True) for line in list(self.log.recent)]
+            lines.append(Text(f"详细输出: {self.log.path}", style='dim'))
+        return Group(*lines)
@@ -0,0 +1,145 @@
+"""
+批量分析排程
+按持仓、隔夜新闻、上一交易日大幅波动为股票池排定优先级，高优先级先分析；
+有完成截止时间（如开盘前分析须在开盘前完成）时，按已完成股票的实际耗时预估剩余工作量（含执行中的股票），
+来不及时对后续低优先级股票逐级降级：减少辩论轮次，再到只做分析师筛查、跳过多空辩论
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Iterable
+import threading
+import time
+import pandas as pd
+
+# 各分析深度相对完整分析的耗时比例（初始估计，运行中按实际耗时修正）
+DEPTH_COST_RATIO = {'full': 1.0, 'reduced': 0.75, 'screening': 0.45}
+DEPTH_LABELS = {'full': '完整分析', 'reduced': '精简辩论', 'screening': '仅筛查'}
+
+
+@dataclass(slots=True)
+class StockTask:
+    """待分析股票"""
+    ts_code: str
+    priority: int = 0
+    reasons: List[str] = field(default_factory=list)
+    order: int = 0  # 原股票池中的位置，同优先级按原顺序
+
+
+def prioritize_stocks(stock_codes: List[str], held: Iterable[str] = (),
+                      quotes: Optional[pd.DataFrame] = None, news: Optional[pd.DataFrame] = None,
+                      gap_threshold: float = 3.0, news_min_mentions: int = 1) -> List[StockTask]:
+    """计算优先级并排序（高优先级在前）
+
+    Args:
+        held: 持仓股票
+        quotes: 最近一根日线（含 name、pct_chg），见 TushareClient.get_quote_table
+        news: 隔夜新闻（含 title、content）
+        gap_threshold: 上一交易日涨跌幅绝对值(%)达到该值视为大幅波动
+        news_min_mentions: 隔夜新闻中被提及的最少条数
+    """
+    held = set(held)
+    quotes = quotes if quotes is not None and not quotes.empty else pd.DataFrame(columns=['ts_code'])
+    quotes = quotes.drop_duplicates('ts_code').set_index('ts_code')
+
+    text = None
+    if news is not None and not news.empty:
+        columns = [c for c in ('title', 'content') if c in news.columns]
+        text = news[columns].fillna('').astype(str).agg(' '.join, axis=1)
+
+    tasks = []
+    for order, code in enumerate(stock_codes):
+        task = StockTask(code, order=order)
+        if code in held:
+            task.priority += 100
+            task.reasons.append('持仓')
+
+        row = quotes.loc[code] if code in quotes.index else None
+        if text is not None and row is not None and isinstance(row.get('name'), str):
+            mentions = int(text.str.contains(row['name'], regex=False).sum())
+            if mentions >= news_min_mentions:
+                task.priority += 10 * min(mentions, 5)
+                task.reasons.append(f'隔夜新闻{mentions}条')
+
+        pct_chg = row.get('pct_chg') if row is not None else None
+        if pct_chg is not None and pd.notna(pct_chg) and abs(pct_chg) >= gap_threshold:
+            task.priority += 5 * int(abs(pct_chg))
+            task.reasons.append(f'上一交易日{pct_chg:+.1f}%')
+        tasks.append(task)
+
+    return sorted(tasks, key=lambda t: (-t.priority, t.order))
+
+
+class DeadlinePlanner:
+    """截止时间预估与降级决策（线程安全）"""
+
+    def __init__(self, deadline: Optional[datetime], workers: int, estimate_seconds: float,
+                 max_debate_rounds: int):
+        self.deadline = deadline
+        self.workers = max(workers, 1)
+        self.max_debate_rounds = max_debate_rounds
+        self._full_seconds = estimate_seconds  # 完整分析耗时估计，其他深度按比例折算
+        self._running: Dict[str, tuple] = {}  # 本进程执行中的股票 → (深度, 开始时刻)
+        self._lock = threading.Lock()
+
+    def debate_rounds(self, depth: str) -> int:
+        """分析深度对应的辩论轮次（0 表示跳过辩论）"""
+        return {'full': self.max_debate_rounds, 'reduced': min(1, self.max_debate_rounds),
+                'screening': 0}[depth]
+
+    def choose_depth(self, remaining: int, now: Optional[datetime] = None,
+                     workers: Optional[int] = None, in_flight: Optional[int] = None) -> str:
+        """为即将开始的股票选择分析深度
+
+        remaining: 含本只在内尚未开始的股票数。本只取能保证“其后股票全部按筛查计”仍在截止时间前完成的最深一级，
+        因此时间紧张时先被降级的是排在后面的低优先级股票。
+        执行中的股票的剩余耗时同样计入：默认取本进程 start() 登记的股票；
+        多进程队列中由调用方给出执行中的任务数 in_flight（剩余耗时按完整分析的一半估计）和当前并发数 workers
+        """
+        if self.deadline is None:
+            return 'full'
+        now = now or datetime.now()
+        workers = max(workers or self.workers, 1)
+        with self._lock:
+            if in_flight is None:
+                clock = time.monotonic()
+                running = sum(max(self._full_seconds * DEPTH_COST_RATIO[depth] - (clock - started), 0)
+                              for depth, started in self._running.values())
+            else:
+                running = self._full_seconds * 0.5 * in_flight
+            tail = self._full_seconds * DEPTH_COST_RATIO['screening'] * (remaining - 1) + running
+            for depth in ('full', 'reduced'):
+                seconds = (self._full_seconds * DEPTH_COST_RATIO[depth] + tail) / workers
+                if now + timedelta(seconds=seconds) <= self.deadline:
+                    return depth
+        return 'screening'
+
+    def start(self, ts_code: str, depth: str):
+        """登记开始分析的股票"""
+        with self._lock:
+            self._running[ts_code] = (depth, time.monotonic())
+
+    def finish(self, ts_code: str, record: bool = True):
+        """股票结束分析；record=True 时用实际耗时修正估计（折算为完整分析耗时后指数加权）
+
+        从检查点续跑的股票耗时不具代表性，应传 record=False
+        """
+        with self._lock:
+            entry = self._running.pop(ts_code, None)
+            if entry is None or not record:
+                return
+            depth, started = entry
+            seconds = time.monotonic() - started
+            self._full_seconds = 0.5 * self._full_seconds + 0.5 * seconds / DEPTH_COST_RATIO[depth]
+
+    def estimate(self, depth: str) -> float:
+        with self._lock:
+            return self._full_seconds * DEPTH_COST_RATIO[depth]
+
+
+def parse_deadline(clock: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """'HH:MM' → 今天该时刻"""
+    if not clock:
+        return None
+    now = now or datetime.now()
+    hour, minute = (int(part) for part in clock.split(':'))
+    return now.replace(hour=hour, minute=minute, second=0, microsecond=0)
@@ -0,0 +1,91 @@
+"""
+外部调用与缓存统计
+记录 Tushare / LLM 调用的进行中数量、滚动延迟分位数和错误数，以及各缓存的命中率，供实时看板展示
+"""
+from collections import deque, Counter
+from contextlib import contextmanager
+from typing import Optional, Dict
+import threading
+import time
+
+
+class CallStats:
+    """一类外部调用的统计（线程安全）"""
+
+    def __init__(self, window: int = 200):
+        """window: 计算延迟分位数的最近调用数"""
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window)
+        self.counters: Counter = Counter()  # 附加计数（如 LLM 的输入 tokens、缓存命中 tokens）
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        """统计一次调用：进入时计为进行中，正常结束时记录延迟，抛出异常时计为错误"""
+        with self._lock:
+            self.in_flight += 1
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.in_flight -= 1
+                self.calls += 1
+                if ok:
+                    self.latencies.append(seconds)
+                else:
+                    self.errors += 1
+
+    def count(self, **values: int):
+        with self._lock:
+            self.counters.update(values)
+
+    def percentiles(self, *quantiles: float) -> Dict[float, Optional[float]]:
+        """最近调用延迟的分位数（秒），无样本时为 None"""
+        with self._lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return {q: None for q in quantiles}
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in quantiles}
+
+
+class HitRate:
+    """缓存命中计数（线程安全）"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hits: int = 0, misses: int = 0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    @property
+    def rate(self) -> Optional[float]:
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+
+class TrackedApi:
+    """接口代理：每次方法调用都计入 CallStats（如 Tushare pro_api 实例）"""
+
+    def __init__(self, api, stats: CallStats):
+        self._api = api
+        self._stats = stats
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._stats.track():
+                return attr(*args, **kwargs)
+        return call
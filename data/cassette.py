@@ -0,0 +1,183 @@
+"""
+录制/回放卡带
+录制模式记录每次 Tushare 接口返回的 DataFrame 和每次 LLM 请求的回复（gzip 压缩的 JSON Lines），
+回放模式按请求内容原样返回，不访问网络，用于复现生产运行、离线全速剖析和在相同输入上对比性能改动。
+请求先按内容精确匹配；日期等参数随运行时间变化而匹配不上时，按同类请求（接口+股票、智能体+股票）的录制顺序匹配
+"""
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any, Callable, List
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import pandas as pd
+
+CASSETTE_VERSION = 1
+
+
+class CassetteMiss(LookupError):
+    """回放时卡带中没有对应的录制"""
+
+
+def _request_key(kind: str, request: Dict[str, Any]) -> str:
+    raw = json.dumps(request, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(f"{kind}|{raw}".encode('utf-8')).hexdigest()
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, pd.DataFrame):
+        split = value.to_dict('split')
+        return {'__frame__': True, 'columns': split['columns'], 'data': split['data'],
+                'dtypes': [str(dtype) for dtype in value.dtypes]}
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict) and value.get('__frame__'):
+        df = pd.DataFrame(value['data'], columns=value['columns'])
+        try:
+            return df.astype(dict(zip(value['columns'], value['dtypes'])))
+        except (TypeError, ValueError):
+            return df
+    return value
+
+
+class Cassette:
+    """一次运行的录制/回放卡带（线程安全）"""
+
+    def __init__(self, path: str, mode: str):
+        """
+        Args:
+            path: 卡带文件（建议 .jsonl.gz）
+            mode: 'record' 录制（覆盖已有文件）/ 'replay' 回放
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"未知的卡带模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.stats = {'recorded': 0, 'exact': 0, 'loose': 0, 'miss': 0}
+        # 录制和回放都使用独立的空缓存目录：本地磁盘缓存的状态不同会改变实际发出的请求
+        self.cache_dir = tempfile.mkdtemp(prefix='cassette_cache_')
+
+        if mode == 'record':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._file = gzip.open(path, 'wt', encoding='utf-8')
+            self.header = {'cassette': CASSETTE_VERSION, 'recorded_at': datetime.now().isoformat(timespec='seconds'),
+                           'argv': sys.argv[1:]}
+            self._file.write(json.dumps(self.header, ensure_ascii=False) + "\n")
+        else:
+            self._file = None
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or lines[0].get('cassette') != CASSETTE_VERSION:
+            raise ValueError(f"不是有效的卡带文件: {self.path}")
+        self.header = lines[0]
+        self._entries: List[Dict[str, Any]] = lines[1:]
+        self._by_key: Dict[str, deque] = {}
+        self._by_loose: Dict[tuple, deque] = {}
+        for entry in self._entries:
+            entry['used'] = False
+            self._by_key.setdefault(entry['key'], deque()).append(entry)
+            self._by_loose.setdefault((entry['kind'], entry.get('loose')), deque()).append(entry)
+
+    def call(self, kind: str, request: Dict[str, Any], compute: Callable[[], Any],
+             loose: Optional[str] = None) -> Any:
+        """录制模式执行 compute 并记录结果（含异常）；回放模式返回录制的结果或重新抛出录制的异常
+
+        kind: 请求类别（tushare / llm / depth）
+        request: 决定结果的全部请求参数
+        loose: 精确匹配失败时的同类请求分组
+        """
+        key = _request_key(kind, request)
+        if self.replaying:
+            return self._replay(kind, key, loose, request)
+
+        entry = {'kind': kind, 'key': key, 'loose': loose}
+        try:
+            value = compute()
+            entry['value'] = _encode(value)
+        except Exception as e:
+            entry['error'] = f"{type(e).__name__}: {e}"
+            self._write(entry)
+            raise
+        self._write(entry)
+        return value
+
+    def _write(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.stats['recorded'] += 1
+
+    def _replay(self, kind: str, key: str, loose: Optional[str], request: Dict[str, Any]) -> Any:
+        with self._lock:
+            entry = self._take(self._by_key.get(key))
+            if entry is not None:
+                self.stats['exact'] += 1
+            else:
+                entry = self._take(self._by_loose.get((kind, loose)))
+                if entry is None:
+                    self.stats['miss'] += 1
+                    summary = json.dumps(request, ensure_ascii=False, default=str)[:200]
+                    raise CassetteMiss(f"卡带中没有该{kind}请求的录制: {summary}")
+                self.stats['loose'] += 1
+        if 'error' in entry:
+            raise RuntimeError(f"（回放录制的错误）{entry['error']}")
+        return _decode(entry['value'])
+
+    @staticmethod
+    def _take(queue: Optional[deque]) -> Optional[Dict[str, Any]]:
+        """取出队列中第一条未使用的录制"""
+        while queue:
+            entry = queue.popleft()
+            if not entry['used']:
+                entry['used'] = True
+                return entry
+        return None
+
+    def wrap_pro(self, pro) -> '_CassettePro':
+        """包装 Tushare pro_api 实例（回放时 pro 可为 None）"""
+        return _CassettePro(self, pro)
+
+    def close(self):
+        """结束录制/回放并打印统计"""
+        if self._file is not None:
+            with self._lock:
+                self._file.close()
+                self._file = None
+            size = os.path.getsize(self.path) / 1024
+            print(f"📼 已录制 {self.stats['recorded']} 次调用 → {self.path}（{size:.0f} KB）")
+        elif self.replaying:
+            unused = sum(1 for entry in self._entries if not entry['used'])
+            print(f"📼 回放 {self.header['recorded_at']} 录制的卡带: 精确匹配 {self.stats['exact']}，"
+                  f"按顺序匹配 {self.stats['loose']}，未命中 {self.stats['miss']}，未使用 {unused}")
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+class _CassettePro:
+    """Tushare pro_api 代理：所有接口调用经过卡带"""
+
+    def __init__(self, cassette: Cassette, pro):
+        self._cassette = cassette
+        self._pro = pro
+
+    def __getattr__(self, api_name: str):
+        def call(*args, **kwargs):
+            request = {'api': api_name, 'args': list(args), 'kwargs': kwargs}
+            return self._cassette.call('tushare', request,
+                                       lambda: getattr(self._pro, api_name)(*args, **kwargs),
+                                       loose=f"{api_name}|{kwargs.get('ts_code', '')}")
+        return call
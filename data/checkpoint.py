@@ -0,0 +1,105 @@
+"""
+批量分析断点续跑
+按 股票 × 阶段 原子写入检查点，进程崩溃后可通过 run_id 跳过已完成的股票和阶段
+"""
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+import os
+import json
+
+from config.config import CHECKPOINT_DIR
+
+
+def atomic_write_json(path: str, data: Any):
+    """先写临时文件再 os.replace，保证读到的检查点总是完整的"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class StockCheckpoint:
+    """单只股票的阶段检查点"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stages: Dict[str, Any] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.stages = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 检查点损坏，重新分析: {path} ({e})")
+                self.stages = {}
+
+    def has(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def get(self, stage: str) -> Any:
+        return self.stages.get(stage)
+
+    def save(self, stage: str, value: Any):
+        """记录一个已完成阶段"""
+        self.stages[stage] = value
+        atomic_write_json(self.path, self.stages)
+
+    @property
+    def completed(self) -> bool:
+        return self.has('report')
+
+
+class BatchCheckpoint:
+    """一次批量分析运行的检查点目录"""
+
+    def __init__(self, run_id: str, stock_codes: List[str], analysis_mode: str,
+                 root: str = CHECKPOINT_DIR, created_at: Optional[str] = None):
+        self.run_id = run_id
+        self.stock_codes = stock_codes
+        self.analysis_mode = analysis_mode
+        self.run_dir = os.path.join(root, run_id)
+        self.created_at = created_at or datetime.now().isoformat()
+
+    @classmethod
+    def create(cls, stock_codes: List[str], analysis_mode: str,
+               root: str = CHECKPOINT_DIR) -> 'BatchCheckpoint':
+        """新建运行"""
+        run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{analysis_mode}"
+        checkpoint = cls(run_id, list(stock_codes), analysis_mode, root)
+        os.makedirs(checkpoint.run_dir, exist_ok=True)
+        atomic_write_json(os.path.join(checkpoint.run_dir, 'meta.json'), {
+            'run_id': run_id,
+            'stock_codes': checkpoint.stock_codes,
+            'analysis_mode': analysis_mode,
+            'created_at': checkpoint.created_at,
+        })
+        return checkpoint
+
+    @classmethod
+    def load(cls, run_id: str, root: str = CHECKPOINT_DIR) -> Optional['BatchCheckpoint']:
+        """加载已有运行，不存在时返回 None"""
+        meta_file = os.path.join(root, run_id, 'meta.json')
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(run_id, meta['stock_codes'], meta['analysis_mode'], root, meta.get('created_at'))
+
+    def stock(self, ts_code: str) -> StockCheckpoint:
+        return StockCheckpoint(os.path.join(self.run_dir, f"{ts_code}.json"))
+
+    def load_sectors(self) -> Dict[str, Any]:
+        """本次运行已完成的行业背景分析"""
+        try:
+            with open(os.path.join(self.run_dir, 'sectors.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_sectors(self, sectors: Dict[str, Any]):
+        atomic_write_json(os.path.join(self.run_dir, 'sectors.json'), sectors)
+
+    def completed_codes(self) -> List[str]:
+        return [code for code in self.stock_codes if self.stock(code).completed]
@@ -0,0 +1,67 @@
+"""
+财报缓存
+按股票记录最近一次看到的报告期（end_date）和公告日（ann_date）、对应的三大报表与财务指标，
+以及基于该报告期和同业估值截面的基本面分析结论；只有出现新报告期时才重新拉取报表，报告期或估值截面变化时重新分析
+"""
+from datetime import datetime
+from typing import Optional, Dict, Any
+import os
+import json
+
+from config.config import DATA_CACHE_DIR
+from .checkpoint import atomic_write_json
+from .call_stats import HitRate
+
+
+class FinancialCache:
+    """逐股票的财报缓存（每只股票一个文件）"""
+
+    def __init__(self, cache_dir: str = DATA_CACHE_DIR):
+        self.cache_dir = os.path.join(cache_dir, "financials")
+        self.hit_rate = HitRate()  # 报表是否复用缓存（见 TushareClient.get_financials）
+
+    def _path(self, ts_code: str) -> str:
+        return os.path.join(self.cache_dir, f"{ts_code}.json")
+
+    def get(self, ts_code: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(ts_code), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, ts_code: str, entry: Dict[str, Any]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        atomic_write_json(self._path(ts_code), entry)
+
+    def put(self, ts_code: str, end_date: str, ann_date: str,
+            financial_data: Optional[Dict[str, Any]], indicators: list):
+        """记录新报告期的报表数据（旧报告期的分析结论随之失效）"""
+        self._write(ts_code, {
+            'end_date': end_date,
+            'ann_date': ann_date,
+            'checked_at': datetime.now().strftime('%Y%m%d'),
+            'financial_data': financial_data,
+            'financial_indicators': indicators,
+            'fundamental': None,
+            'valuation_date': '',
+        })
+
+    def touch(self, ts_code: str, entry: Dict[str, Any]):
+        """披露检查未发现新报告期，只更新检查日期"""
+        entry['checked_at'] = datetime.now().strftime('%Y%m%d')
+        self._write(ts_code, entry)
+
+    def fundamental(self, ts_code: str, end_date: str, valuation_date: str = '') -> Optional[Dict[str, Any]]:
+        """该报告期、该同业估值截面日期下已有的基本面分析结论"""
+        entry = self.get(ts_code)
+        if entry and entry.get('end_date') == end_date and entry.get('valuation_date', '') == valuation_date:
+            return entry.get('fundamental')
+        return None
+
+    def save_fundamental(self, ts_code: str, end_date: str, result: Dict[str, Any], valuation_date: str = ''):
+        entry = self.get(ts_code)
+        if entry and entry.get('end_date') == end_date:
+            entry['fundamental'] = result
+            entry['valuation_date'] = valuation_date
+            self._write(ts_code, entry)
@@ -0,0 +1,163 @@
+"""
+持久化任务队列
+基于 SQLite，无需外部服务；批量分析按股票入队，多个工作进程（可在共享同一文件系统的多台机器上）租约领取任务。
+租约超时未完成（进程崩溃、机器宕机）的任务会被其他进程重新领取，超过最大尝试次数后标记为失败
+多机共享时队列文件所在的网络文件系统需支持文件锁（因此不启用 WAL）
+"""
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterable
+import os
+import sqlite3
+import time
+
+from config.config import QUEUE_DB_PATH, QUEUE_VISIBILITY_TIMEOUT, QUEUE_MAX_ATTEMPTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id        TEXT NOT NULL,
+    ts_code       TEXT NOT NULL,
+    analysis_mode TEXT NOT NULL,
+    priority      INTEGER NOT NULL DEFAULT 0,
+    status        TEXT NOT NULL DEFAULT 'pending',   -- pending / leased / done / failed
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    last_error    TEXT,
+    created_at    TEXT NOT NULL,
+    updated_at    TEXT NOT NULL,
+    UNIQUE (run_id, ts_code)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, priority DESC, id);
+"""
+
+
+class JobQueue:
+    """SQLite 任务队列"""
+
+    def __init__(self, path: str = QUEUE_DB_PATH, visibility_timeout: float = QUEUE_VISIBILITY_TIMEOUT,
+                 max_attempts: int = QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每次操作使用独立连接，可安全跨线程/进程；isolation_level=None 以便显式 BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat()
+
+    def enqueue(self, run_id: str, ts_codes: Iterable[str], analysis_mode: str,
+                priorities: Optional[Dict[str, int]] = None) -> int:
+        """按股票入队，返回新增或重新排队的任务数
+
+        同一运行内重复入队时已完成/进行中的任务保持不变，已失败的任务重新排队（续跑）
+        """
+        priorities = priorities or {}
+        now = self._now()
+        rows = [(run_id, code, analysis_mode, priorities.get(code, 0), now, now) for code in ts_codes]
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO jobs (run_id, ts_code, analysis_mode, priority, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, ts_code) DO UPDATE SET status = 'pending', attempts = 0, "
+                "last_error = NULL, updated_at = excluded.updated_at WHERE jobs.status = 'failed'", rows)
+            added = conn.total_changes - before
+            conn.execute("COMMIT")
+            return added
+        finally:
+            conn.close()
+
+    def lease(self, worker_id: str, run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """领取一个任务：优先级高者优先；租约过期的任务可被重新领取"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # 租约过期且已达最大尝试次数的任务直接判为失败
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = COALESCE(last_error, '租约超时'), updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (self._now(), now, self.max_attempts))
+            query = ("SELECT * FROM jobs WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                     + ("AND run_id = ? " if run_id else "")
+                     + "ORDER BY priority DESC, id LIMIT 1")
+            row = conn.execute(query, (now, run_id) if run_id else (now,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (worker_id, now + self.visibility_timeout, self._now(), row['id']))
+            conn.execute("COMMIT")
+            job = dict(row)
+            job['attempts'] += 1
+            return job
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """延长租约；返回 False 表示租约已被他人接管"""
+        return self._update_owned(
+            job_id, worker_id, "lease_expires = ?", (time.time() + self.visibility_timeout,))
+
+    def complete(self, job_id: int, worker_id: str) -> bool:
+        return self._update_owned(job_id, worker_id, "status = 'done', lease_expires = NULL", ())
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> bool:
+        """记录失败：未达最大尝试次数时重新排队"""
+        return self._update_owned(
+            job_id, worker_id,
+            "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, lease_expires = NULL, last_error = ?",
+            (self.max_attempts, error[:500]))
+
+    def release(self, job_id: int, worker_id: str) -> bool:
+        """主动放弃租约（如工作进程被中断），不计入尝试次数"""
+        return self._update_owned(
+            job_id, worker_id, "status = 'pending', lease_expires = NULL, attempts = MAX(attempts - 1, 0)", ())
+
+    def _update_owned(self, job_id: int, worker_id: str, assignments: str, params: tuple) -> bool:
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                params + (self._now(), job_id, worker_id))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def run_status(self, run_id: str) -> Dict[str, int]:
+        """某次运行各状态的任务数"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs WHERE run_id = ? GROUP BY status",
+                                (run_id,)).fetchall()
+        finally:
+            conn.close()
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        counts.update({row['status']: row['n'] for row in rows})
+        return counts
+
+    def failed_jobs(self, run_id: str) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT ts_code, attempts, last_error FROM jobs WHERE run_id = ? AND status = 'failed'",
+                                (run_id,)).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
@@ -0,0 +1,130 @@
+"""
+全市场扫描
+每次扫描只拉取一个交易日的全市场截面（daily / daily_basic / stock_basic 各一次，外加动量基准日的 daily
+及两个日期的 adj_factor 各一次），
+在内存中向量化过滤和打分，输出按综合得分排序的股票池供批量分析使用
+"""
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List
+import pandas as pd
+
+from .trade_calendar import TradingCalendar
+
+# 综合得分权重（各因子先转为全市场百分位再加权）
+DEFAULT_WEIGHTS = {
+    'momentum': 0.4,      # N日涨幅
+    'volume_surge': 0.3,  # 量比
+    'valuation': 0.3,     # 行业内 PE 越低越好
+}
+
+
+class MarketScanner:
+    """全市场截面扫描器"""
+
+    def __init__(self, pro, calendar: TradingCalendar, momentum_days: int = 20,
+                 min_market_cap: float = 50.0, min_list_days: int = 120,
+                 weights: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            pro: tushare pro_api 实例
+            calendar: 交易日历
+            momentum_days: 动量回看交易日数
+            min_market_cap: 最小总市值（亿元）
+            min_list_days: 最短上市天数，排除次新股
+            weights: 综合得分权重
+        """
+        self.pro = pro
+        self.calendar = calendar
+        self.momentum_days = momentum_days
+        self.min_market_cap = min_market_cap
+        self.min_list_days = min_list_days
+        self.weights = weights or DEFAULT_WEIGHTS
+
+    def scan(self, top_n: int = 10, industries: Optional[List[str]] = None,
+             trade_date: Optional[str] = None) -> pd.DataFrame:
+        """扫描全市场，返回得分最高的 top_n 只股票（按得分降序）"""
+        start = datetime.now()
+        trade_date, daily = self._latest_daily(trade_date)
+        if daily is None:
+            print("❌ 未获取到全市场日线截面")
+            return pd.DataFrame()
+
+        base_date = self._shift(trade_date, self.momentum_days)
+        past = self.pro.daily(trade_date=base_date, fields='ts_code,close')
+        adj = self.pro.adj_factor(trade_date=trade_date, fields='ts_code,adj_factor')
+        base_adj = self.pro.adj_factor(trade_date=base_date, fields='ts_code,adj_factor')
+        basic = self.pro.daily_basic(trade_date=trade_date,
+                                     fields='ts_code,turnover_rate,volume_ratio,pe_ttm,pb,total_mv')
+        names = self.pro.stock_basic(list_status='L', fields='ts_code,name,industry,list_date')
+        fetched = datetime.now()
+
+        frame = (daily[['ts_code', 'close', 'pct_chg', 'amount']]
+                 .merge(basic, on='ts_code', how='inner')
+                 .merge(names, on='ts_code', how='inner')
+                 .merge(past.rename(columns={'close': 'base_close'}), on='ts_code', how='left')
+                 .merge(adj, on='ts_code', how='left')
+                 .merge(base_adj.rename(columns={'adj_factor': 'base_adj_factor'}), on='ts_code', how='left'))
+
+        frame = self._filter(frame, trade_date, industries)
+        ranked = self._score(frame).nlargest(top_n, 'score')
+
+        done = datetime.now()
+        print(f"🔎 全市场扫描 {trade_date}: {len(daily)} 只 → 过滤后 {len(frame)} 只 → 取前 {len(ranked)} 只 "
+              f"(取数 {(fetched - start).total_seconds():.1f}秒, 计算 {(done - fetched).total_seconds():.2f}秒)")
+        return ranked.reset_index(drop=True)
+
+    def _latest_daily(self, trade_date: Optional[str]):
+        """最近一个已有收盘数据的交易日（盘前运行时当日数据尚未发布，回退一天）"""
+        if trade_date:
+            daily = self.pro.daily(trade_date=trade_date)
+            return trade_date, daily if not daily.empty else None
+
+        day = self.calendar.latest_trading_day()
+        for _ in range(2):
+            key = day.strftime('%Y%m%d')
+            daily = self.pro.daily(trade_date=key)
+            if not daily.empty:
+                return key, daily
+            day = self.calendar.previous_trading_day(day)
+        return None, None
+
+    def _shift(self, trade_date: str, days: int) -> str:
+        day = datetime.strptime(trade_date, '%Y%m%d').date()
+        for _ in range(days):
+            day = self.calendar.previous_trading_day(day)
+        return day.strftime('%Y%m%d')
+
+    def _filter(self, frame: pd.DataFrame, trade_date: str,
+                industries: Optional[List[str]]) -> pd.DataFrame:
+        """剔除ST、次新股、小市值和停牌股"""
+        list_cutoff = (datetime.strptime(trade_date, '%Y%m%d')
+                       - timedelta(days=self.min_list_days)).strftime('%Y%m%d')
+        mask = (
+            ~frame['name'].str.contains('ST', na=False)
+            & (frame['list_date'].astype(str) <= list_cutoff)
+            & (frame['total_mv'] >= self.min_market_cap * 10000)  # total_mv 单位为万元
+            & (frame['amount'] > 0)
+        )
+        if industries:
+            mask &= frame['industry'].isin(industries)
+        return frame[mask].copy()
+
+    def _score(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """因子转百分位后加权打分（全部为列运算）"""
+        # 用复权因子把两日收盘价换算到同一口径，避免除权除息、送转拆股造成的假涨跌；缺少因子时按未复权计算
+        adj_ratio = (frame['adj_factor'] / frame['base_adj_factor']).fillna(1.0)
+        frame['momentum'] = frame['close'] * adj_ratio / frame['base_close'] - 1
+        # 亏损股 PE 为空，估值百分位按最差处理
+        positive_pe = frame['pe_ttm'].where(frame['pe_ttm'] > 0)
+        frame['pe_pct_in_industry'] = (positive_pe.groupby(frame['industry'])
+                                       .rank(pct=True)
+                                       .fillna(1.0))
+
+        factors = pd.DataFrame({
+            'momentum': frame['momentum'].rank(pct=True),
+            'volume_surge': frame['volume_ratio'].rank(pct=True),
+            'valuation': 1 - frame['pe_pct_in_industry'],
+        }).fillna(0)
+        frame['score'] = sum(factors[name] * weight for name, weight in self.weights.items())
+        return frame[['ts_code', 'name', 'industry', 'close', 'pct_chg', 'momentum',
+                      'volume_ratio', 'pe_ttm', 'pb', 'pe_pct_in_industry', 'total_mv', 'score']]
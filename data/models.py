@@ -0,0 +1,192 @@
+"""
+分析流水线数据模型
+用 slots 数据类替代层层嵌套的 dict，行情类大数组保持为 DataFrame 列式存储
+"""
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+import pandas as pd
+
+
+def _records(df: Optional[pd.DataFrame], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """DataFrame 转为记录列表（仅在需要序列化时调用）"""
+    if df is None or df.empty:
+        return []
+    if limit is not None:
+        df = df.tail(limit)
+    return df.to_dict('records')
+
+
+@dataclass(slots=True)
+class StockData:
+    """单只股票的综合数据包"""
+    ts_code: str
+    fetch_time: str
+    is_trading_time: bool = False
+    basic_info: Optional[Dict[str, Any]] = None
+    daily_data: Optional[pd.DataFrame] = None
+    financial_data: Optional[Dict[str, Any]] = None
+    financial_indicators: Optional[pd.DataFrame] = None
+    financial_period: str = ''        # 财报报告期 end_date
+    financial_updated: bool = True    # 本次是否出现新报告期（False 时可复用该期的基本面结论）
+    realtime_quote: Optional[Dict[str, Any]] = None
+    intraday_data: Optional[pd.DataFrame] = None
+    news: List[Dict[str, Any]] = field(default_factory=list)
+    sector_context: Optional[Dict[str, Any]] = None  # 同行业共享的行业背景分析
+
+    @property
+    def name(self) -> str:
+        return (self.basic_info or {}).get('name', 'N/A')
+
+    @property
+    def industry(self) -> str:
+        return (self.basic_info or {}).get('industry', 'N/A')
+
+    def recent_daily(self, n: int = 10) -> List[Dict[str, Any]]:
+        """最近 n 个交易日的日线记录"""
+        return _records(self.daily_data, n)
+
+    def recent_intraday(self, n: int = 10) -> List[Dict[str, Any]]:
+        """最近 n 条分钟线记录"""
+        return _records(self.intraday_data, n)
+
+    def indicator_records(self) -> List[Dict[str, Any]]:
+        """财务指标记录"""
+        return _records(self.financial_indicators)
+
+    def release_bars(self):
+        """释放行情大数组（批量分析中报告生成后调用）"""
+        self.daily_data = None
+        self.intraday_data = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StockData':
+        """从 to_dict() 的结果恢复（检查点/缓存加载）"""
+        def frame(records):
+            return pd.DataFrame(records) if records else None
+        return cls(
+            ts_code=data['ts_code'],
+            fetch_time=data.get('fetch_time', ''),
+            is_trading_time=data.get('is_trading_time', False),
+            basic_info=data.get('basic_info'),
+            daily_data=frame(data.get('daily_data')),
+            financial_data=data.get('financial_data'),
+            financial_indicators=frame(data.get('financial_indicators')),
+            financial_period=data.get('financial_period', ''),
+            financial_updated=data.get('financial_updated', True),
+            realtime_quote=data.get('realtime_quote'),
+            intraday_data=frame(data.get('intraday_data')),
+            news=data.get('news') or [],
+            sector_context=data.get('sector_context'),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可 JSON 序列化的 dict，与旧版缓存/报告格式一致"""
+        return {
+            'ts_code': self.ts_code,
+            'fetch_time': self.fetch_time,
+            'is_trading_time': self.is_trading_time,
+            'basic_info': self.basic_info,
+            'daily_data': _records(self.daily_data) or None,
+            'financial_data': self.financial_data,
+            'financial_indicators': self.indicator_records() or None,
+            'financial_period': self.financial_period,
+            'financial_updated': self.financial_updated,
+            'realtime_quote': self.realtime_quote,
+            'intraday_data': _records(self.intraday_data) or None,
+            'news': self.news,
+            'sector_context': self.sector_context,
+        }
+
+
+@dataclass(slots=True)
+class AnalystResults:
+    """三位分析师的输出"""
+    technical: Dict[str, Any] = field(default_factory=dict)
+    fundamental: Dict[str, Any] = field(default_factory=dict)
+    news: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'technical': self.technical,
+            'fundamental': self.fundamental,
+            'news': self.news,
+        }
+
+
+@dataclass(slots=True)
+class DebateResult:
+    """多空辩论结果"""
+    bull_initial: Dict[str, Any] = field(default_factory=dict)
+    bear_initial: Dict[str, Any] = field(default_factory=dict)
+    debate_rounds: List[Dict[str, Any]] = field(default_factory=list)
+    debate_summary: Dict[str, Any] = field(default_factory=dict)
+    rounds_completed: int = 0
+    stop_reason: str = ''      # 提前结束原因，跑满轮次时为空
+    saved_calls: int = 0       # 提前结束节省的LLM调用次数
+    llm_calls: int = 0         # 辩论实际的LLM调用次数（反驳、摘要压缩、总结）
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'bull_initial': self.bull_initial,
+            'bear_initial': self.bear_initial,
+            'debate_rounds': self.debate_rounds,
+            'debate_summary': self.debate_summary,
+            'rounds_completed': self.rounds_completed,
+            'stop_reason': self.stop_reason,
+            'saved_calls': self.saved_calls,
+            'llm_calls': self.llm_calls,
+        }
+
+
+@dataclass(slots=True)
+class AnalysisResult:
+    """单只股票完整分析结果"""
+    stock_data: StockData
+    analysts: AnalystResults
+    debate: DebateResult
+    decision: Dict[str, Any] = field(default_factory=dict)
+    risk_assessment: Dict[str, Any] = field(default_factory=dict)
+    analysis_time: str = ''
+    analysis_mode: str = 'standard'
+    duration_seconds: float = 0.0
+    report_file: str = ''
+
+    @classmethod
+    def from_stages(cls, stages: Dict[str, Any], analysis_mode: str = 'standard') -> 'AnalysisResult':
+        """由已完成的阶段检查点还原结果（队列模式下由其他工作进程完成的股票）"""
+        report = stages.get('report') or {}
+        return cls(
+            stock_data=StockData.from_dict(stages['stock_data']),
+            analysts=AnalystResults(**stages['analysts']),
+            debate=DebateResult(**stages['debate']),
+            decision=stages.get('decision') or {},
+            risk_assessment=stages.get('risk_assessment') or {},
+            analysis_time=report.get('analysis_time', ''),
+            analysis_mode=analysis_mode,
+            duration_seconds=report.get('duration_seconds', 0.0),
+            report_file=report.get('report_file', ''),
+        )
+
+    @property
+    def ts_code(self) -> str:
+        return self.stock_data.ts_code
+
+    def analysis_dict(self) -> Dict[str, Any]:
+        """analysts + debate，供 Trader / RiskManager 提示词使用"""
+        return {
+            'analysts': self.analysts.to_dict(),
+            'debate': self.debate.to_dict(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为报告 JSON 格式"""
+        return {
+            'stock_data': self.stock_data.to_dict(),
+            'analysis': self.analysis_dict(),
+            'decision': self.decision,
+            'risk_assessment': self.risk_assessment,
+            'analysis_time': self.analysis_time,
+            'analysis_mode': self.analysis_mode,
+            'duration_seconds': self.duration_seconds,
+            'report_file': self.report_file,
+        }
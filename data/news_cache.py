@@ -0,0 +1,127 @@
+"""
+新闻文章缓存
+每篇新闻按内容哈希只分类一次（情绪、重要性、涉及公司/行业），结果持久化，跨股票、跨运行复用。
+基于 SQLite（与任务队列相同的做法），多个工作进程共享同一缓存目录时逐条合并写入，并能读到其他进程新写入的结果
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import hashlib
+import threading
+import os
+import json
+import sqlite3
+
+from config.config import DATA_CACHE_DIR
+from .call_stats import HitRate
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id        TEXT PRIMARY KEY,
+    verdict   TEXT NOT NULL,
+    cached_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_cached_at ON articles (cached_at);
+"""
+
+
+def article_id(article: Dict[str, Any]) -> str:
+    """文章指纹：发布时间 + 标题 + 正文前200字"""
+    raw = f"{article.get('datetime', '')}|{article.get('title', '')}|{str(article.get('content', ''))[:200]}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class NewsArticleCache:
+    """持久化的逐篇新闻分类结果（线程、进程安全）"""
+
+    def __init__(self, cache_dir: str = DATA_CACHE_DIR, retention_days: int = 30):
+        self.path = os.path.join(cache_dir, "news_articles.db")
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._verdicts: Dict[str, Dict[str, Any]] = {}  # 已读到的结果（分类结果写入后不再变化）
+        self.hit_rate = HitRate()
+        os.makedirs(cache_dir, exist_ok=True)
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+            # 清理过期条目
+            conn.execute("DELETE FROM articles WHERE cached_at < ?", (cutoff,))
+            self._import_json(conn, os.path.join(cache_dir, "news_articles.json"), cutoff)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每次操作使用独立连接，可安全跨线程/进程
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def _import_json(conn: sqlite3.Connection, json_file: str, cutoff: str):
+        """导入旧版 JSON 缓存文件（导入后删除）"""
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                verdicts = json.load(f)
+        except (OSError, ValueError):
+            return
+        rows = [(k, json.dumps(v, ensure_ascii=False), v.get('cached_at', ''))
+                for k, v in verdicts.items() if v.get('cached_at', '') >= cutoff]
+        conn.executemany("INSERT OR IGNORE INTO articles (id, verdict, cached_at) VALUES (?, ?, ?)", rows)
+        try:
+            os.remove(json_file)
+        except FileNotFoundError:
+            pass  # 其他进程已导入
+
+    def _fetch(self, keys: List[str]):
+        """从数据库读取本进程尚未见过的条目"""
+        keys = [k for k in keys if k not in self._verdicts]
+        if not keys:
+            return
+        conn = self._connect()
+        try:
+            found = {}
+            for i in range(0, len(keys), 500):  # SQLite 参数个数上限
+                chunk = keys[i:i + 500]
+                rows = conn.execute(f"SELECT id, verdict FROM articles WHERE id IN ({','.join('?' * len(chunk))})",
+                                    chunk).fetchall()
+                found.update((key, json.loads(verdict)) for key, verdict in rows)
+        finally:
+            conn.close()
+        with self._lock:
+            self._verdicts.update(found)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if key not in self._verdicts:
+            self._fetch([key])
+        return self._verdicts.get(key)
+
+    def missing(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """返回尚未分类的文章（包括其他进程已分类的结果）"""
+        self._fetch([article_id(a) for a in articles])
+        unseen = [a for a in articles if article_id(a) not in self._verdicts]
+        self.hit_rate.record(hits=len(articles) - len(unseen), misses=len(unseen))
+        return unseen
+
+    def put_many(self, verdicts: Dict[str, Dict[str, Any]]):
+        """写入一批分类结果（逐条插入，不覆盖其他进程写入的条目）"""
+        if not verdicts:
+            return
+        today = datetime.now().strftime('%Y-%m-%d')
+        for verdict in verdicts.values():
+            verdict['cached_at'] = today
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR REPLACE INTO articles (id, verdict, cached_at) VALUES (?, ?, ?)",
+                             [(k, json.dumps(v, ensure_ascii=False), today) for k, v in verdicts.items()])
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        with self._lock:
+            self._verdicts.update(verdicts)
+
+    @property
+    def size(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        finally:
+            conn.close()
@@ -0,0 +1,230 @@
+"""
+同业估值对比
+按报告期批量获取全市场财务指标并落盘缓存，结合当日全市场估值截面，
+对同行业公司的 ROE、毛利率、净利率、资产负债率、PE、PB 一次性计算行业内百分位，
+同一行业的结果在同一交易日、同一报告期内被所有自选股复用（常驻进程跨日后自动重建）
+"""
+from datetime import date
+from typing import Optional, Dict, Any
+import os
+import json
+import threading
+import pandas as pd
+
+from config.config import DATA_CACHE_DIR
+from .checkpoint import atomic_write_json
+from .trade_calendar import TradingCalendar
+
+INDICATOR_FIELDS = ['roe', 'grossprofit_margin', 'netprofit_margin', 'debt_to_assets']
+VALUATION_FIELDS = ['pe_ttm', 'pb', 'total_mv']
+
+# 对比指标: 字段 → (名称, 是否越高越好)
+METRICS = {
+    'roe': ('ROE', True),
+    'grossprofit_margin': ('毛利率', True),
+    'netprofit_margin': ('净利率', True),
+    'debt_to_assets': ('资产负债率', False),
+    'pe_ttm': ('PE(TTM)', False),
+    'pb': ('PB', False),
+}
+
+
+def latest_reported_period(today: Optional[date] = None) -> str:
+    """按法定披露截止日推算全市场均已披露的最近报告期"""
+    today = today or date.today()
+    if today.month >= 11:
+        return f"{today.year}0930"
+    if today.month >= 9:
+        return f"{today.year}0630"
+    if today.month >= 5:
+        return f"{today.year}0331"
+    return f"{today.year - 1}0930"
+
+
+class PeerValuation:
+    """同业估值对比引擎"""
+
+    def __init__(self, pro, calendar: TradingCalendar, cache_dir: str = DATA_CACHE_DIR,
+                 max_fallback_fetch: int = 30):
+        """
+        Args:
+            pro: tushare pro_api 实例
+            calendar: 交易日历
+            cache_dir: 财务指标缓存目录
+            max_fallback_fetch: 无法批量获取时，每个行业最多逐只补取的公司数（按市值）
+        """
+        self.pro = pro
+        self.calendar = calendar
+        self.cache_dir = cache_dir
+        self.max_fallback_fetch = max_fallback_fetch
+        self.period = latest_reported_period()
+
+        self._lock = threading.Lock()
+        self._listing: Optional[pd.DataFrame] = None
+        self._valuation: Optional[pd.DataFrame] = None
+        self._trade_date = ''
+        self._indicators: Dict[str, Dict[str, Any]] = self._load_indicators()
+        self._bulk_done = False
+        self._industries: Dict[str, tuple] = {}
+        self._snapshot: Optional[tuple] = None  # 当前截面对应的 (报告期, 交易日)
+
+    @property
+    def _cache_file(self) -> str:
+        return os.path.join(self.cache_dir, f"peer_indicators_{self.period}.json")
+
+    def _load_indicators(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_indicators(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        atomic_write_json(self._cache_file, self._indicators)
+
+    def compare(self, ts_code: str, industry: str, table_size: int = 5) -> Optional[Dict[str, Any]]:
+        """个股在行业内的相对位置；行业数据不可用时返回 None"""
+        if not industry or industry == 'N/A':
+            return None
+        try:
+            with self._lock:
+                self._refresh()
+                peers, medians = self._industry_frame(industry, ts_code)
+        except Exception as e:
+            print(f"⚠️ 同业估值数据获取失败 {industry}: {e}")
+            return None
+        if peers is None or ts_code not in peers.index or len(peers) < 3:
+            return None
+
+        row = peers.loc[ts_code]
+        metrics = {}
+        for column, (label, _) in METRICS.items():
+            value = row.get(column)
+            if pd.isna(value):
+                continue
+            metrics[label] = {
+                'value': round(float(value), 2),
+                'industry_median': round(float(medians[column]), 2),
+                'percentile': round(float(row[f'{column}_pct']), 2),
+            }
+
+        leaders = peers.nlargest(table_size, 'total_mv')
+        if ts_code not in leaders.index:
+            leaders = pd.concat([leaders, peers.loc[[ts_code]]])
+        columns = ['name'] + list(METRICS)
+        return {
+            'industry': industry,
+            'period': self.period,
+            'trade_date': self._trade_date,
+            'peer_count': int(len(peers)),
+            'metrics': metrics,
+            'peers': leaders[columns].round(2).astype(object).where(leaders[columns].notna(), None)
+                                     .reset_index().to_dict('records'),
+        }
+
+    def _day_key(self) -> str:
+        day = self.calendar.latest_trading_day().strftime('%Y%m%d')
+        # 当日估值截面尚未发布时暂用上一交易日的，进入下一个交易时段后重新获取
+        return day if self._trade_date in ('', day) else self.calendar.session_key()
+
+    def _refresh(self):
+        """交易日或报告期变化后丢弃估值截面和行业百分位（调度器、常驻服务、工作进程会跨日运行）"""
+        if self._snapshot is None or self._snapshot == (latest_reported_period(), self._day_key()):
+            return
+        period = latest_reported_period()
+        if period != self.period:
+            self.period = period
+            self._indicators = self._load_indicators()
+            self._bulk_done = False
+        self._listing = self._valuation = None
+        self._trade_date = ''
+        self._industries = {}
+        self._snapshot = None
+
+    def _industry_frame(self, industry: str, ts_code: str):
+        """行业成员指标 + 估值 + 行业内百分位（每个行业每次运行只计算一次）"""
+        if industry in self._industries and ts_code in self._indicators:
+            return self._industries[industry]
+
+        listing = self._get_listing()
+        members = listing[listing['industry'] == industry]
+        valuation = self._get_valuation()
+        frame = members.merge(valuation, on='ts_code', how='left')
+
+        # 行业已算过时只需补取目标股票本身
+        self._fill_indicators(frame, ts_code, include_peers=industry not in self._industries)
+        indicators = pd.DataFrame.from_dict(
+            {code: self._indicators.get(code, {}) for code in frame['ts_code']}, orient='index'
+        ).reindex(columns=INDICATOR_FIELDS)
+        frame = frame.set_index('ts_code').join(indicators)
+
+        medians = {}
+        for column, (_, higher_is_better) in METRICS.items():
+            values = frame[column].astype(float)
+            if column in ('pe_ttm', 'pb'):
+                values = values.where(values > 0)  # 亏损/负资产不参与估值排名
+            # 百分位统一为“越高越好”：0.9 表示优于行业90%的公司
+            frame[f'{column}_pct'] = values.rank(pct=True, ascending=higher_is_better)
+            medians[column] = values.median()
+
+        self._industries[industry] = (frame, medians)
+        return frame, medians
+
+    def _get_listing(self) -> pd.DataFrame:
+        if self._listing is None:
+            self._listing = self.pro.stock_basic(list_status='L', fields='ts_code,name,industry')
+        return self._listing
+
+    def _get_valuation(self) -> pd.DataFrame:
+        """最近一个交易日的全市场估值截面"""
+        if self._valuation is None:
+            day = self.calendar.latest_trading_day()
+            for _ in range(2):
+                key = day.strftime('%Y%m%d')
+                df = self.pro.daily_basic(trade_date=key, fields='ts_code,' + ','.join(VALUATION_FIELDS))
+                if not df.empty:
+                    self._valuation, self._trade_date = df, key
+                    break
+                day = self.calendar.previous_trading_day(day)
+            else:
+                self._valuation = pd.DataFrame(columns=['ts_code'] + VALUATION_FIELDS)
+            self._snapshot = (self.period, self._day_key())
+        return self._valuation
+
+    def _fill_indicators(self, members: pd.DataFrame, ts_code: str, include_peers: bool = True):
+        """补齐行业成员的财务指标：优先一次批量拉取全市场，失败时按市值逐只补取（目标股票优先）"""
+        missing = [code for code in members['ts_code'] if code not in self._indicators]
+        if not missing:
+            return
+
+        if not self._bulk_done:
+            self._bulk_done = True
+            try:
+                df = self.pro.fina_indicator_vip(period=self.period,
+                                                 fields='ts_code,' + ','.join(INDICATOR_FIELDS))
+                df = df.drop_duplicates('ts_code')
+                self._indicators.update({r.pop('ts_code'): r for r in df.to_dict('records')})
+                self._save_indicators()
+                print(f"📚 已批量获取 {self.period} 期全市场财务指标 {len(df)} 条")
+                missing = [code for code in missing if code not in self._indicators]
+            except Exception as e:
+                print(f"⚠️ 批量财务指标不可用（可能需要更高级别的Tushare权限），改为逐只获取: {e}")
+
+        if not missing:
+            return
+        ranked = members[members['ts_code'].isin(missing)].sort_values('total_mv', ascending=False)
+        codes = ranked['ts_code'].head(self.max_fallback_fetch).tolist() if include_peers else []
+        if ts_code in missing and ts_code not in codes:
+            codes.insert(0, ts_code)
+        for code in codes:
+            try:
+                df = self.pro.fina_indicator(ts_code=code, period=self.period,
+                                             fields='ts_code,' + ','.join(INDICATOR_FIELDS))
+            except Exception as e:
+                print(f"⚠️ 获取 {code} 财务指标失败: {e}")
+                continue
+            record = df.iloc[0].to_dict() if not df.empty else {}
+            record.pop('ts_code', None)
+            self._indicators[code] = record  # 未披露也记录，避免重复请求
+        self._save_indicators()
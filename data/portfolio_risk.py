@@ -0,0 +1,120 @@
+"""
+组合风险上下文
+批量分析前把股票池所有股票的日线对齐成收益率矩阵，用 NumPy 一次性算出
+相关性、波动率、Beta 和最大回撤，为每只股票的风险评估提供集中度视角
+"""
+from typing import Optional, Dict, Any, List
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def _max_drawdown(returns: np.ndarray) -> np.ndarray:
+    """逐列最大回撤（负数，-0.25 表示回撤25%）"""
+    nav = np.cumprod(1.0 + returns, axis=0)
+    peak = np.maximum.accumulate(nav, axis=0)
+    return (nav / peak - 1.0).min(axis=0)
+
+
+class PortfolioRisk:
+    """股票池组合风险（等权视角）"""
+
+    def __init__(self, codes: List[str], returns: np.ndarray, dates: List[str],
+                 benchmark: Optional[np.ndarray] = None, names: Optional[Dict[str, str]] = None,
+                 vol_window: int = 20, high_corr: float = 0.7):
+        self.codes = codes
+        self.dates = dates
+        self.names = names or {}
+        self.high_corr = high_corr
+        self.index = {code: i for i, code in enumerate(codes)}
+
+        n_days = returns.shape[0]
+        window = min(vol_window, n_days)
+        annualize = np.sqrt(TRADING_DAYS_PER_YEAR)
+
+        self.cov = np.cov(returns, rowvar=False) * TRADING_DAYS_PER_YEAR
+        self.corr = np.corrcoef(returns, rowvar=False)
+        self.volatility = returns.std(axis=0, ddof=1) * annualize
+        self.recent_volatility = returns[-window:].std(axis=0, ddof=1) * annualize
+        self.max_drawdown = _max_drawdown(returns)
+
+        # 没有基准指数时以股票池等权组合作为市场代理
+        self.benchmark_label = '基准指数' if benchmark is not None else '股票池等权组合'
+        market = benchmark if benchmark is not None else returns.mean(axis=1)
+        market_centered = market - market.mean()
+        self.beta = (returns - returns.mean(axis=0)).T @ market_centered / (market_centered @ market_centered)
+
+        weights = np.full(len(codes), 1.0 / len(codes))
+        self.portfolio_volatility = float(np.sqrt(weights @ self.cov @ weights))
+        off_diagonal = self.corr[~np.eye(len(codes), dtype=bool)]
+        self.average_correlation = float(off_diagonal.mean()) if off_diagonal.size else 0.0
+        # 分散化比率：个股波动率加权和 / 组合波动率，越接近1说明分散效果越差
+        self.diversification_ratio = float(weights @ self.volatility / self.portfolio_volatility) \
+            if self.portfolio_volatility > 0 else 1.0
+
+    @classmethod
+    def from_daily(cls, daily: pd.DataFrame, benchmark: Optional[pd.DataFrame] = None,
+                   names: Optional[Dict[str, str]] = None, vol_window: int = 20,
+                   min_days: int = 20) -> Optional['PortfolioRisk']:
+        """由多只股票的日线长表（ts_code, trade_date, pct_chg）构建；数据不足时返回 None"""
+        if daily is None or daily.empty:
+            return None
+        matrix = daily.pivot_table(index='trade_date', columns='ts_code', values='pct_chg').sort_index()
+        # 只保留所有股票都有行情的交易日（剔除停牌造成的缺口）
+        matrix = matrix.dropna(axis=1, thresh=min_days).dropna(axis=0)
+        if matrix.shape[0] < min_days or matrix.shape[1] < 2:
+            return None
+
+        benchmark_returns = None
+        if benchmark is not None and not benchmark.empty:
+            aligned = benchmark.set_index('trade_date')['pct_chg'].reindex(matrix.index)
+            if not aligned.isna().any():
+                benchmark_returns = aligned.to_numpy(dtype=float) / 100.0
+
+        return cls(
+            codes=list(matrix.columns),
+            returns=matrix.to_numpy(dtype=float) / 100.0,
+            dates=[str(d) for d in matrix.index],
+            benchmark=benchmark_returns,
+            names=names,
+            vol_window=vol_window,
+        )
+
+    def summary(self, ts_code: str, top_n: int = 3) -> Optional[Dict[str, Any]]:
+        """单只股票在股票池中的风险画像（供风险管理员提示词使用）"""
+        i = self.index.get(ts_code)
+        if i is None:
+            return None
+
+        corr = self.corr[i].copy()
+        corr[i] = -np.inf
+        peers = [j for j in np.argsort(corr)[::-1][:top_n] if np.isfinite(corr[j])]
+        high = int((corr >= self.high_corr).sum())
+
+        # 该股对等权组合风险的贡献占比
+        weights = np.full(len(self.codes), 1.0 / len(self.codes))
+        marginal = self.cov @ weights
+        contribution = weights[i] * marginal[i] / (self.portfolio_volatility ** 2) \
+            if self.portfolio_volatility > 0 else 0.0
+
+        return {
+            "sample": f"{self.dates[0]}~{self.dates[-1]}，{len(self.dates)} 个交易日，股票池 {len(self.codes)} 只",
+            "annual_volatility": round(float(self.volatility[i]), 4),
+            "recent_volatility": round(float(self.recent_volatility[i]), 4),
+            "beta": round(float(self.beta[i]), 2),
+            "beta_benchmark": self.benchmark_label,
+            "max_drawdown": round(float(self.max_drawdown[i]), 4),
+            "most_correlated": [
+                {"ts_code": self.codes[j], "name": self.names.get(self.codes[j], ''),
+                 "correlation": round(float(corr[j]), 2)}
+                for j in peers
+            ],
+            "high_correlation_count": high,
+            "risk_contribution": round(float(contribution), 4),
+            "portfolio": {
+                "equal_weight_volatility": round(self.portfolio_volatility, 4),
+                "average_correlation": round(self.average_correlation, 2),
+                "diversification_ratio": round(self.diversification_ratio, 2),
+            },
+        }
@@ -0,0 +1,274 @@
+"""
+分阶段性能剖析
+对六个分析阶段采样调用栈并用 tracemalloc 统计内存分配：区分CPU时间与等待时间（LLM / Tushare / 其他），
+阶段只记录已分配内存的净增，按代码行的分配明细每只股票只在开始和结束时各取一次快照（快照期间持有 GIL，会阻塞其他线程），
+在分析报告旁写出火焰图数据（折叠调用栈，可直接交给 flamegraph.pl 或 speedscope）和阶段耗时、内存分配报告。
+批量分析在多个线程中并发执行，cProfile 只能剖析单个线程（Python 3.12 起同时只能启用一个），因此使用采样方式
+"""
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Dict, Tuple, List
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from config.config import PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_ALLOCATIONS
+
+# 检查点阶段 → 报告中的六个分析阶段
+STAGE_LABELS = {
+    'stock_data': '1 数据收集',
+    'analysts': '2 专业分析',
+    'bull_view': '3 结构化辩论',
+    'bear_view': '3 结构化辩论',
+    'debate': '3 结构化辩论',
+    'decision': '4 综合决策',
+    'risk_assessment': '5 风险评估',
+    'report': '6 报告生成',
+}
+
+CATEGORY_LABELS = {'llm': 'LLM调用', 'tushare': 'Tushare/HTTP', 'local': '本地执行'}
+
+# 不计入内存分配报告的位置（剖析器自身、导入机制）
+_IGNORED_FILES = (tracemalloc.__file__, __file__, "<frozen importlib._bootstrap>", "<unknown>")
+
+
+def _short_path(path: str) -> str:
+    """第三方库和标准库只保留包内路径，项目文件用相对路径"""
+    if f"site-packages{os.sep}" in path:
+        return path.split(f"site-packages{os.sep}", 1)[1]
+    stdlib = os.path.dirname(os.__file__) + os.sep
+    if path.startswith(stdlib):
+        return path[len(stdlib):]
+    relative = os.path.relpath(path)
+    return path if relative.startswith('..') else relative
+
+
+def _category(files: List[str]) -> str:
+    """按调用栈所在位置归类一个样本"""
+    if any(f.endswith('llm_client.py') for f in files):
+        return 'llm'
+    if any(f"{os.sep}{lib}{os.sep}" in f for f in files for lib in ('tushare', 'requests', 'urllib3')):
+        return 'tushare'
+    return 'local'
+
+
+@dataclass(slots=True)
+class StageStats:
+    """一个阶段的累计统计"""
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0  # 执行该阶段的线程的CPU时间
+    memory_delta: int = 0  # 阶段结束时已分配内存的净增（字节）
+    samples: Counter = field(default_factory=Counter)  # 类别 → 样本数
+
+    def merge(self, other: 'StageStats'):
+        self.calls += other.calls
+        self.wall += other.wall
+        self.cpu += other.cpu
+        self.memory_delta += other.memory_delta
+        self.samples.update(other.samples)
+
+    def waits(self) -> Dict[str, float]:
+        """等待时间 = 墙钟 − CPU，再按样本中 LLM / Tushare 调用栈的占比拆分"""
+        wait = max(self.wall - self.cpu, 0.0)
+        total = sum(self.samples.values())
+        llm = min(self.wall * self.samples['llm'] / total, wait) if total else 0.0
+        tushare = min(self.wall * self.samples['tushare'] / total, wait - llm) if total else 0.0
+        return {'wait': wait, 'llm': llm, 'tushare': tushare, 'other': wait - llm - tushare}
+
+
+@dataclass(slots=True)
+class Allocations:
+    """按代码行统计的内存分配净增"""
+    sizes: Counter = field(default_factory=Counter)  # 代码行 → 净增字节
+    counts: Counter = field(default_factory=Counter)  # 代码行 → 净增对象数
+
+    def merge(self, other: 'Allocations'):
+        self.sizes.update(other.sizes)
+        self.counts.update(other.counts)
+
+
+class StageProfiler:
+    """分阶段采样剖析器（线程安全）"""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL, top_n: int = PROFILE_TOP_ALLOCATIONS):
+        self.interval = interval
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._active: Dict[int, Tuple[str, str]] = {}  # 线程 → (股票, 阶段)
+        self._stages: Dict[str, Dict[str, StageStats]] = {}
+        self._stacks: Dict[str, Counter] = {}
+        self._baselines: Dict[str, tracemalloc.Snapshot] = {}  # 股票 → 开始分析时的快照
+        self._totals: Dict[str, StageStats] = {}
+        self._total_stacks: Counter = Counter()
+        self._total_allocations = Allocations()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self):
+        """开始采样并追踪内存分配
+
+        快照耗时与追踪中的内存块数成正比，应在导入依赖、创建客户端之后再开始（见 StockAnalysisSystem.warm_up）
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+        self._sampler.start()
+        print(f"🔬 已启用性能剖析（采样间隔 {self.interval * 1000:.0f} 毫秒）")
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        tracemalloc.stop()
+
+    def _stats(self, stock_code: str, label: str) -> StageStats:
+        return self._stages.setdefault(stock_code, {}).setdefault(label, StageStats())
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, (stock_code, label) in list(self._active.items()):
+                frame = frames.get(thread_id)
+                names, files = [], []
+                while frame is not None:
+                    code = frame.f_code
+                    files.append(code.co_filename)
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                if not names:
+                    continue
+                category = _category(files)
+                with self._lock:
+                    self._stacks.setdefault(stock_code, Counter())[f"{label};" + ';'.join(reversed(names))] += 1
+                    self._stats(stock_code, label).samples[category] += 1
+            del frames
+
+    @contextmanager
+    def stage(self, stock_code: str, stage: str):
+        """剖析一个阶段；股票的第一个阶段开始前取基准快照（在计时区间之外，不计入阶段耗时）"""
+        label = STAGE_LABELS.get(stage, stage)
+        thread_id = threading.get_ident()
+        if stock_code not in self._baselines:
+            self._baselines[stock_code] = tracemalloc.take_snapshot()
+        memory_start = tracemalloc.get_traced_memory()[0]
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        self._active[thread_id] = (stock_code, label)
+        try:
+            yield
+        finally:
+            self._active.pop(thread_id, None)
+            wall, cpu = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+            memory_delta = tracemalloc.get_traced_memory()[0] - memory_start
+            with self._lock:
+                stats = self._stats(stock_code, label)
+                stats.calls += 1
+                stats.wall += wall
+                stats.cpu += cpu
+                stats.memory_delta += memory_delta
+
+    def _allocations(self, baseline: Optional[tracemalloc.Snapshot]) -> Allocations:
+        """与基准快照比较，得到按代码行的分配净增"""
+        allocations = Allocations()
+        if baseline is None:
+            return allocations
+        diffs = tracemalloc.take_snapshot().compare_to(baseline, 'lineno')[:self.top_n * 3]
+        for diff in diffs:
+            frame = diff.traceback[0]
+            if diff.size_diff <= 0 or frame.filename in _IGNORED_FILES:
+                continue
+            where = f"{_short_path(frame.filename)}:{frame.lineno}"
+            allocations.sizes[where] += diff.size_diff
+            allocations.counts[where] += diff.count_diff
+        return allocations
+
+    def write_stock_report(self, stock_code: str, report_file: Optional[str]) -> Optional[str]:
+        """在分析报告旁写出该股票的剖析结果，返回剖析报告路径；report_file 为空（分析失败）时只计入批量累计"""
+        baseline = self._baselines.pop(stock_code, None)
+        allocations = self._allocations(baseline) if report_file else Allocations()
+        del baseline
+        with self._lock:
+            stages = self._stages.pop(stock_code, {})
+            stacks = self._stacks.pop(stock_code, Counter())
+            for label, stats in stages.items():
+                self._totals.setdefault(label, StageStats()).merge(stats)
+            self._total_stacks.update(stacks)
+            self._total_allocations.merge(allocations)
+        if not stages or not report_file:
+            return None
+        return self._write(os.path.splitext(report_file)[0], f"{stock_code} 性能剖析", stages, stacks, allocations)
+
+    def write_batch_report(self, summary_file: str) -> Optional[str]:
+        """在汇总报告旁写出批量分析中全部股票的累计剖析结果"""
+        with self._lock:
+            totals = dict(self._totals)
+            stacks = Counter(self._total_stacks)
+            allocations = self._total_allocations
+            self._totals, self._total_stacks, self._total_allocations = {}, Counter(), Allocations()
+        if not totals or not summary_file:
+            return None
+        return self._write(os.path.splitext(summary_file)[0], "批量分析性能剖析（全部股票累计）", totals, stacks,
+                           allocations)
+
+    def _write(self, base: str, title: str, stages: Dict[str, StageStats], stacks: Counter,
+               allocations: Allocations) -> str:
+        folded_file = f"{base}.profile.folded"
+        report_file = f"{base}.profile.md"
+        with open(folded_file, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write(self._render(title, stages, sum(stacks.values()), os.path.basename(folded_file), allocations))
+        print(f"🔬 性能剖析: {report_file}（火焰图数据: {folded_file}）")
+        return report_file
+
+    def _render(self, title: str, stages: Dict[str, StageStats], samples: int, folded_name: str,
+                allocations: Allocations) -> str:
+        lines = [
+            f"# {title}",
+            "",
+            f"- 生成时间: {datetime.now():%Y-%m-%d %H:%M:%S}，采样间隔 {self.interval * 1000:.0f} 毫秒，共 {samples} 个样本",
+            "- CPU 为执行该阶段的线程的CPU时间，等待 = 墙钟 − CPU；LLM / Tushare 等待按样本中调用栈所在位置的占比估算",
+            "- 内存净增按阶段统计；按代码行的分配明细为整只股票（开始与结束时各取一次快照）",
+            "- 多只股票并发分析时，内存统计包含同时进行的其他股票的分配",
+            f"- 火焰图: `flamegraph.pl {folded_name} > flame.svg`，或在 speedscope 中打开",
+            "",
+            "## 阶段耗时",
+            "",
+            "| 阶段 | 次数 | 墙钟(秒) | CPU(秒) | 等待(秒) | LLM等待≈ | Tushare等待≈ | 其他等待 | 内存净增(MB) |",
+            "|------|-----:|---------:|--------:|---------:|---------:|-------------:|---------:|-------------:|",
+        ]
+        total = StageStats()
+        for label in sorted(stages):
+            stats = stages[label]
+            total.merge(stats)
+            lines.append(self._row(label, stats))
+        lines.append(self._row("**合计**", total))
+
+        lines += ["", "## 样本分布", "",
+                  "| 阶段 | " + " | ".join(CATEGORY_LABELS.values()) + " |",
+                  "|------|" + "-----:|" * len(CATEGORY_LABELS)]
+        for label in sorted(stages):
+            counts = stages[label].samples
+            n = sum(counts.values()) or 1
+            lines.append(f"| {label} | " + " | ".join(f"{counts[c] / n:.0%}" for c in CATEGORY_LABELS) + " |")
+
+        lines += ["", "## 内存分配最多的代码行", ""]
+        if allocations.sizes:
+            lines += ["| 位置 | 净增(KB) | 对象数 |", "|------|--------:|------:|"]
+            for where, size in allocations.sizes.most_common(self.top_n):
+                lines.append(f"| `{where}` | {size / 1024:.1f} | {allocations.counts[where]} |")
+            lines.append("")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _row(label: str, stats: StageStats) -> str:
+        waits = stats.waits()
+        return (f"| {label} | {stats.calls} | {stats.wall:.2f} | {stats.cpu:.2f} | {waits['wait']:.2f} | "
+                f"{waits['llm']:.2f} | {waits['tushare']:.2f} | {waits['other']:.2f} | "
+                f"{stats.memory_delta / 1024 / 1024:.2f} |")
@@ -0,0 +1,205 @@
+"""
+交易日历服务
+基于本地缓存的 Tushare trade_cal 数据，O(1) 判断是否开市、下一交易日和上一交易日
+"""
+from datetime import datetime, date, time as dtime, timedelta
+from typing import Optional, Dict, List
+import os
+import json
+
+from config.config import DATA_CACHE_DIR
+
+# A股连续竞价时段
+TRADING_SESSIONS = [
+    (dtime(9, 30), dtime(11, 30)),
+    (dtime(13, 0), dtime(15, 0)),
+]
+
+
+class TradingCalendar:
+    """交易日历"""
+
+    def __init__(self, pro=None, exchange: str = 'SSE', cache_dir: str = DATA_CACHE_DIR):
+        """初始化交易日历
+
+        pro 为 Tushare pro_api 实例；为 None 或拉取失败时按工作日规则降级
+        """
+        self.pro = pro
+        self.exchange = exchange
+        self.cache_file = os.path.join(cache_dir, f"trade_cal_{exchange}.json")
+
+        self._is_open: Dict[str, bool] = {}
+        self._next_open: Dict[str, str] = {}
+        self._prev_open: Dict[str, str] = {}
+        self._start = ''
+        self._end = ''
+        self._loaded_years = set()
+
+        self._ensure(date.today())
+
+    # ---------- 对外接口 ----------
+
+    def is_trading_day(self, day: date) -> bool:
+        """是否为交易日"""
+        self._ensure(day)
+        key = self._key(day)
+        if key in self._is_open:
+            return self._is_open[key]
+        return day.weekday() < 5
+
+    def is_open(self, moment: Optional[datetime] = None) -> bool:
+        """当前是否处于连续竞价时段（排除节假日和午间休市）"""
+        moment = moment or datetime.now()
+        if not self.is_trading_day(moment.date()):
+            return False
+        now = moment.time()
+        return any(start <= now <= end for start, end in TRADING_SESSIONS)
+
+    def next_trading_day(self, day: date) -> date:
+        """严格晚于 day 的下一个交易日"""
+        self._ensure(day)
+        key = self._key(day)
+        if key in self._next_open:
+            return self._parse(self._next_open[key])
+        # 降级：顺延到下一个工作日
+        day += timedelta(days=1)
+        while day.weekday() >= 5:
+            day += timedelta(days=1)
+        return day
+
+    def previous_trading_day(self, day: date) -> date:
+        """严格早于 day 的上一个交易日"""
+        self._ensure(day)
+        key = self._key(day)
+        if key in self._prev_open:
+            return self._parse(self._prev_open[key])
+        day -= timedelta(days=1)
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+        return day
+
+    def next_session_start(self, moment: Optional[datetime] = None) -> datetime:
+        """下一个连续竞价时段的开始时间（moment 已处于时段内时返回 moment）"""
+        moment = moment or datetime.now()
+        if self.is_trading_day(moment.date()):
+            now = moment.time()
+            for start, end in TRADING_SESSIONS:
+                if now < start:
+                    return datetime.combine(moment.date(), start)
+                if now <= end:
+                    return moment
+        next_day = self.next_trading_day(moment.date())
+        return datetime.combine(next_day, TRADING_SESSIONS[0][0])
+
+    def session_key(self, moment: Optional[datetime] = None) -> str:
+        """所处交易时段标识（如 20260615_pre / 20260615_am / 20260615_post），同一时段内行情不变或可视为同一轮"""
+        moment = moment or datetime.now()
+        day = moment.date()
+        if not self.is_trading_day(day):
+            return f"{self._key(self.latest_trading_day(day))}_post"
+        now = moment.time()
+        (am_start, am_end), (pm_start, pm_end) = TRADING_SESSIONS
+        if now < am_start:
+            phase = 'pre'
+        elif now <= am_end:
+            phase = 'am'
+        elif now < pm_start:
+            phase = 'noon'
+        elif now <= pm_end:
+            phase = 'pm'
+        else:
+            phase = 'post'
+        return f"{self._key(day)}_{phase}"
+
+    def latest_trading_day(self, day: Optional[date] = None) -> date:
+        """day 当天（若为交易日）或之前最近的交易日"""
+        day = day or date.today()
+        return day if self.is_trading_day(day) else self.previous_trading_day(day)
+
+    # ---------- 内部实现 ----------
+
+    @staticmethod
+    def _key(day: date) -> str:
+        return day.strftime('%Y%m%d')
+
+    @staticmethod
+    def _parse(key: str) -> date:
+        return datetime.strptime(key, '%Y%m%d').date()
+
+    def _covers(self, key: str) -> bool:
+        return bool(self._start) and self._start <= key <= self._end
+
+    def _ensure(self, day: date):
+        """保证 day 在已加载范围内；每个年份最多尝试加载一次"""
+        if self._covers(self._key(day)) or day.year in self._loaded_years:
+            return
+        self._loaded_years.add(day.year)
+        self._load(day)
+
+    def _load(self, around: date):
+        """加载覆盖 around 前后一段时间的日历，优先读本地缓存"""
+        start = f"{around.year - 1}0101"
+        end = f"{around.year + 1}1231"
+        # 次年日历通常年底才发布，缓存只需覆盖 around 前后30天即可直接使用
+        need_start = self._key(around - timedelta(days=30))
+        need_end = self._key(around + timedelta(days=30))
+
+        rows = self._read_cache()
+        if not rows or rows[0][0] > need_start or rows[-1][0] < need_end:
+            fetched = self._fetch(start, end)
+            if fetched:
+                rows = fetched
+                self._write_cache(rows)
+
+        if rows:
+            self._build(rows)
+
+    def _fetch(self, start: str, end: str) -> List[List]:
+        if self.pro is None:
+            return []
+        try:
+            df = self.pro.trade_cal(exchange=self.exchange, start_date=start, end_date=end,
+                                    fields='cal_date,is_open')
+            if df.empty:
+                return []
+            df = df.sort_values('cal_date')
+            print(f"📅 已更新交易日历: {start} - {end}")
+            return [[str(d), int(o)] for d, o in zip(df['cal_date'], df['is_open'])]
+        except Exception as e:
+            print(f"⚠️ 获取交易日历失败，按工作日规则判断: {e}")
+            return []
+
+    def _read_cache(self) -> List[List]:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _write_cache(self, rows: List[List]):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_file = self.cache_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(rows, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def _build(self, rows: List[List]):
+        """预计算每个日期的开市状态、下一交易日和上一交易日"""
+        self._is_open = {d: bool(o) for d, o in rows}
+        self._start, self._end = rows[0][0], rows[-1][0]
+
+        self._prev_open = {}
+        last_open = None
+        for d, o in rows:
+            if last_open:
+                self._prev_open[d] = last_open
+            if o:
+                last_open = d
+
+        self._next_open = {}
+        upcoming = None
+        for d, o in reversed(rows):
+            if upcoming:
+                self._next_open[d] = upcoming
+            if o:
+                upcoming = d
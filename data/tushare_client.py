@@ -5,18 +5,37 @@ Tushare数据客户端
 import tushare as ts
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import os
 import json
+from .models import StockData
+from .trade_calendar import TradingCalendar
+from .financial_cache import FinancialCache
+from .call_stats import CallStats, TrackedApi
+from .checkpoint import atomic_write_json
+from config.config import DATA_CACHE_DIR
 
 class TushareClient:
     """Tushare数据客户端"""
     
-    def __init__(self, token: str):
-        """初始化Tushare客户端"""
+    def __init__(self, token: str, cache_dir: str = DATA_CACHE_DIR, cassette=None):
+        """初始化Tushare客户端
+        
+        cassette 为录制/回放卡带（data.cassette.Cassette），接口调用经由卡带录制或回放；回放时不连接 Tushare。
+        所有接口调用（含共享 pro 的交易日历、同行估值、全市场扫描）都计入 self.stats
+        """
         self.token = token
-        ts.set_token(token)
-        self.pro = ts.pro_api()
+        self.cache_dir = cache_dir
+        if cassette is not None and cassette.replaying:
+            pro = None
+        else:
+            ts.set_token(token)
+            pro = ts.pro_api()
+        self.stats = CallStats()
+        self.pro = TrackedApi(cassette.wrap_pro(pro) if cassette is not None else pro, self.stats)
+        self.calendar = TradingCalendar(self.pro, cache_dir=cache_dir)
+        self.financial_cache = FinancialCache(cache_dir)
+        self._listing: Optional[pd.DataFrame] = None
         
     def get_stock_basic_info(self, ts_code: str) -> Optional[Dict[str, Any]]:
         """获取股票基本信息"""
@@ -29,6 +48,57 @@ class TushareClient:
             print(f"❌ 获取股票基本信息失败: {e}")
             return None
     
+    def get_stock_listing(self, cache_dir: Optional[str] = None) -> pd.DataFrame:
+        """全部上市股票的基本信息（进程内缓存，并按天落盘缓存）"""
+        if self._listing is not None:
+            return self._listing
+        
+        cache_dir = cache_dir or self.cache_dir
+        cache_file = os.path.join(cache_dir, "stock_basic.json")
+        today = datetime.now().strftime('%Y%m%d')
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('date') == today:
+                self._listing = pd.DataFrame(cached['rows'])
+                return self._listing
+        except (OSError, ValueError, KeyError):
+            pass
+        
+        df = self.pro.stock_basic(list_status='L', fields='ts_code,name,area,industry,market,list_date')
+        os.makedirs(cache_dir, exist_ok=True)
+        atomic_write_json(cache_file, {'date': today, 'rows': df.to_dict('records')})
+        self._listing = df
+        return df
+    
+    def get_stock_basic_batch(self, ts_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """一次请求获取多只股票的基本信息（用于按行业分组）"""
+        try:
+            df = self.get_stock_listing()
+            df = df[df['ts_code'].isin(ts_codes)]
+            return {row['ts_code']: row for row in df.to_dict('records')}
+        except Exception as e:
+            print(f"❌ 批量获取股票基本信息失败: {e}")
+            return {}
+    
+    def get_quote_table(self, ts_codes: List[str]) -> pd.DataFrame:
+        """快速行情表：只用股票列表和最近一根日线，一次请求覆盖所有股票"""
+        listing = self.get_stock_listing()
+        listing = listing[listing['ts_code'].isin(ts_codes)][['ts_code', 'name', 'industry']]
+        
+        # 盘前当日日线尚未发布时回退到上一交易日
+        day = self.calendar.latest_trading_day()
+        bars = pd.DataFrame()
+        for _ in range(2):
+            bars = self.pro.daily(ts_code=','.join(ts_codes), trade_date=day.strftime('%Y%m%d'),
+                                  fields='ts_code,trade_date,close,pct_chg,vol,amount')
+            if not bars.empty:
+                break
+            day = self.calendar.previous_trading_day(day)
+        
+        table = pd.DataFrame({'ts_code': ts_codes}).merge(listing, on='ts_code', how='left')
+        return table.merge(bars, on='ts_code', how='left') if not bars.empty else table
+    
     def get_daily_data(self, ts_code: str, days: int = 60) -> Optional[pd.DataFrame]:
         """获取日线行情数据"""
         try:
@@ -45,51 +115,156 @@ class TushareClient:
             print(f"❌ 获取日线数据失败: {e}")
             return None
     
-    def get_financial_data(self, ts_code: str) -> Optional[Dict[str, Any]]:
-        """获取财务数据"""
+    def get_daily_batch(self, ts_codes: List[str], days: int = 120) -> Optional[pd.DataFrame]:
+        """一次请求获取多只股票的日线（长表），用于组合风险计算"""
         try:
-            # 获取最新财报
             end_date = datetime.now().strftime('%Y%m%d')
+            start_date = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
+            
+            df = self.pro.daily(ts_code=','.join(ts_codes), start_date=start_date, end_date=end_date,
+                                fields='ts_code,trade_date,close,pct_chg')
+            return df if not df.empty else None
+        except Exception as e:
+            print(f"❌ 批量获取日线数据失败: {e}")
+            return None
+    
+    def get_index_daily(self, index_code: str, days: int = 120) -> Optional[pd.DataFrame]:
+        """获取指数日线"""
+        try:
+            end_date = datetime.now().strftime('%Y%m%d')
+            start_date = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
+            
+            df = self.pro.index_daily(ts_code=index_code, start_date=start_date, end_date=end_date,
+                                      fields='ts_code,trade_date,close,pct_chg')
+            return df.sort_values('trade_date') if not df.empty else None
+        except Exception as e:
+            print(f"⚠️ 获取指数日线失败 {index_code}: {e}")
+            return None
+    
+    def latest_report_period(self, ts_code: str, since: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """轻量披露检查：只查询公告日在 since 之后的利润表报告期和公告日两个字段
+
+        没有新披露和查询失败都返回 None；需要区分两者时使用 _query_report_period
+        """
+        try:
+            return self._query_report_period(ts_code, since)
+        except Exception as e:
+            print(f"⚠️ 财报披露检查失败: {e}")
+            return None
+    
+    def _query_report_period(self, ts_code: str, since: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """同 latest_report_period，查询失败时抛出异常"""
+        today = datetime.now().strftime('%Y%m%d')
+        start_date = since or (datetime.now() - timedelta(days=400)).strftime('%Y%m%d')
+        df = self.pro.income(ts_code=ts_code, start_date=start_date, end_date=today,
+                             fields='ts_code,ann_date,end_date')
+        if df.empty:
+            return None
+        latest = df.sort_values(['end_date', 'ann_date']).iloc[-1]
+        return {'end_date': str(latest['end_date']), 'ann_date': str(latest['ann_date'])}
+    
+    def get_financial_data(self, ts_code: str, period: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """获取财务数据（只拉取单个报告期，默认为最新报告期）"""
+        try:
+            if period is None:
+                period = (self.latest_report_period(ts_code) or {}).get('end_date')
+                if not period:
+                    return None
             
             # 利润表
-            income_df = self.pro.income(ts_code=ts_code, end_date=end_date, fields='ts_code,end_date,total_revenue,revenue,operate_profit,total_profit,n_income')
+            income_df = self.pro.income(ts_code=ts_code, period=period, fields='ts_code,ann_date,end_date,total_revenue,revenue,operate_profit,total_profit,n_income')
             
             # 资产负债表
-            balance_df = self.pro.balancesheet(ts_code=ts_code, end_date=end_date, fields='ts_code,end_date,total_assets,total_liab,total_hldr_eqy_exc_min_int')
+            balance_df = self.pro.balancesheet(ts_code=ts_code, period=period, fields='ts_code,ann_date,end_date,total_assets,total_liab,total_hldr_eqy_exc_min_int')
             
             # 现金流量表
-            cashflow_df = self.pro.cashflow(ts_code=ts_code, end_date=end_date, fields='ts_code,end_date,n_cashflow_act,n_cashflow_inv_act,n_cash_flows_fnc_act')
+            cashflow_df = self.pro.cashflow(ts_code=ts_code, period=period, fields='ts_code,ann_date,end_date,n_cashflow_act,n_cashflow_inv_act,n_cash_flows_fnc_act')
             
+            # 同一报告期可能有更正公告，取最新一次
             result = {}
             if not income_df.empty:
-                result['income'] = income_df.iloc[0].to_dict()
+                result['income'] = income_df.sort_values('ann_date').iloc[-1].to_dict()
             if not balance_df.empty:
-                result['balance'] = balance_df.iloc[0].to_dict()
+                result['balance'] = balance_df.sort_values('ann_date').iloc[-1].to_dict()
             if not cashflow_df.empty:
-                result['cashflow'] = cashflow_df.iloc[0].to_dict()
+                result['cashflow'] = cashflow_df.sort_values('ann_date').iloc[-1].to_dict()
                 
             return result if result else None
         except Exception as e:
             print(f"❌ 获取财务数据失败: {e}")
             return None
     
-    def get_financial_indicators(self, ts_code: str) -> Optional[pd.DataFrame]:
-        """获取财务指标"""
+    def get_financial_indicators(self, ts_code: str, periods: int = 4) -> Optional[pd.DataFrame]:
+        """获取财务指标（最近 periods 个报告期）"""
         try:
             end_date = datetime.now().strftime('%Y%m%d')
-            df = self.pro.fina_indicator(ts_code=ts_code, end_date=end_date, 
+            start_date = (datetime.now() - timedelta(days=120 * periods)).strftime('%Y%m%d')
+            df = self.pro.fina_indicator(ts_code=ts_code, start_date=start_date, end_date=end_date,
                                          fields='ts_code,end_date,eps,roe,roa,gross_profit_margin,debt_to_assets,current_ratio,quick_ratio')
-            return df if not df.empty else None
+            if df.empty:
+                return None
+            return df.drop_duplicates('end_date').sort_values('end_date', ascending=False).head(periods)
         except Exception as e:
             print(f"❌ 获取财务指标失败: {e}")
             return None
     
+    def get_financials(self, ts_code: str):
+        """带报告期变更检测的财报获取
+        
+        Returns:
+            (financial_data, financial_indicators, end_date, updated)；
+            updated 为 True 表示出现了新报告期（或首次获取），基本面需要重新分析
+        """
+        cached = self.financial_cache.get(ts_code)
+        today = datetime.now().strftime('%Y%m%d')
+        
+        def from_cache(entry):
+            indicators = entry.get('financial_indicators')
+            return (entry.get('financial_data'), pd.DataFrame(indicators) if indicators else None,
+                    entry.get('end_date', ''), False)
+        
+        # 当天已检查过，不再请求
+        if cached and cached.get('checked_at') == today:
+            self.financial_cache.hit_rate.record(hits=1)
+            return from_cache(cached)
+        
+        try:
+            latest = self._query_report_period(ts_code, since=cached.get('ann_date') if cached else None)
+        except Exception as e:
+            # 查询失败不等于没有新披露：沿用缓存但不记为已检查，下次继续检查
+            print(f"⚠️ 财报披露检查失败: {e}")
+            if cached:
+                self.financial_cache.hit_rate.record(hits=1)
+                return from_cache(cached)
+            latest = None
+        else:
+            if cached and (latest is None or latest['end_date'] <= cached.get('end_date', '')):
+                self.financial_cache.touch(ts_code, cached)
+                self.financial_cache.hit_rate.record(hits=1)
+                return from_cache(cached)
+        self.financial_cache.hit_rate.record(misses=1)
+        if latest is None:
+            return None, None, '', False
+        
+        print(f"📑 发现新报告期 {latest['end_date']}（公告日 {latest['ann_date']}），重新获取财报")
+        financial_data = self.get_financial_data(ts_code, period=latest['end_date'])
+        indicators = self.get_financial_indicators(ts_code)
+        if financial_data is None or indicators is None:
+            # 获取失败时不写入缓存、不记为已检查，下次调用重试；有旧报告期数据时先沿用
+            print(f"⚠️ 报告期 {latest['end_date']} 的财报获取失败，下次分析时重试")
+            if cached:
+                return from_cache(cached)
+            return financial_data, indicators, '', False
+        self.financial_cache.put(ts_code, latest['end_date'], latest['ann_date'], financial_data,
+                                 indicators.to_dict('records') if indicators is not None else [])
+        return financial_data, indicators, latest['end_date'], True
+    
     def get_realtime_quote(self, ts_code: str) -> Optional[Dict[str, Any]]:
         """获取实时行情（优先获取盘中数据）"""
         try:
             # 方法1: 尝试获取分钟级数据（如果有权限）
             current_time = datetime.now()
-            if current_time.hour >= 9 and current_time.hour <= 15:  # 交易时间内
+            if self.calendar.is_open(current_time):  # 交易时间内
                 try:
                     # 获取当日分钟级数据
                     current_date = current_time.strftime('%Y%m%d')
@@ -111,8 +286,8 @@ class TushareClient:
                 except Exception as minute_error:
                     print(f"⚠️ 分钟级数据获取失败（可能需要更高权限）: {minute_error}")
             
-            # 方法2: 获取最新交易日数据
-            end_date = datetime.now().strftime('%Y%m%d')
+            # 方法2: 获取最新交易日数据（节假日直接查询上一交易日）
+            end_date = self.calendar.latest_trading_day(current_time.date()).strftime('%Y%m%d')
             df = self.pro.daily(ts_code=ts_code, trade_date=end_date)
             
             if df.empty:
@@ -135,7 +310,7 @@ class TushareClient:
             current_time = datetime.now()
             
             # 只在交易时间内获取
-            if not (9 <= current_time.hour <= 15):
+            if not self.calendar.is_open(current_time):
                 print("⚠️ 非交易时间，无法获取盘中数据")
                 return None
             
@@ -169,6 +344,42 @@ class TushareClient:
             print(f"❌ 获取盘中数据失败: {e}")
             return None
     
+    def get_minute_bars_since(self, ts_code: str, since: Optional[str] = None,
+                              lookback_minutes: int = 30) -> Optional[pd.DataFrame]:
+        """增量获取当日分钟线：只返回 trade_time 晚于 since 的新K线（按时间升序）
+
+        since 为上次已处理的 trade_time（'YYYY-MM-DD HH:MM:SS'），为空时回看 lookback_minutes 分钟
+        """
+        try:
+            current_time = datetime.now()
+            if not self.calendar.is_open(current_time):
+                return None
+            
+            current_date = current_time.strftime('%Y%m%d')
+            if since and since[:10] == current_time.strftime('%Y-%m-%d'):
+                start_time = since[11:19]
+            else:
+                since = None
+                start_dt = max(current_time - timedelta(minutes=lookback_minutes),
+                               current_time.replace(hour=9, minute=30, second=0, microsecond=0))
+                start_time = start_dt.strftime('%H:%M:%S')
+            
+            df = self.pro.stk_mins(ts_code=ts_code,
+                                   start_date=current_date,
+                                   end_date=current_date,
+                                   start_time=start_time,
+                                   end_time=current_time.strftime('%H:%M:%S'))
+            if df is None or df.empty:
+                return None
+            
+            df = df.sort_values('trade_time')
+            if since:
+                df = df[df['trade_time'].astype(str) > since]
+            return df if not df.empty else None
+        except Exception as e:
+            print(f"⚠️ 增量获取分钟线失败 {ts_code}: {e}")
+            return None
+    
     def get_news(self, ts_code: str, days: int = 7) -> Optional[list]:
         """获取新闻资讯"""
         try:
@@ -191,49 +402,54 @@ class TushareClient:
             print(f"⚠️ 获取新闻数据失败（可能需要更高级别的Tushare权限）: {e}")
             return []
     
-    def get_comprehensive_data(self, ts_code: str) -> Dict[str, Any]:
+    def get_overnight_news(self) -> pd.DataFrame:
+        """上一交易日收盘以来的全部新闻（一次请求，供批量分析排定优先级）"""
+        today = datetime.now().date()
+        last_close = self.calendar.previous_trading_day(today) \
+            if self.calendar.is_trading_day(today) else self.calendar.latest_trading_day(today)
+        try:
+            return self.pro.news(src='sina', start_date=f"{last_close:%Y-%m-%d} 15:00:00",
+                                 end_date=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        except Exception as e:
+            print(f"⚠️ 获取隔夜新闻失败（可能需要更高级别的Tushare权限）: {e}")
+            return pd.DataFrame()
+    
+    def get_comprehensive_data(self, ts_code: str) -> StockData:
         """获取综合数据包"""
         print(f"\n📊 正在获取 {ts_code} 的综合数据...")
         
         current_time = datetime.now()
-        is_trading_time = (9 <= current_time.hour <= 15) and current_time.weekday() < 5
-        
-        data = {
-            'ts_code': ts_code,
-            'fetch_time': current_time.isoformat(),
-            'is_trading_time': is_trading_time,
-            'basic_info': self.get_stock_basic_info(ts_code),
-            'daily_data': None,
-            'financial_data': self.get_financial_data(ts_code),
-            'financial_indicators': None,
-            'realtime_quote': self.get_realtime_quote(ts_code),
-            'intraday_data': None,
-            'news': self.get_news(ts_code),
-        }
+        is_trading_time = self.calendar.is_open(current_time)
+        
+        data = StockData(
+            ts_code=ts_code,
+            fetch_time=current_time.isoformat(),
+            is_trading_time=is_trading_time,
+            basic_info=self.get_stock_basic_info(ts_code),
+            realtime_quote=self.get_realtime_quote(ts_code),
+            news=self.get_news(ts_code) or [],
+        )
         
         # 如果是交易时间，尝试获取盘中数据
         if is_trading_time:
             print("🕐 交易时间内，尝试获取盘中数据...")
-            data['intraday_data'] = self.get_intraday_data(ts_code, minutes=60)  # 获取最近1小时数据
+            data.intraday_data = self.get_intraday_data(ts_code, minutes=60)  # 获取最近1小时数据
         else:
             print("⏰ 非交易时间，使用历史数据")
         
-        # 转换DataFrame为dict
-        daily_df = self.get_daily_data(ts_code)
-        if daily_df is not None:
-            data['daily_data'] = daily_df.to_dict('records')
-            
-        indicators_df = self.get_financial_indicators(ts_code)
-        if indicators_df is not None:
-            data['financial_indicators'] = indicators_df.to_dict('records')
+        # 行情和指标保持DataFrame列式存储，序列化时再转换
+        data.daily_data = self.get_daily_data(ts_code)
+        (data.financial_data, data.financial_indicators,
+         data.financial_period, data.financial_updated) = self.get_financials(ts_code)
         
         print(f"✅ 数据获取完成")
         return data
     
-    def save_data_to_cache(self, ts_code: str, data: Dict[str, Any], cache_dir: str = "data/cache"):
-        """保存数据到缓存"""
+    def save_data_to_cache(self, ts_code: str, data: StockData, cache_dir: Optional[str] = None):
+        """保存数据到缓存（默认写入客户端的缓存目录，录制/回放时为卡带的临时目录）"""
+        cache_dir = cache_dir or self.cache_dir
         os.makedirs(cache_dir, exist_ok=True)
-        filename = f"{cache_dir}/{ts_code}_{datetime.now().strftime('%Y%m%d')}.json"
+        filename = os.path.join(cache_dir, f"{ts_code}_{datetime.now().strftime('%Y%m%d')}.json")
         
         # 处理pandas对象
         def default_serializer(obj):
@@ -242,7 +458,7 @@ class TushareClient:
             raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
         
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2, default=default_serializer)
+            json.dump(data.to_dict(), f, ensure_ascii=False, indent=2, default=default_serializer)
         
         print(f"💾 数据已缓存到: {filename}")
         return filename
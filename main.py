@@ -4,33 +4,108 @@
 """
 import sys
 import os
-from typing import List, Dict, Any
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import cached_property
+from typing import List, Optional, Callable, Dict, Any, Union
 from datetime import datetime
 
+_PROCESS_START = time.perf_counter()
+
 # 添加项目路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from data.tushare_client import TushareClient
-from agents.llm_client import DeepSeekClient
-from agents.analysts import TechnicalAnalyst, FundamentalAnalyst, NewsAnalyst
-from agents.researchers import BullResearcher, BearResearcher, DebateCoordinator
-from agents.decision_maker import Trader, RiskManager
-from reports.report_generator import ReportGenerator
+from data.models import StockData, AnalystResults, DebateResult, AnalysisResult
+from data.checkpoint import BatchCheckpoint, StockCheckpoint
+from data.portfolio_risk import PortfolioRisk
+from data.market_scanner import MarketScanner
+from data.peer_valuation import PeerValuation
+from data.batch_planner import StockTask, DeadlinePlanner, DEPTH_LABELS, prioritize_stocks, parse_deadline
+from agents.llm_budget import (RunBudget, UsageLedger, BudgetExceeded, usage_scope, budget_scope,
+                               current_stock, current_budget)
 from config.config import (
     DEEPSEEK_API_KEY, 
     DEEPSEEK_API_BASE, 
     DEEPSEEK_MODEL,
+    LLM_ENDPOINTS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_DELAY,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_STREAM_TIMEOUT,
     TUSHARE_TOKEN,
     MAX_DEBATE_ROUNDS,
+    DEBATE_SIMILARITY_THRESHOLD,
+    DEBATE_CLEAR_CUT_GAP,
     LLM_CONFIG,
+    AGENT_PROFILES,
+    LLM_PRICING,
+    LLM_RUN_BUDGET_COST,
+    LLM_RUN_BUDGET_SECONDS,
+    LLM_RUN_HARD_LIMIT_COST,
+    LLM_DAILY_BUDGET_COST,
+    LLM_LEDGER_DIR,
+    ANALYSIS_MODES,
+    ENABLE_SECTOR_ANALYSIS,
+    SECTOR_MIN_MEMBERS,
+    ENABLE_PORTFOLIO_RISK,
+    PORTFOLIO_BENCHMARK,
+    PORTFOLIO_RISK_DAYS,
+    PORTFOLIO_VOL_WINDOW,
+    ENABLE_PEER_VALUATION,
+    SCAN_TOP_N,
+    SCAN_MOMENTUM_DAYS,
+    SCAN_MIN_MARKET_CAP,
+    SCAN_MIN_LIST_DAYS,
+    BATCH_USE_QUEUE,
+    BATCH_WORKERS,
+    HELD_POSITIONS,
+    PRIORITY_GAP_THRESHOLD,
+    PRIORITY_NEWS_MIN_MENTIONS,
+    MODE_DEADLINES,
+    STOCK_ESTIMATE_SECONDS,
+    DATA_CACHE_DIR,
+    CHECKPOINT_DIR,
     validate_config
 )
 
+class locked_cached_property(cached_property):
+    """线程安全的 cached_property：并发首次访问时只创建一次
+
+    Python 3.12 起 cached_property 不再加锁，批量分析线程、调度器和常驻服务可能同时初始化同一个客户端，
+    得到各自带线程池、端点健康统计和调用统计的多个实例。使用实例上的可重入锁（组件创建时会访问其他组件）
+    """
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if self.attrname in instance.__dict__:
+            return instance.__dict__[self.attrname]
+        with instance._init_lock:
+            return super().__get__(instance, owner)
+
+
 class StockAnalysisSystem:
-    """股票分析系统"""
+    """股票分析系统
+    
+    客户端和智能体均在首次使用时才创建（并按需导入 openai 等依赖），
+    快速查看只会初始化 Tushare 客户端
+    """
     
-    def __init__(self, deepseek_key: str = None, tushare_token: str = None):
-        """初始化系统"""
+    def __init__(self, deepseek_key: str = None, tushare_token: str = None,
+                 tushare_client: TushareClient = None, llm_client=None, cassette=None, profiler=None,
+                 dashboard=None):
+        """初始化系统
+        
+        tushare_client / llm_client 可直接注入（如测试时传入桩客户端），此时不再创建真实客户端；
+        cassette 为录制/回放卡带（data.cassette.Cassette），Tushare、LLM 调用和批量分析的降级决策都经由卡带，
+        磁盘缓存改用卡带的临时目录；
+        profiler 为分阶段性能剖析器（data.profiler.StageProfiler），剖析结果写在分析报告旁；
+        dashboard 为实时看板（dashboard.Dashboard），接收各股票的阶段进度
+        """
         print("="*80)
         print("🚀 初始化股票分析系统")
         print("="*80)
@@ -38,49 +113,195 @@ class StockAnalysisSystem:
         # 使用提供的key或配置文件中的key
         self.deepseek_key = deepseek_key or DEEPSEEK_API_KEY
         self.tushare_token = tushare_token or TUSHARE_TOKEN
-        
-        # 初始化数据客户端
-        print("\n📊 初始化Tushare数据客户端...")
-        self.tushare_client = TushareClient(self.tushare_token)
-        
-        # 初始化LLM客户端
+        self.cassette = cassette
+        self.cache_dir = cassette.cache_dir if cassette is not None else DATA_CACHE_DIR
+        self.profiler = profiler
+        self.dashboard = dashboard
+        self._init_lock = threading.RLock()
+        
+        # 注入的客户端覆盖惰性创建
+        if tushare_client is not None:
+            self.tushare_client = tushare_client
+        if llm_client is not None:
+            self.llm_client = llm_client
+        
+        print("\n✅ 系统初始化完成！（各模块将在首次使用时加载）")
+        print("="*80 + "\n")
+    
+    # ---------- 客户端 ----------
+    
+    @locked_cached_property
+    def tushare_client(self) -> TushareClient:
+        print("📊 初始化Tushare数据客户端...")
+        return TushareClient(self.tushare_token, cache_dir=self.cache_dir, cassette=self.cassette)
+    
+    @locked_cached_property
+    def llm_client(self):
+        from agents.llm_client import DeepSeekClient
         print("🤖 初始化DeepSeek AI客户端...")
-        self.llm_client = DeepSeekClient(
-            api_key=self.deepseek_key,
+        replaying = self.cassette is not None and self.cassette.replaying
+        return DeepSeekClient(
+            api_key=self.deepseek_key or ('replay' if replaying else None),  # 回放不发请求，无需密钥
             base_url=DEEPSEEK_API_BASE,
-            model=DEEPSEEK_MODEL
+            model=DEEPSEEK_MODEL,
+            endpoints=LLM_ENDPOINTS,
+            hedge=LLM_HEDGE_ENABLED,
+            hedge_delay=LLM_HEDGE_DELAY,
+            min_hedge_delay=LLM_HEDGE_MIN_DELAY,
+            timeout=LLM_STREAM_TIMEOUT,
+            defaults=LLM_CONFIG,
+            profiles=AGENT_PROFILES,
+            budget=self.run_budget,
+            cassette=self.cassette
         )
-        
-        # 初始化分析师团队
-        print("👥 初始化分析师团队...")
-        self.technical_analyst = TechnicalAnalyst(self.llm_client)
-        self.fundamental_analyst = FundamentalAnalyst(self.llm_client)
-        self.news_analyst = NewsAnalyst(self.llm_client)
-        
-        # 初始化研究员
-        print("🔬 初始化研究员团队...")
-        self.bull_researcher = BullResearcher(self.llm_client)
-        self.bear_researcher = BearResearcher(self.llm_client)
-        self.debate_coordinator = DebateCoordinator(self.llm_client)
-        
-        # 初始化决策层
-        print("💼 初始化决策层...")
-        self.trader = Trader(self.llm_client)
-        self.risk_manager = RiskManager(self.llm_client)
-        
-        # 初始化报告生成器
-        print("📄 初始化报告生成器...")
-        self.report_generator = ReportGenerator()
-        
-        print("\n✅ 系统初始化完成！")
-        print("="*80 + "\n")
     
-    def analyze_stock(self, stock_code: str, save_cache: bool = True) -> Dict[str, Any]:
-        """分析单只股票"""
-        # 检查分析模式
-        analysis_mode = os.getenv('ANALYSIS_MODE', 'standard')
-        mode_emoji = "🌅" if analysis_mode == "pre_market" else "🌆" if analysis_mode == "post_market" else "📊"
-        mode_text = "开盘前分析" if analysis_mode == "pre_market" else "收盘后分析" if analysis_mode == "post_market" else "标准分析"
+    @locked_cached_property
+    def run_budget(self) -> RunBudget:
+        # 回放的调用没有实际花费，不写入用量台账
+        replaying = self.cassette is not None and self.cassette.replaying
+        return RunBudget(LLM_RUN_BUDGET_COST, LLM_RUN_BUDGET_SECONDS, LLM_PRICING,
+                         ledger=None if replaying else UsageLedger(LLM_LEDGER_DIR),
+                         hard_max_cost=LLM_RUN_HARD_LIMIT_COST,
+                         daily_max_cost=LLM_DAILY_BUDGET_COST)
+    
+    # ---------- 分析师团队 ----------
+    
+    @locked_cached_property
+    def technical_analyst(self):
+        from agents.analysts import TechnicalAnalyst
+        return TechnicalAnalyst(self.llm_client)
+    
+    @locked_cached_property
+    def peer_valuation(self):
+        if not ENABLE_PEER_VALUATION:
+            return None
+        return PeerValuation(self.tushare_client.pro, self.tushare_client.calendar,
+                             cache_dir=self.cache_dir)
+    
+    @locked_cached_property
+    def fundamental_analyst(self):
+        from agents.analysts import FundamentalAnalyst
+        return FundamentalAnalyst(self.llm_client, self.peer_valuation,
+                                  self.tushare_client.financial_cache)
+    
+    @locked_cached_property
+    def news_analyst(self):
+        from agents.analysts import NewsAnalyst
+        from data.news_cache import NewsArticleCache
+        return NewsAnalyst(self.llm_client, NewsArticleCache(self.cache_dir))
+    
+    @locked_cached_property
+    def sector_analyst(self):
+        from agents.analysts import SectorAnalyst
+        return SectorAnalyst(self.llm_client)
+    
+    # ---------- 研究员 ----------
+    
+    @locked_cached_property
+    def bull_researcher(self):
+        from agents.researchers import BullResearcher
+        return BullResearcher(self.llm_client)
+    
+    @locked_cached_property
+    def bear_researcher(self):
+        from agents.researchers import BearResearcher
+        return BearResearcher(self.llm_client)
+    
+    @locked_cached_property
+    def debate_coordinator(self):
+        from agents.researchers import DebateCoordinator
+        from agents.debate_memory import ConvergenceDetector
+        return DebateCoordinator(
+            self.llm_client,
+            ConvergenceDetector(DEBATE_SIMILARITY_THRESHOLD, DEBATE_CLEAR_CUT_GAP)
+        )
+    
+    # ---------- 决策层 ----------
+    
+    @locked_cached_property
+    def trader(self):
+        from agents.decision_maker import Trader
+        return Trader(self.llm_client)
+    
+    @locked_cached_property
+    def risk_manager(self):
+        from agents.decision_maker import RiskManager
+        return RiskManager(self.llm_client)
+    
+    @locked_cached_property
+    def report_generator(self):
+        from reports.report_generator import ReportGenerator
+        return ReportGenerator()
+    
+    def warm_up(self):
+        """一次性创建全部客户端和智能体（常驻服务启动时调用，避免首个任务承担初始化开销）"""
+        start = time.perf_counter()
+        for name in ('tushare_client', 'llm_client', 'technical_analyst', 'peer_valuation',
+                     'fundamental_analyst', 'news_analyst', 'sector_analyst', 'bull_researcher',
+                     'bear_researcher', 'debate_coordinator', 'trader', 'risk_manager',
+                     'report_generator'):
+            getattr(self, name)
+        print(f"🔥 预热完成，耗时 {time.perf_counter() - start:.2f}秒")
+    
+    def _run_stage(self, checkpoint: Optional[StockCheckpoint], stage: str, compute: Callable,
+                   dump: Callable = None, load: Callable = None):
+        """执行一个阶段；检查点中已有该阶段结果时直接恢复，跳过数据和LLM调用"""
+        with ExitStack() as stack:
+            for tracker in (self.profiler, self.dashboard):
+                if tracker is not None:
+                    stack.enter_context(tracker.stage(current_stock.get(), stage))
+            if checkpoint is not None and checkpoint.has(stage):
+                print(f"⏭️ 从检查点恢复阶段: {stage}")
+                value = checkpoint.get(stage)
+                return load(value) if load else value
+            
+            value = compute()
+            if checkpoint is not None:
+                checkpoint.save(stage, dump(value) if dump else value)
+            return value
+    
+    def analyze_stock(self, stock_code: str, save_cache: bool = True,
+                      analysis_mode: str = 'standard',
+                      checkpoint: Optional[StockCheckpoint] = None,
+                      sector_context: Optional[Dict[str, Any]] = None,
+                      portfolio_risk: Optional[Dict[str, Any]] = None,
+                      debate_rounds: int = MAX_DEBATE_ROUNDS,
+                      run_label: Optional[str] = None) -> AnalysisResult:
+        """分析单只股票
+
+        sector_context 为批量分析中同行业共享的行业背景，随股票上下文注入所有智能体的提示词；
+        portfolio_risk 为该股在股票池中的组合风险画像，仅供风险管理员使用；
+        debate_rounds 为辩论轮次上限，0 表示筛查模式（只用分析师结论决策，跳过多空研究和辩论）；
+        run_label 为批量运行之外（常驻服务任务、盘中异动重新分析、交互模式）单独计算预算时的运行标签
+        """
+        if self.dashboard is not None:
+            depth = 'screening' if debate_rounds == 0 else 'reduced' if debate_rounds < MAX_DEBATE_ROUNDS else 'full'
+            self.dashboard.stock_started(stock_code, depth)
+        # 期间的LLM调用在用量台账中记到该股票名下；不在批量运行中时本次分析单独作为一次运行计算预算，
+        # 常驻进程中的预算不会随任务累积到硬上限
+        budget = current_budget.get()
+        if budget is None:
+            budget = self.run_budget.spawn(run_label or f"{datetime.now():%Y%m%d_%H%M%S}_{stock_code}")
+        try:
+            with budget_scope(budget), usage_scope(stock_code):
+                result = self._analyze_stock(stock_code, save_cache, analysis_mode, checkpoint,
+                                             sector_context, portfolio_risk, debate_rounds)
+        except BaseException:
+            if self.dashboard is not None:
+                self.dashboard.stock_finished(stock_code, ok=False)
+            if self.profiler is not None:
+                self.profiler.write_stock_report(stock_code, None)  # 释放基准快照，阶段耗时计入批量累计
+            raise
+        if self.dashboard is not None:
+            self.dashboard.stock_finished(stock_code, ok=True)
+        if self.profiler is not None:
+            self.profiler.write_stock_report(stock_code, result.report_file)
+        return result
+    
+    def _analyze_stock(self, stock_code: str, save_cache: bool, analysis_mode: str,
+                       checkpoint: Optional[StockCheckpoint], sector_context: Optional[Dict[str, Any]],
+                       portfolio_risk: Optional[Dict[str, Any]], debate_rounds: int) -> AnalysisResult:
+        mode_emoji, mode_text = ANALYSIS_MODES.get(analysis_mode, ANALYSIS_MODES['standard'])
         
         print("\n" + "="*80)
         print(f"{mode_emoji} {mode_text}: {stock_code}")
@@ -91,138 +312,468 @@ class StockAnalysisSystem:
         # 1. 数据收集
         print("\n【阶段 1/6】数据收集")
         print("-" * 80)
-        stock_data = self.tushare_client.get_comprehensive_data(stock_code)
         
-        if save_cache:
-            self.tushare_client.save_data_to_cache(stock_code, stock_data)
+        def collect():
+            data = self.tushare_client.get_comprehensive_data(stock_code)
+            data.sector_context = sector_context
+            if save_cache:
+                self.tushare_client.save_data_to_cache(stock_code, data)
+            return data
+        
+        stock_data = self._run_stage(checkpoint, 'stock_data', collect,
+                                     dump=StockData.to_dict, load=StockData.from_dict)
         
         # 2. 专业分析
         print("\n【阶段 2/6】专业分析")
         print("-" * 80)
         
-        technical_result = self.technical_analyst.analyze(stock_data)
-        fundamental_result = self.fundamental_analyst.analyze(stock_data)
-        news_result = self.news_analyst.analyze(stock_data)
-        
-        analysis_results = {
-            'technical': technical_result,
-            'fundamental': fundamental_result,
-            'news': news_result
-        }
+        analysts = self._run_stage(
+            checkpoint, 'analysts',
+            lambda: AnalystResults(
+                technical=self.technical_analyst.analyze(stock_data),
+                fundamental=self.fundamental_analyst.analyze(stock_data),
+                news=self.news_analyst.analyze(stock_data)
+            ),
+            dump=AnalystResults.to_dict, load=lambda v: AnalystResults(**v)
+        )
         
         # 3. 结构化辩论
         print("\n【阶段 3/6】结构化辩论")
         print("-" * 80)
         
-        bull_view = self.bull_researcher.research(
-            {'analysts': analysis_results}, stock_data
-        )
-        bear_view = self.bear_researcher.research(
-            {'analysts': analysis_results}, stock_data
-        )
-        
-        debate_result = self.debate_coordinator.coordinate_debate(
-            bull_view, bear_view, stock_data, max_rounds=MAX_DEBATE_ROUNDS
+        if debate_rounds > 0:
+            bull_view = self._run_stage(checkpoint, 'bull_view',
+                                        lambda: self.bull_researcher.research(analysts, stock_data))
+            bear_view = self._run_stage(checkpoint, 'bear_view',
+                                        lambda: self.bear_researcher.research(analysts, stock_data))
+            
+            debate_result = self._run_stage(
+                checkpoint, 'debate',
+                lambda: self.debate_coordinator.coordinate_debate(
+                    bull_view, bear_view, stock_data, max_rounds=debate_rounds,
+                    analysts=analysts
+                ),
+                dump=DebateResult.to_dict, load=lambda v: DebateResult(**v)
+            )
+        else:
+            print("⏩ 筛查模式：跳过多空研究和辩论")
+            debate_result = self._run_stage(
+                checkpoint, 'debate',
+                lambda: DebateResult(stop_reason='筛查模式：受截止时间或预算限制，跳过多空辩论',
+                                     saved_calls=2 + 2 * MAX_DEBATE_ROUNDS),
+                dump=DebateResult.to_dict, load=lambda v: DebateResult(**v)
+            )
+        
+        result = AnalysisResult(
+            stock_data=stock_data,
+            analysts=analysts,
+            debate=debate_result,
+            analysis_mode=analysis_mode
         )
         
         # 4. 综合决策
         print("\n【阶段 4/6】综合决策")
         print("-" * 80)
         
-        all_analysis = {
-            'analysts': analysis_results,
-            'debate': debate_result
-        }
-        
-        trading_decision = self.trader.make_decision(all_analysis, stock_data)
+        all_analysis = result.analysis_dict()
+        result.decision = self._run_stage(checkpoint, 'decision',
+                                          lambda: self.trader.make_decision(all_analysis, stock_data))
         
         # 5. 风险评估
         print("\n【阶段 5/6】风险评估")
         print("-" * 80)
         
-        risk_assessment = self.risk_manager.assess_risk(
-            trading_decision, all_analysis, stock_data
+        result.risk_assessment = self._run_stage(
+            checkpoint, 'risk_assessment',
+            lambda: self.risk_manager.assess_risk(result.decision, all_analysis, stock_data,
+                                                  portfolio_risk=portfolio_risk)
         )
         
         # 6. 报告生成
         print("\n【阶段 6/6】报告生成")
         print("-" * 80)
         
-        final_result = {
-            'stock_data': stock_data,
-            'analysis': all_analysis,
-            'decision': trading_decision,
-            'risk_assessment': risk_assessment,
-            'analysis_time': datetime.now().isoformat(),
-            'analysis_mode': analysis_mode,
-            'duration_seconds': (datetime.now() - start_time).total_seconds()
-        }
+        def write_report():
+            result.analysis_time = datetime.now().isoformat()
+            result.duration_seconds = (datetime.now() - start_time).total_seconds()
+            return {
+                'report_file': self.report_generator.generate_report(stock_code, result),
+                'analysis_time': result.analysis_time,
+                'duration_seconds': result.duration_seconds,
+            }
         
-        report_file = self.report_generator.generate_report(stock_code, final_result)
-        final_result['report_file'] = report_file
+        report = self._run_stage(checkpoint, 'report', write_report)
+        result.report_file = report['report_file']
+        result.analysis_time = report['analysis_time']
+        result.duration_seconds = report['duration_seconds']
         
         # 完成
         duration = datetime.now() - start_time
         print("\n" + "="*80)
         print(f"✅ 分析完成！耗时: {duration.total_seconds():.1f}秒")
-        print(f"📋 报告文件: {report_file}")
+        print(f"📋 报告文件: {result.report_file}")
         print("="*80 + "\n")
         
-        return final_result
+        return result
     
-    def batch_analyze(self, stock_codes: List[str]) -> List[Dict[str, Any]]:
-        """批量分析多只股票"""
+    def batch_analyze(self, stock_codes: List[str], analysis_mode: str = 'standard',
+                      resume_run_id: Optional[str] = None,
+                      use_queue: bool = BATCH_USE_QUEUE,
+                      deadline: Optional[datetime] = None,
+                      workers: int = BATCH_WORKERS) -> List[AnalysisResult]:
+        """批量分析多只股票
+
+        每只股票的每个阶段都会写入检查点；传入 resume_run_id 时跳过已完成的股票和阶段。
+        股票按优先级（持仓、隔夜新闻、大幅波动）排序后在 workers 个线程中并发分析；
+        deadline 默认取该分析模式的截止时间，来不及时后续股票降级分析。
+        use_queue=True 时按股票写入持久化任务队列（带优先级），本进程与 worker.py 启动的其他进程/机器共同处理
+        """
+        batch_checkpoint = None
+        if resume_run_id:
+            batch_checkpoint = BatchCheckpoint.load(resume_run_id)
+            if batch_checkpoint is None:
+                if not stock_codes:
+                    # 命令行续跑只给出运行ID，没有可重新开始的股票列表
+                    raise ValueError(f"未找到运行 {resume_run_id} 的检查点")
+                print(f"⚠️ 未找到运行 {resume_run_id} 的检查点，将重新开始")
+            else:
+                stock_codes = batch_checkpoint.stock_codes
+                analysis_mode = batch_checkpoint.analysis_mode
+                done = batch_checkpoint.completed_codes()
+                print(f"♻️ 续跑 {resume_run_id}: 已完成 {len(done)}/{len(stock_codes)} 只")
+        if batch_checkpoint is None:
+            batch_checkpoint = BatchCheckpoint.create(stock_codes, analysis_mode)
+        
         print("\n" + "="*80)
         print(f"📊 批量分析模式: {len(stock_codes)} 只股票")
+        print(f"🔖 运行ID: {batch_checkpoint.run_id}（中断后可用 --resume {batch_checkpoint.run_id} 续跑）")
         print("="*80 + "\n")
         
-        results = []
-        
-        for i, stock_code in enumerate(stock_codes, 1):
-            print(f"\n{'='*80}")
-            print(f"进度: [{i}/{len(stock_codes)}] 分析 {stock_code}")
-            print('='*80)
+        # 每次批量运行独立计数（定时调度可能同时发起多次运行），由 budget_scope 传给LLM客户端和各线程
+        budget = self.run_budget.spawn(batch_checkpoint.run_id, since=batch_checkpoint.created_at[:10])
+        with budget_scope(budget):
+            basic_infos = self.tushare_client.get_stock_basic_batch(stock_codes) \
+                if ENABLE_SECTOR_ANALYSIS or ENABLE_PORTFOLIO_RISK else {}
+            sector_contexts = self._analyze_sectors(stock_codes, basic_infos, batch_checkpoint) \
+                if ENABLE_SECTOR_ANALYSIS else {}
+            portfolio = self._portfolio_risk(stock_codes, basic_infos) if ENABLE_PORTFOLIO_RISK else None
             
-            try:
-                result = self.analyze_stock(stock_code)
-                results.append(result)
-            except Exception as e:
-                print(f"\n❌ 分析 {stock_code} 失败: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
-        
-        # 生成汇总报告
-        if results:
-            print("\n" + "="*80)
-            print("📊 生成批量分析汇总报告")
-            print("="*80)
-            summary_file = self.report_generator.generate_summary_report(results)
-            print(f"\n✅ 批量分析完成！")
-            print(f"   成功: {len(results)}/{len(stock_codes)} 只")
-            print(f"   汇总报告: {summary_file}")
-            print("="*80 + "\n")
+            tasks = self._prioritize(stock_codes)
+            if self.dashboard is not None:
+                self.dashboard.begin_batch(batch_checkpoint.run_id, analysis_mode, tasks, 1 if use_queue else workers,
+                                           budget=budget)
+            
+            if deadline is None:
+                deadline = parse_deadline(MODE_DEADLINES.get(analysis_mode))
+                if deadline is not None and deadline <= datetime.now():
+                    print(f"⚠️ 已过{ANALYSIS_MODES[analysis_mode][1]}截止时间 {deadline:%H:%M}，本次不做降级")
+                    deadline = None
+            
+            if use_queue:
+                results = self._run_via_queue(tasks, analysis_mode, batch_checkpoint,
+                                              sector_contexts, portfolio, deadline)
+            else:
+                planner = DeadlinePlanner(deadline, workers, STOCK_ESTIMATE_SECONDS, MAX_DEBATE_ROUNDS)
+                results = self._run_in_process(tasks, analysis_mode, batch_checkpoint,
+                                               sector_contexts, portfolio, planner, workers, budget)
+            
+            # 生成汇总报告
+            if results:
+                print("\n" + "="*80)
+                print("📊 生成批量分析汇总报告")
+                print("="*80)
+                summary_file = self.report_generator.generate_summary_report(results, analysis_mode)
+                print(f"\n✅ 批量分析完成！")
+                print(f"   成功: {len(results)}/{len(stock_codes)} 只")
+                print(f"   汇总报告: {summary_file}")
+                print(f"   辩论LLM调用: {sum(r.debate.llm_calls for r in results)} 次"
+                      f"（提前结束节省 {sum(r.debate.saved_calls for r in results)} 次）")
+                for line in budget.report_lines():
+                    print(f"   {line}")
+                if budget.ledger is not None:
+                    daily_limit = f" / ¥{LLM_DAILY_BUDGET_COST:.2f}" if LLM_DAILY_BUDGET_COST is not None else ""
+                    print(f"   今日LLM累计成本: ¥{budget.ledger.day_cost():.2f}{daily_limit}")
+                print(f"   峰值内存: {peak_rss_mb():.1f} MB")
+                if self.profiler is not None:
+                    self.profiler.write_batch_report(summary_file)
+                print("="*80 + "\n")
+            
+            return results
+    
+    def _prioritize(self, stock_codes: List[str]) -> List[StockTask]:
+        """按持仓、隔夜新闻、上一交易日涨跌幅排定分析顺序"""
+        try:
+            quotes = self.tushare_client.get_quote_table(stock_codes)
+        except Exception as e:
+            print(f"⚠️ 获取行情失败，不按涨跌幅排序: {e}")
+            quotes = None
+        tasks = prioritize_stocks(stock_codes, held=HELD_POSITIONS, quotes=quotes,
+                                  news=self.tushare_client.get_overnight_news(),
+                                  gap_threshold=PRIORITY_GAP_THRESHOLD,
+                                  news_min_mentions=PRIORITY_NEWS_MIN_MENTIONS)
+        urgent = [t for t in tasks if t.priority > 0]
+        if urgent:
+            print("🚩 优先分析: " + "；".join(f"{t.ts_code}（{'、'.join(t.reasons)}）" for t in urgent))
+        return tasks
+    
+    def _run_in_process(self, tasks: List[StockTask], analysis_mode: str,
+                        batch_checkpoint: BatchCheckpoint, sector_contexts: Dict[str, Dict[str, Any]],
+                        portfolio: Optional[PortfolioRisk], planner: DeadlinePlanner,
+                        workers: int, budget: RunBudget) -> List[AnalysisResult]:
+        """按优先级在有界线程池中分析；每只股票开始时按剩余工作量和截止时间选择分析深度"""
+        pending = list(tasks)
+        finished: Dict[str, AnalysisResult] = {}
+        depths: Dict[str, str] = {}
+        lock = threading.Lock()
+        
+        if planner.deadline is not None:
+            print(f"⏰ 截止时间 {planner.deadline:%H:%M}，并发 {workers}，"
+                  f"单只预计 {planner.estimate('full'):.0f} 秒")
+        
+        def work():
+            while True:
+                stop_reason = budget.hard_limit()
+                with lock:
+                    if stop_reason and pending:
+                        print(f"\n⛔ {stop_reason}，停止剩余 {len(pending)} 只股票: " +
+                              "，".join(t.ts_code for t in pending))
+                        pending.clear()
+                    if not pending:
+                        return
+                    remaining = len(pending)
+                    task = pending.pop(0)
+                    index = len(tasks) - remaining + 1
+                over_budget = budget.exhausted
+                choose = lambda: 'screening' if over_budget else planner.choose_depth(remaining)
+                # 降级决策取决于当时的时钟，录制/回放时一并记入卡带
+                depth = (self.cassette.call('depth', {'ts_code': task.ts_code}, choose)
+                         if self.cassette is not None else choose())
+                depths[task.ts_code] = depth
+                planner.start(task.ts_code, depth)
+                
+                print(f"\n{'='*80}")
+                print(f"进度: [{index}/{len(tasks)}] 分析 {task.ts_code}" +
+                      (f"（{'、'.join(task.reasons)}）" if task.reasons else "") +
+                      (f" [{DEPTH_LABELS[depth]}]" if depth != 'full' else ""))
+                print('='*80)
+                if over_budget:
+                    print(f"💸 {over_budget}，本只仅做筛查")
+                
+                checkpoint = batch_checkpoint.stock(task.ts_code)
+                resumed = bool(checkpoint.stages)
+                completed = False
+                try:
+                    result = self.analyze_stock(task.ts_code, analysis_mode=analysis_mode,
+                                                checkpoint=checkpoint,
+                                                sector_context=sector_contexts.get(task.ts_code),
+                                                portfolio_risk=portfolio.summary(task.ts_code) if portfolio else None,
+                                                debate_rounds=planner.debate_rounds(depth))
+                    completed = True
+                    # 报告已落盘，汇总只需要决策字段，释放行情大数组
+                    result.stock_data.release_bars()
+                    with lock:
+                        finished[task.ts_code] = result
+                except BudgetExceeded as e:
+                    print(f"\n⛔ 分析 {task.ts_code} 中止: {e}（已完成阶段保留在检查点，可 --resume 续跑）")
+                except Exception as e:
+                    print(f"\n❌ 分析 {task.ts_code} 失败: {e}")
+                    import traceback
+                    traceback.print_exc()
+                finally:
+                    planner.finish(task.ts_code, record=completed and not resumed)
+        
+        if workers <= 1:
+            work()
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+                # 各线程沿用本次运行的 budget_scope
+                for future in [executor.submit(contextvars.copy_context().run, work)
+                               for _ in range(min(workers, len(tasks)))]:
+                    future.result()
+        
+        degraded = {code: depth for code, depth in depths.items() if depth != 'full'}
+        if degraded:
+            print(f"\n⚠️ 受截止时间或LLM预算限制，{len(degraded)} 只股票降级分析: " +
+                  "，".join(f"{code} {DEPTH_LABELS[depth]}" for code, depth in degraded.items()))
+        
+        return [finished[t.ts_code] for t in tasks if t.ts_code in finished]
+    
+    def _run_via_queue(self, tasks: List[StockTask], analysis_mode: str,
+                       batch_checkpoint: BatchCheckpoint, sector_contexts: Dict[str, Dict[str, Any]],
+                       portfolio: Optional[PortfolioRisk],
+                       deadline: Optional[datetime] = None) -> List[AnalysisResult]:
+        """按股票入队（高优先级先被领取），本进程也作为工作进程参与，直到本次运行的任务全部结束
+
+        截止时间随检查点下发，各工作进程领取任务时按队列中剩余和执行中的任务数选择分析深度
+        """
+        stock_codes = [t.ts_code for t in tasks]
+        from data.job_queue import JobQueue
+        from worker import QueueWorker
+        
+        # 行业背景、组合风险和截止时间随检查点下发，其他工作进程无需重复计算
+        for stock_code in stock_codes:
+            checkpoint = batch_checkpoint.stock(stock_code)
+            if not checkpoint.has('context'):
+                checkpoint.save('context', {
+                    'sector_context': sector_contexts.get(stock_code),
+                    'portfolio_risk': portfolio.summary(stock_code) if portfolio else None,
+                    'deadline': deadline.isoformat() if deadline is not None else None,
+                })
+        
+        queue = JobQueue()
+        added = queue.enqueue(batch_checkpoint.run_id, stock_codes, analysis_mode,
+                              priorities={t.ts_code: t.priority for t in tasks})
+        print(f"📮 已入队 {added} 只股票（队列: {queue.path}），"
+              f"可在其他终端或机器运行 python worker.py 协助处理")
+        
+        QueueWorker(self, queue).run(run_id=batch_checkpoint.run_id, until_drained=True)
+        
+        for job in queue.failed_jobs(batch_checkpoint.run_id):
+            print(f"❌ {job['ts_code']} 分析失败（尝试 {job['attempts']} 次）: {job['last_error']}")
         
+        results = []
+        for stock_code in stock_codes:
+            checkpoint = batch_checkpoint.stock(stock_code)
+            if checkpoint.completed:
+                result = AnalysisResult.from_stages(checkpoint.stages, analysis_mode)
+                result.stock_data.release_bars()
+                results.append(result)
         return results
     
-    def quick_view(self, stock_code: str):
-        """快速查看（只获取数据，不做深度分析）"""
-        print(f"\n📊 快速查看: {stock_code}")
-        stock_data = self.tushare_client.get_comprehensive_data(stock_code)
+    def _analyze_sectors(self, stock_codes: List[str], basic_infos: Dict[str, Dict[str, Any]],
+                         batch_checkpoint: BatchCheckpoint) -> Dict[str, Dict[str, Any]]:
+        """按行业分组，每个行业只做一次行业背景分析，返回 股票代码 → 行业背景"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for code in stock_codes:
+            info = basic_infos.get(code)
+            if info and info.get('industry'):
+                groups.setdefault(info['industry'], []).append(info)
+        groups = {k: v for k, v in groups.items() if len(v) >= SECTOR_MIN_MEMBERS}
+        if not groups:
+            return {}
+        
+        print("\n" + "="*80)
+        print(f"🏭 行业背景分析: {len(groups)} 个行业（" +
+              "，".join(f"{k} {len(v)}只" for k, v in groups.items()) + "）")
+        print("="*80)
+        
+        sectors = batch_checkpoint.load_sectors()
+        pending = [industry for industry in groups if industry not in sectors]
+        if pending:
+            news = self.tushare_client.get_news(stock_codes[0]) or []
+            for industry in pending:
+                try:
+                    sectors[industry] = self.sector_analyst.analyze(industry, groups[industry], news)
+                except Exception as e:
+                    print(f"⚠️ 行业 {industry} 分析失败，该行业股票不使用行业背景: {e}")
+                    continue
+                batch_checkpoint.save_sectors(sectors)
+        
+        return {
+            info['ts_code']: sectors[industry]
+            for industry, members in groups.items() if industry in sectors
+            for info in members
+        }
+    
+    def _portfolio_risk(self, stock_codes: List[str],
+                        basic_infos: Dict[str, Dict[str, Any]]) -> Optional[PortfolioRisk]:
+        """一次拉取股票池全部日线，向量化计算组合风险"""
+        if len(stock_codes) < 2:
+            return None
+        
+        daily = self.tushare_client.get_daily_batch(stock_codes, days=PORTFOLIO_RISK_DAYS)
+        benchmark = self.tushare_client.get_index_daily(PORTFOLIO_BENCHMARK, days=PORTFOLIO_RISK_DAYS)
+        names = {code: info.get('name', '') for code, info in basic_infos.items()}
+        try:
+            portfolio = PortfolioRisk.from_daily(daily, benchmark, names, vol_window=PORTFOLIO_VOL_WINDOW)
+        except Exception as e:
+            print(f"⚠️ 组合风险计算失败，风险评估将不含组合视角: {e}")
+            return None
+        
+        if portfolio is None:
+            print("⚠️ 日线数据不足，跳过组合风险计算")
+        else:
+            print(f"📐 组合风险: {len(portfolio.codes)} 只 × {len(portfolio.dates)} 日，"
+                  f"等权年化波动 {portfolio.portfolio_volatility:.1%}，"
+                  f"平均相关系数 {portfolio.average_correlation:.2f}")
+        return portfolio
+    
+    def scan_market(self, top_n: int = SCAN_TOP_N, industries: Optional[List[str]] = None) -> List[str]:
+        """全市场扫描，返回按综合得分排序的股票代码"""
+        print("\n" + "="*80)
+        print("🔎 全市场扫描" + (f"（行业: {'、'.join(industries)}）" if industries else ""))
+        print("="*80)
+        
+        scanner = MarketScanner(
+            self.tushare_client.pro, self.tushare_client.calendar,
+            momentum_days=SCAN_MOMENTUM_DAYS,
+            min_market_cap=SCAN_MIN_MARKET_CAP,
+            min_list_days=SCAN_MIN_LIST_DAYS
+        )
+        ranked = scanner.scan(top_n=top_n, industries=industries)
+        
+        for i, row in enumerate(ranked.itertuples(), 1):
+            print(f"{i:>3}. {row.ts_code} {row.name:<8} {row.industry:<6} "
+                  f"得分 {row.score:.2f} | {SCAN_MOMENTUM_DAYS}日涨幅 {row.momentum:+.1%} | "
+                  f"量比 {row.volume_ratio} | PE {row.pe_ttm} (行业分位 {row.pe_pct_in_industry:.0%})")
+        
+        return ranked['ts_code'].tolist() if not ranked.empty else []
+    
+    def quick_view(self, stock_codes: Union[str, List[str]]):
+        """快速查看（只获取股票列表和最近一根日线，不初始化LLM和智能体）"""
+        if isinstance(stock_codes, str):
+            stock_codes = [stock_codes]
         
-        basic_info = stock_data.get('basic_info', {})
-        realtime_quote = stock_data.get('realtime_quote', {})
+        start = time.perf_counter()
+        print(f"\n📊 快速查看: {len(stock_codes)} 只股票")
+        table = self.tushare_client.get_quote_table(stock_codes)
+        elapsed = time.perf_counter() - start
         
-        print("\n" + "="*60)
-        print(f"股票名称: {basic_info.get('name', 'N/A')}")
-        print(f"股票代码: {stock_code}")
-        print(f"所属行业: {basic_info.get('industry', 'N/A')}")
-        print(f"当前价格: ¥{realtime_quote.get('close', 'N/A')}")
-        print(f"涨跌幅: {realtime_quote.get('pct_chg', 'N/A')}%")
-        print(f"成交量: {realtime_quote.get('vol', 'N/A')} 手")
-        print("="*60 + "\n")
+        print("\n" + "="*80)
+        print(f"{'代码':<11}{'名称':<8}{'行业':<8}{'日期':<10}{'收盘价':>9}{'涨跌幅':>9}{'成交量(手)':>14}")
+        print("-"*80)
+        for row in table.to_dict('records'):
+            def cell(key, fmt='{}'):
+                value = row.get(key)
+                return 'N/A' if value is None or value != value else fmt.format(value)
+            print(f"{row['ts_code']:<11}{cell('name'):<8}{cell('industry'):<8}{cell('trade_date'):<10}"
+                  f"{cell('close', '{:.2f}'):>9}{cell('pct_chg', '{:+.2f}%'):>9}{cell('vol', '{:,.0f}'):>14}")
+        print("="*80)
+        print(f"⏱️ 启动 {start - _PROCESS_START:.2f}秒，查询 {elapsed:.2f}秒\n")
         
-        return stock_data
+        return table
+
+
+def peak_rss_mb() -> float:
+    """当前进程峰值常驻内存（MB），用于对比批量分析的内存占用"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def print_usage(day: Optional[str] = None):
+    """按智能体、股票、运行汇总某日LLM用量（读取用量台账）"""
+    day = day or datetime.now().strftime('%Y-%m-%d')
+    ledger = UsageLedger(LLM_LEDGER_DIR)
+    print(f"\n🧾 LLM用量 {day}（台账: {LLM_LEDGER_DIR}）")
+    for by, title in (('agent', '智能体'), ('stock', '股票'), ('run', '运行')):
+        rollup = ledger.rollup(day, by=by)
+        if not rollup:
+            continue
+        print("\n" + "="*80)
+        print(f"{'按' + title:<16}{'调用':>6}{'输入tokens':>12}{'缓存命中':>10}{'输出tokens':>12}{'成本(元)':>10}{'耗时(秒)':>10}")
+        print("-"*80)
+        for key, stats in sorted(rollup.items(), key=lambda kv: -kv[1]['cost']):
+            print(f"{key:<18}{stats['calls']:>6}{stats['prompt_tokens']:>12}{stats['cached_tokens']:>12}"
+                  f"{stats['completion_tokens']:>12}{stats['cost']:>12.3f}{stats['seconds']:>10.0f}")
+    total = sum(stats['cost'] for stats in ledger.rollup(day).values())
+    limit = f" / ¥{LLM_DAILY_BUDGET_COST:.2f}" if LLM_DAILY_BUDGET_COST is not None else ""
+    print("="*80)
+    print(f"合计 ¥{total:.2f}{limit}\n")
 
 
 def main():
@@ -240,24 +791,70 @@ def main():
   # 批量分析
   python main.py --batch 600519.SH 000858.SZ 601318.SH
   
-  # 快速查看
+  # 快速查看（不带代码时查看整个股票池）
   python main.py --quick 600519.SH
+  python main.py --quick
   
   # 分析股票池中的所有股票
   python main.py --watchlist
+  
+  # 扫描全市场，分析得分最高的20只
+  python main.py --scan --top 20
+  
+  # 续跑中断的批量分析
+  python main.py --resume 20260615_073000_pre_market
+  
+  # 通过任务队列分发，其他终端/机器运行 python worker.py 协助处理
+  python main.py --watchlist --queue
+  
+  # 录制一次运行的全部 Tushare/LLM 调用，之后离线回放（不访问网络）
+  python main.py --watchlist --record cassettes/watchlist.jsonl.gz
+  python main.py --watchlist --replay cassettes/watchlist.jsonl.gz
+  
+  # 剖析各阶段的CPU、等待时间和内存分配（结果写在分析报告旁）
+  python main.py --watchlist --profile
+  
+  # 实时看板：逐股票阶段进度、外部调用延迟、缓存命中率和预计剩余时间，详细输出写入 logs/runs/
+  python main.py --watchlist --dashboard
         """
     )
     
     parser.add_argument('--stock', '-s', type=str, help='分析单只股票（例如: 600519.SH）')
     parser.add_argument('--batch', '-b', nargs='+', help='批量分析多只股票')
     parser.add_argument('--watchlist', '-w', action='store_true', help='分析配置的股票池')
-    parser.add_argument('--quick', '-q', type=str, help='快速查看股票信息')
+    parser.add_argument('--quick', '-q', nargs='*', metavar='CODE',
+                        help='快速查看行情（不带代码时查看整个股票池）')
+    parser.add_argument('--scan', action='store_true', help='扫描全市场生成股票池并批量分析')
+    parser.add_argument('--top', type=int, default=SCAN_TOP_N, help=f'扫描后分析的股票数（默认{SCAN_TOP_N}）')
+    parser.add_argument('--industry', nargs='+', help='扫描时只保留指定行业')
+    parser.add_argument('--resume', '-r', type=str, metavar='RUN_ID', help='续跑中断的批量分析')
+    parser.add_argument('--usage', nargs='?', const='', metavar='YYYY-MM-DD',
+                        help='查看某日LLM用量汇总（默认今天）')
+    parser.add_argument('--queue', action='store_true', default=BATCH_USE_QUEUE,
+                        help='批量分析通过持久化任务队列分发（配合 worker.py 多进程/多机执行）')
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument('--record', metavar='CASSETTE',
+                                help='录制本次运行的 Tushare 和 LLM 调用到卡带文件（.jsonl.gz）')
+    cassette_group.add_argument('--replay', metavar='CASSETTE',
+                                help='从卡带文件回放 Tushare 和 LLM 调用，不访问网络')
+    parser.add_argument('--profile', action='store_true',
+                        help='剖析各阶段的CPU/等待时间和内存分配，在报告旁写出火焰图数据和剖析报告')
+    parser.add_argument('--dashboard', action='store_true',
+                        help='显示实时看板，详细输出改写入 logs/runs/ 下的结构化日志')
+    parser.add_argument('--mode', '-m', choices=list(ANALYSIS_MODES),
+                        default=os.getenv('ANALYSIS_MODE', 'standard'),
+                        help='分析模式（默认读取 ANALYSIS_MODE 环境变量）')
     
     args = parser.parse_args()
     
-    # 验证配置
+    if args.usage is not None:
+        print_usage(args.usage or None)
+        return
+    
+    # 验证配置（回放不需要密钥）
     try:
-        validate_config()
+        if not args.replay:
+            validate_config()
     except ValueError as e:
         print(f"\n❌ 配置错误: {e}")
         print("\n请检查以下配置:")
@@ -266,26 +863,80 @@ def main():
         print("  3. 设置 TUSHARE_TOKEN")
         return
     
-    # 创建分析系统
-    system = StockAnalysisSystem()
+    cassette = None
+    if args.record or args.replay:
+        from data.cassette import Cassette
+        cassette = Cassette(args.record or args.replay, 'record' if args.record else 'replay')
+        if args.queue:
+            # 其他工作进程的调用不经过本进程的卡带
+            print("⚠️ 录制/回放时不使用任务队列，改为本进程内分析")
+            args.queue = False
+    
+    profiler = None
+    if args.profile:
+        from data.profiler import StageProfiler
+        profiler = StageProfiler()
+    
+    dashboard = None
+    if args.dashboard:
+        if args.stock or args.batch or args.watchlist or args.scan or args.resume:
+            from dashboard import Dashboard
+            dashboard = Dashboard()
+        else:
+            print("⚠️ 看板只用于分析命令，快速查看和交互模式下忽略 --dashboard")
     
-    # 执行操作
-    if args.quick:
+    # 创建分析系统
+    system = StockAnalysisSystem(cassette=cassette, profiler=profiler, dashboard=dashboard)
+    if profiler is not None:
+        # 先加载全部模块再开始追踪，导入开销不计入各阶段，内存快照也更小
+        system.warm_up()
+        profiler.start()
+    if dashboard is not None:
+        dashboard.start(system)
+    try:
+        run_command(system, args)
+    finally:
+        if dashboard is not None:
+            dashboard.stop()
+        if cassette is not None:
+            cassette.close()
+        if profiler is not None:
+            profiler.stop()
+
+
+def run_command(system: StockAnalysisSystem, args):
+    """执行命令行指定的操作"""
+    if args.quick is not None:
         # 快速查看
-        system.quick_view(args.quick)
+        from config.config import STOCK_WATCHLIST
+        system.quick_view(args.quick or STOCK_WATCHLIST)
+    
+    elif args.resume:
+        # 断点续跑（股票列表和分析模式从检查点恢复）
+        try:
+            system.batch_analyze([], resume_run_id=args.resume, use_queue=args.queue)
+        except ValueError as e:
+            print(f"\n❌ 无法续跑: {e}（检查点目录: {CHECKPOINT_DIR}）")
+            sys.exit(1)
+    
+    elif args.scan:
+        # 全市场扫描生成股票池
+        codes = system.scan_market(top_n=args.top, industries=args.industry)
+        if codes:
+            system.batch_analyze(codes, analysis_mode=args.mode, use_queue=args.queue)
     
     elif args.stock:
         # 分析单只股票
-        system.analyze_stock(args.stock)
+        system.analyze_stock(args.stock, analysis_mode=args.mode)
     
     elif args.batch:
         # 批量分析
-        system.batch_analyze(args.batch)
+        system.batch_analyze(args.batch, analysis_mode=args.mode, use_queue=args.queue)
     
     elif args.watchlist:
         # 分析股票池
         from config.config import STOCK_WATCHLIST
-        system.batch_analyze(STOCK_WATCHLIST)
+        system.batch_analyze(STOCK_WATCHLIST, analysis_mode=args.mode, use_queue=args.queue)
     
     else:
         # 交互模式
@@ -0,0 +1,190 @@
+"""
+盘中实时监控
+增量轮询股票池分钟线，价格或成交量异动时触发针对性重新分析
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+from config.config import (
+    STOCK_WATCHLIST,
+    MONITOR_POLL_SECONDS,
+    MONITOR_WINDOW_MINUTES,
+    MONITOR_PRICE_THRESHOLD,
+    MONITOR_VOLUME_MULTIPLIER,
+    MONITOR_COOLDOWN_MINUTES,
+    validate_config
+)
+
+
+class MinuteWindow:
+    """单只股票的分钟线滚动窗口（环形缓冲区）"""
+
+    __slots__ = ('closes', 'volumes', 'last_time')
+
+    def __init__(self, size: int):
+        self.closes = deque(maxlen=size)
+        self.volumes = deque(maxlen=size)
+        self.last_time: Optional[str] = None
+
+    def extend(self, bars: pd.DataFrame) -> int:
+        """追加新K线，返回新增根数"""
+        for trade_time, close, vol in zip(bars['trade_time'].astype(str), bars['close'], bars['vol']):
+            self.closes.append(float(close))
+            self.volumes.append(float(vol))
+            self.last_time = trade_time
+        return len(bars)
+
+    def price_change_pct(self) -> float:
+        """窗口内涨跌幅(%)"""
+        if len(self.closes) < 2 or not self.closes[0]:
+            return 0.0
+        return (self.closes[-1] / self.closes[0] - 1) * 100
+
+    def volume_ratio(self) -> float:
+        """最新一分钟成交量 / 窗口内此前均量"""
+        if len(self.volumes) < 2:
+            return 0.0
+        history = sum(self.volumes) - self.volumes[-1]
+        avg = history / (len(self.volumes) - 1)
+        return self.volumes[-1] / avg if avg else 0.0
+
+
+class IntradayMonitor:
+    """盘中监控器"""
+
+    def __init__(self, analysis_system, watchlist: List[str] = None,
+                 poll_seconds: int = MONITOR_POLL_SECONDS,
+                 window_minutes: int = MONITOR_WINDOW_MINUTES,
+                 price_threshold: float = MONITOR_PRICE_THRESHOLD,
+                 volume_multiplier: float = MONITOR_VOLUME_MULTIPLIER,
+                 cooldown_minutes: int = MONITOR_COOLDOWN_MINUTES):
+        self.system = analysis_system
+        self.tushare = analysis_system.tushare_client
+        self.calendar = self.tushare.calendar
+        self.watchlist = watchlist or STOCK_WATCHLIST
+
+        self.poll_seconds = poll_seconds
+        self.window_minutes = window_minutes
+        self.price_threshold = price_threshold
+        self.volume_multiplier = volume_multiplier
+        self.cooldown = timedelta(minutes=cooldown_minutes)
+
+        self.windows: Dict[str, MinuteWindow] = {
+            code: MinuteWindow(window_minutes) for code in self.watchlist
+        }
+        self.last_triggered: Dict[str, datetime] = {}
+
+        # 重新分析放到后台线程，不阻塞行情轮询
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reanalysis')
+        self._pending = set()
+
+    def poll_once(self) -> List[str]:
+        """轮询一次整个股票池，返回本轮触发重新分析的股票"""
+        triggered = []
+        for ts_code in self.watchlist:
+            window = self.windows[ts_code]
+            if window.last_time and window.last_time[:10] != datetime.now().strftime('%Y-%m-%d'):
+                # 跨日重置窗口
+                self.windows[ts_code] = window = MinuteWindow(self.window_minutes)
+
+            bars = self.tushare.get_minute_bars_since(ts_code, window.last_time,
+                                                      lookback_minutes=self.window_minutes)
+            if bars is None:
+                continue
+            window.extend(bars)
+
+            reason = self._check(window)
+            if reason and self._trigger(ts_code, reason):
+                triggered.append(ts_code)
+        return triggered
+
+    def _check(self, window: MinuteWindow) -> Optional[str]:
+        """检查阈值，返回触发原因"""
+        change = window.price_change_pct()
+        if abs(change) >= self.price_threshold:
+            return f"{self.window_minutes}分钟涨跌幅 {change:+.2f}%"
+        ratio = window.volume_ratio()
+        if ratio >= self.volume_multiplier:
+            return f"分钟成交量放大 {ratio:.1f} 倍"
+        return None
+
+    def _trigger(self, ts_code: str, reason: str) -> bool:
+        now = datetime.now()
+        last = self.last_triggered.get(ts_code)
+        if (last and now - last < self.cooldown) or ts_code in self._pending:
+            return False
+
+        self.last_triggered[ts_code] = now
+        self._pending.add(ts_code)
+        print(f"\n⚡ {ts_code} 触发异动: {reason}，提交重新分析")
+
+        future = self.executor.submit(self.system.analyze_stock, ts_code, analysis_mode='intraday',
+                                      run_label=f"monitor_{now:%Y%m%d_%H%M%S}_{ts_code}")
+        future.add_done_callback(lambda f: self._done(ts_code, f))
+        return True
+
+    def _done(self, ts_code: str, future):
+        self._pending.discard(ts_code)
+        if future.exception():
+            print(f"❌ {ts_code} 重新分析失败: {future.exception()}")
+
+    def run(self):
+        """持续监控，非交易时段休眠到下一次开盘"""
+        print(f"\n👁️ 盘中监控已启动: {len(self.watchlist)} 只股票，每 {self.poll_seconds} 秒轮询")
+        print(f"   触发阈值: 涨跌幅 ±{self.price_threshold}% / 成交量 {self.volume_multiplier} 倍")
+        print("💡 提示: 按 Ctrl+C 停止监控\n")
+
+        try:
+            while True:
+                now = datetime.now()
+                session_start = self.calendar.next_session_start(now)
+                if session_start > now:
+                    print(f"💤 非交易时段，休眠至 {session_start.strftime('%Y-%m-%d %H:%M')}")
+                    time.sleep((session_start - now).total_seconds())
+                    continue
+
+                started = time.monotonic()
+                self.poll_once()
+                time.sleep(max(0.0, self.poll_seconds - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            print("\n\n⏹️ 盘中监控已停止")
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    """主函数"""
+    import argparse
+    from main import StockAnalysisSystem
+
+    parser = argparse.ArgumentParser(description='盘中实时监控')
+    parser.add_argument('--stocks', nargs='+', help='监控的股票（默认为股票池）')
+    parser.add_argument('--price-threshold', type=float, default=MONITOR_PRICE_THRESHOLD,
+                        help='触发重新分析的窗口涨跌幅(%%)')
+    parser.add_argument('--volume-multiplier', type=float, default=MONITOR_VOLUME_MULTIPLIER,
+                        help='触发重新分析的成交量放大倍数')
+
+    args = parser.parse_args()
+
+    validate_config()
+    monitor = IntradayMonitor(
+        StockAnalysisSystem(),
+        watchlist=args.stocks,
+        price_threshold=args.price_threshold,
+        volume_multiplier=args.volume_multiplier
+    )
+    monitor.run()
+
+
+if __name__ == "__main__":
+    main()
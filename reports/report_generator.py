@@ -3,10 +3,12 @@
 生成专业的投资分析报告
 """
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List
 import json
 import os
 import pytz
+from data.models import AnalysisResult
+from config.config import ANALYSIS_MODES
 
 class ReportGenerator:
     """报告生成器"""
@@ -21,7 +23,7 @@ class ReportGenerator:
         """获取北京时间"""
         return datetime.now(self.beijing_tz)
         
-    def generate_report(self, stock_code: str, analysis_result: Dict[str, Any]) -> str:
+    def generate_report(self, stock_code: str, analysis_result: AnalysisResult) -> str:
         """生成完整的投资分析报告"""
         print(f"\n📄 正在生成投资报告...")
         
@@ -42,14 +44,16 @@ class ReportGenerator:
         filename = os.path.join(date_dir, f"analysis_{timestamp}.md")
         json_filename = os.path.join(date_dir, f"analysis_{timestamp}.json")
         
-        report_content = self._format_markdown_report(stock_code, analysis_result)
+        # 仅在落盘时展开为dict（行情DataFrame在此转换为记录列表）
+        result_dict = analysis_result.to_dict()
+        report_content = self._format_markdown_report(stock_code, result_dict)
         
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(report_content)
         
         # 同时保存JSON格式
         with open(json_filename, 'w', encoding='utf-8') as f:
-            json.dump(analysis_result, f, ensure_ascii=False, indent=2)
+            json.dump(result_dict, f, ensure_ascii=False, indent=2, default=str)
         
         print(f"✅ 报告已生成:")
         print(f"   📋 Markdown: {filename}")
@@ -76,8 +80,7 @@ class ReportGenerator:
         
         # 获取分析模式
         analysis_mode = data.get('analysis_mode', 'standard')
-        mode_emoji = "🌅" if analysis_mode == "pre_market" else "🕐" if analysis_mode == "midday" else "🌆" if analysis_mode == "post_market" else "📊"
-        mode_text = "开盘前分析" if analysis_mode == "pre_market" else "中午分析" if analysis_mode == "midday" else "收盘后分析" if analysis_mode == "post_market" else "标准分析"
+        mode_emoji, mode_text = ANALYSIS_MODES.get(analysis_mode, ANALYSIS_MODES['standard'])
         
         report = f"""# {mode_emoji} 股票投资分析报告 - {mode_text}
 
@@ -233,6 +236,8 @@ class ReportGenerator:
 
 **信心等级**: {debate.get('debate_summary', {}).get('confidence_level', 'N/A')}/10
 
+**辩论轮次**: {debate.get('rounds_completed', 'N/A')}{'（提前结束: ' + debate['stop_reason'] + '）' if debate.get('stop_reason') else ''}
+
 ---
 
 ## ⚠️ 风险提示
@@ -310,7 +315,7 @@ class ReportGenerator:
             return "- 无"
         return '\n'.join([f"- {item}" for item in items])
     
-    def generate_summary_report(self, results: list) -> str:
+    def generate_summary_report(self, results: List[AnalysisResult], analysis_mode: str = 'standard') -> str:
         """生成批量分析汇总报告"""
         print(f"\n📊 正在生成汇总报告...")
         
@@ -320,10 +325,8 @@ class ReportGenerator:
         timestamp = beijing_time.strftime("%H%M%S")
         filename = os.path.join(self.output_dir, f"summary_{date_str}_{timestamp}.md")
         
-        # 判断分析类型
-        analysis_mode = os.getenv('ANALYSIS_MODE', 'standard')
-        mode_emoji = "🌅" if analysis_mode == "pre_market" else "🕐" if analysis_mode == "midday" else "🌆" if analysis_mode == "post_market" else "📊"
-        mode_text = "开盘前分析" if analysis_mode == "pre_market" else "中午分析" if analysis_mode == "midday" else "收盘后分析" if analysis_mode == "post_market" else "标准分析"
+        # 分析类型
+        mode_emoji, mode_text = ANALYSIS_MODES.get(analysis_mode, ANALYSIS_MODES['standard'])
         
         content = f"""# {mode_emoji} 批量股票分析汇总报告 - {mode_text}
 
@@ -340,17 +343,15 @@ class ReportGenerator:
 """
         
         for result in results:
-            stock_data = result.get('stock_data', {}) or {}
-            basic_info = stock_data.get('basic_info', {}) or {}
-            decision = result.get('decision', {}) or {}
-            risk = result.get('risk_assessment', {}) or {}
+            decision = result.decision or {}
+            risk = result.risk_assessment or {}
             
-            ts_code = stock_data.get('ts_code', 'N/A')
-            name = basic_info.get('name', 'N/A')
+            ts_code = result.ts_code
+            name = result.stock_data.name
             action = decision.get('action', 'N/A')
             confidence = decision.get('confidence', 'N/A')
             risk_level = risk.get('overall_risk_level', 'N/A')
-            report_file = result.get('report_file', 'N/A')
+            report_file = result.report_file or 'N/A'
             
             # 修复报告链接路径 - 移除多余的reports/前缀
             if report_file.startswith('reports/'):
@@ -367,9 +368,9 @@ class ReportGenerator:
 
 """
         # 统计各类建议数量
-        buy_count = sum(1 for r in results if (r.get('decision', {}) or {}).get('action') == '买入')
-        hold_count = sum(1 for r in results if (r.get('decision', {}) or {}).get('action') == '持有')
-        sell_count = sum(1 for r in results if (r.get('decision', {}) or {}).get('action') == '卖出')
+        buy_count = sum(1 for r in results if (r.decision or {}).get('action') == '买入')
+        hold_count = sum(1 for r in results if (r.decision or {}).get('action') == '持有')
+        sell_count = sum(1 for r in results if (r.decision or {}).get('action') == '卖出')
         
         content += f"""- 🟢 买入: {buy_count} 只
 - 🟡 持有: {hold_count} 只
@@ -390,6 +391,44 @@ class ReportGenerator:
         
         return filename
     
+    def list_reports(self, stock_code: str = None, limit: int = 50) -> List[Dict[str, str]]:
+        """按时间倒序列出个股报告（stock_code 为空时列出全部股票）"""
+        codes = [stock_code.split('.')[0]] if stock_code else [
+            item for item in os.listdir(self.output_dir)
+            if os.path.isdir(os.path.join(self.output_dir, item)) and not item.startswith('.')
+        ]
+        reports = []
+        for code in codes:
+            stock_dir = os.path.join(self.output_dir, code)
+            if not os.path.isdir(stock_dir):
+                continue
+            for date_str in os.listdir(stock_dir):
+                date_dir = os.path.join(stock_dir, date_str)
+                if not os.path.isdir(date_dir):
+                    continue
+                for name in os.listdir(date_dir):
+                    if name.startswith('analysis_') and name.endswith('.json'):
+                        reports.append({
+                            'stock_code': code,
+                            'date': date_str,
+                            'time': name[len('analysis_'):-len('.json')],
+                            'json': os.path.join(date_dir, name),
+                            'markdown': os.path.join(date_dir, name[:-len('.json')] + '.md'),
+                        })
+        reports.sort(key=lambda r: (r['date'], r['time']), reverse=True)
+        return reports[:limit]
+    
+    def latest_report(self, stock_code: str) -> Dict[str, Any]:
+        """个股最新一份报告的 JSON 内容，没有报告时返回空 dict"""
+        reports = self.list_reports(stock_code, limit=1)
+        if not reports:
+            return {}
+        with open(reports[0]['json'], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # JSON 在报告路径确定前写入，report_file 需要补上
+        data['report_file'] = data.get('report_file') or reports[0]['markdown']
+        return data
+    
     def _generate_index_file(self):
         """生成reports目录索引文件"""
         index_file = os.path.join(self.output_dir, "README.md")
@@ -441,7 +480,9 @@ reports/
                 
                 for date in dates[:5]:  # 只显示最近5天
                     date_path = os.path.join(item_path, date)
-                    reports = [f for f in os.listdir(date_path) if f.endswith('.md')]
+                    # 性能剖析报告（*.profile.md）不计入
+                    reports = [f for f in os.listdir(date_path)
+                               if f.endswith('.md') and not f.endswith('.profile.md')]
                     
                     if reports:
                         # 取最新的报告
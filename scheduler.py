@@ -1,11 +1,13 @@
 """
 定时任务调度器
-每天早上8点自动分析股票池中的股票并推送报告
+按开盘前、中午、收盘后多个时段自动分析股票池中的股票并推送报告
 """
 import schedule
 import time
-from datetime import datetime
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from typing import List, Tuple
 import sys
 import os
 
@@ -13,8 +15,11 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config.config import (
-    STOCK_WATCHLIST, 
-    DAILY_REPORT_TIME, 
+    STOCK_WATCHLIST,
+    SCHEDULE_JOBS,
+    SCHEDULER_WORKERS,
+    BATCH_USE_QUEUE,
+    ANALYSIS_MODES,
     validate_config,
     DEEPSEEK_API_KEY,
     TUSHARE_TOKEN
@@ -23,114 +28,198 @@ from main import StockAnalysisSystem
 
 class DailyScheduler:
     """每日定时任务调度器"""
-    
-    def __init__(self):
-        """初始化调度器"""
+
+    def __init__(self, jobs: List[Tuple[str, str]] = None, max_workers: int = SCHEDULER_WORKERS,
+                 analysis_system: StockAnalysisSystem = None, use_queue: bool = BATCH_USE_QUEUE,
+                 profile: bool = False, dashboard: bool = False):
+        """初始化调度器
+
+        analysis_system 可由常驻服务传入，与临时分析任务共享同一套客户端和缓存；
+        use_queue=True 时每次定时任务的股票通过持久化任务队列分发给 worker.py 工作进程；
+        profile=True 时剖析各阶段的CPU/等待时间和内存分配（仅对调度器自建的分析系统生效）；
+        dashboard=True 时显示实时看板，详细输出改写入结构化日志（同样仅对自建的分析系统生效）
+        """
         print("🚀 初始化定时任务调度器...")
-        
+
         # 验证配置
         validate_config()
-        
+
         # 创建分析系统
-        self.analysis_system = StockAnalysisSystem(
+        profiler = None
+        if profile and analysis_system is None:
+            from data.profiler import StageProfiler
+            profiler = StageProfiler()
+        self.dashboard = None
+        if dashboard and analysis_system is None:
+            from dashboard import Dashboard
+            self.dashboard = Dashboard()
+        self.analysis_system = analysis_system or StockAnalysisSystem(
             deepseek_key=DEEPSEEK_API_KEY,
-            tushare_token=TUSHARE_TOKEN
+            tushare_token=TUSHARE_TOKEN,
+            profiler=profiler,
+            dashboard=self.dashboard
         )
-        
+        if profiler is not None:
+            self.analysis_system.warm_up()
+            profiler.start()
+
         self.watchlist = STOCK_WATCHLIST
+        self.jobs = jobs or SCHEDULE_JOBS
+        self.use_queue = use_queue
+
+        # 任务在线程池中执行，长时间的开盘前分析不会推迟中午任务
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+        self._running_modes = set()
+        self._lock = threading.Lock()
+
         print(f"📊 监控股票池: {len(self.watchlist)} 只股票")
-        print(f"⏰ 推送时间: 每天 {DAILY_REPORT_TIME}")
-        
-    def daily_analysis_task(self):
+        for at_time, mode in self.jobs:
+            print(f"⏰ {ANALYSIS_MODES[mode][1]}: 每天 {at_time}")
+
+    def is_trading_day(self, day: date) -> bool:
+        """是否为交易日（节假日由交易日历判断）"""
+        return self.analysis_system.tushare_client.calendar.is_trading_day(day)
+
+    def daily_analysis_task(self, analysis_mode: str = 'standard', resume_run_id: str = None):
         """每日分析任务"""
+        mode_emoji, mode_text = ANALYSIS_MODES.get(analysis_mode, ANALYSIS_MODES['standard'])
         print("\n" + "="*80)
-        print(f"📅 执行每日分析任务 - {datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')}")
+        print(f"{mode_emoji} 执行{mode_text}任务 - {datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')}")
         print("="*80)
-        
+
         try:
-            # 批量分析
-            results = self.analysis_system.batch_analyze(self.watchlist)
-            
-            # 生成汇总报告
-            summary_file = self.analysis_system.report_generator.generate_summary_report(results)
-            
+            # 批量分析（汇总报告在批量分析中生成）
+            results = self.analysis_system.batch_analyze(self.watchlist, analysis_mode=analysis_mode,
+                                                         resume_run_id=resume_run_id,
+                                                         use_queue=self.use_queue)
+
             print("\n" + "="*80)
-            print(f"✅ 每日分析任务完成！")
+            print(f"✅ {mode_text}任务完成！")
             print(f"📊 分析股票: {len(results)} 只")
-            print(f"📄 汇总报告: {summary_file}")
             print("="*80 + "\n")
-            
+
             # 这里可以添加推送逻辑（邮件、微信、钉钉等）
-            self._send_notification(summary_file, results)
-            
+            self._send_notification(analysis_mode, results)
+
         except Exception as e:
-            print(f"\n❌ 每日分析任务失败: {e}")
+            print(f"\n❌ {mode_text}任务失败: {e}")
             import traceback
             traceback.print_exc()
-    
-    def _send_notification(self, summary_file: str, results: list):
+
+    def _submit(self, analysis_mode: str):
+        """由 schedule 触发，将任务提交到线程池"""
+        if not self.is_trading_day(datetime.now().date()):
+            print(f"\n💤 今日非交易日，跳过{ANALYSIS_MODES[analysis_mode][1]}")
+            return
+
+        with self._lock:
+            if analysis_mode in self._running_modes:
+                print(f"\n⚠️ 上一次{ANALYSIS_MODES[analysis_mode][1]}仍在执行，本次跳过")
+                return
+            self._running_modes.add(analysis_mode)
+
+        future = self.executor.submit(self.daily_analysis_task, analysis_mode)
+        future.add_done_callback(lambda _: self._finish(analysis_mode))
+
+    def _finish(self, analysis_mode: str):
+        with self._lock:
+            self._running_modes.discard(analysis_mode)
+
+    def _send_notification(self, analysis_mode: str, results: list):
         """发送通知（可扩展）"""
         print("\n📧 推送通知...")
-        print(f"   汇总报告: {summary_file}")
+        print(f"   分析类型: {ANALYSIS_MODES[analysis_mode][1]}")
         print(f"   分析完成: {len(results)} 只股票")
-        
+
         # TODO: 实现邮件推送
         # TODO: 实现企业微信推送
         # TODO: 实现钉钉推送
-        
+
         print("   ✅ 通知推送完成（当前为控制台输出）")
-    
-    def run_once_now(self):
+
+    def run_once_now(self, analysis_mode: str = 'standard'):
         """立即执行一次（用于测试）"""
         print("\n🧪 测试模式：立即执行一次分析任务")
-        self.daily_analysis_task()
-    
-    def start(self, test_mode: bool = False):
+        self.daily_analysis_task(analysis_mode)
+
+    def start(self, test_mode: bool = False, analysis_mode: str = 'standard', resume_run_id: str = None):
         """启动调度器"""
+        if self.dashboard is None:
+            self._run(test_mode, analysis_mode, resume_run_id)
+            return
+        self.dashboard.start(self.analysis_system)
+        try:
+            self._run(test_mode, analysis_mode, resume_run_id)
+        finally:
+            self.dashboard.stop()
+
+    def _run(self, test_mode: bool, analysis_mode: str, resume_run_id: str):
+        if resume_run_id:
+            # 先续跑被中断的任务，再进入正常调度
+            print(f"\n♻️ 续跑中断的任务: {resume_run_id}")
+            self.daily_analysis_task(analysis_mode, resume_run_id=resume_run_id)
+            if test_mode:
+                return
+
         if test_mode:
             # 测试模式：立即执行一次
-            self.run_once_now()
+            self.run_once_now(analysis_mode)
             return
-        
+
         # 正式模式：按时间调度
-        print(f"\n⏰ 调度器已启动，将在每天 {DAILY_REPORT_TIME} 执行分析")
+        print(f"\n⏰ 调度器已启动，共 {len(self.jobs)} 个定时任务")
         print("💡 提示: 按 Ctrl+C 停止调度器\n")
-        
-        # 设置定时任务
-        schedule.every().day.at(DAILY_REPORT_TIME).do(self.daily_analysis_task)
-        
-        # 显示下次执行时间
-        next_run = schedule.next_run()
-        if next_run:
-            print(f"📅 下次执行时间: {next_run.strftime('%Y年%m月%d日 %H:%M:%S')}\n")
-        
-        # 持续运行
+
+        # 设置定时任务，分析模式随任务显式传递
+        for at_time, mode in self.jobs:
+            schedule.every().day.at(at_time).do(self._submit, mode)
+
+        # 持续运行：精确休眠到下一次触发
         try:
             while True:
+                next_run = schedule.next_run()
+                if next_run:
+                    print(f"📅 下次执行时间: {next_run.strftime('%Y年%m月%d日 %H:%M:%S')}")
+                    if self.dashboard is not None:
+                        self.dashboard.note = f"下次执行 {next_run:%m-%d %H:%M}"
+                idle = schedule.idle_seconds()
+                if idle is not None and idle > 0:
+                    time.sleep(idle)
                 schedule.run_pending()
-                time.sleep(60)  # 每分钟检查一次
         except KeyboardInterrupt:
             print("\n\n⏹️ 调度器已停止")
+        finally:
+            schedule.clear()
+            self.executor.shutdown(wait=False, cancel_futures=True)
 
 
 def main():
     """主函数"""
     import argparse
-    
+
     parser = argparse.ArgumentParser(description='股票分析定时调度器')
     parser.add_argument('--test', action='store_true', help='测试模式：立即执行一次')
     parser.add_argument('--once', action='store_true', help='执行一次后退出（同 --test）')
-    
+    parser.add_argument('--mode', '-m', choices=list(ANALYSIS_MODES), default='standard',
+                        help='测试模式下使用的分析模式')
+    parser.add_argument('--resume', '-r', type=str, metavar='RUN_ID',
+                        help='启动前先续跑中断的批量分析')
+    parser.add_argument('--queue', action='store_true', default=BATCH_USE_QUEUE,
+                        help='通过持久化任务队列分发（配合 worker.py 多进程/多机执行）')
+    parser.add_argument('--profile', action='store_true',
+                        help='剖析各阶段的CPU/等待时间和内存分配，在报告旁写出火焰图数据和剖析报告')
+    parser.add_argument('--dashboard', action='store_true',
+                        help='显示实时看板，详细输出改写入 logs/runs/ 下的结构化日志')
+
     args = parser.parse_args()
-    
-    scheduler = DailyScheduler()
-    
+
+    scheduler = DailyScheduler(use_queue=args.queue, profile=args.profile, dashboard=args.dashboard)
+
     if args.test or args.once:
-        scheduler.start(test_mode=True)
+        scheduler.start(test_mode=True, analysis_mode=args.mode, resume_run_id=args.resume)
     else:
-        scheduler.start(test_mode=False)
+        scheduler.start(test_mode=False, resume_run_id=args.resume)
 
 
 if __name__ == "__main__":
     main()
-
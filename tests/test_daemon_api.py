@@ -0,0 +1,167 @@
+"""
+常驻分析服务接口测试
+在本机临时端口启动 DaemonRequestHandler，注入桩分析系统（不访问 Tushare / DeepSeek），
+验证同一交易时段内重复提交的合并与结果复用、force 重新分析，以及 /decision、/reports 接口
+"""
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daemon import AnalysisDaemon, DaemonRequestHandler
+
+REPORT = {'stock_code': '600519', 'date': '2026-10-19', 'time': '093000',
+          'json': 'reports/600519/2026-10-19/analysis_093000.json',
+          'markdown': 'reports/600519/2026-10-19/analysis_093000.md'}
+
+
+class StubSystem:
+    """桩分析系统：analyze_stock 阻塞到 release 被置位，便于观察排队/运行中的任务"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+        self.tushare_client = SimpleNamespace(calendar=SimpleNamespace(session_key=lambda: '20261019_am'))
+        self.report_generator = SimpleNamespace(
+            latest_report=lambda stock_code: {'decision': {'action': '持有'}, 'risk_assessment': {},
+                                              'analysis_time': '2026-10-19 09:30:00',
+                                              'report_file': REPORT['markdown']} if stock_code == '000858.SZ' else {},
+            list_reports=lambda stock_code=None, limit=50: [REPORT][:limit]
+            if stock_code in (None, '600519.SH') else [],
+        )
+
+    def analyze_stock(self, stock_code, analysis_mode='standard', run_label=None):
+        self.calls.append((stock_code, analysis_mode))
+        self.release.wait(10)
+        return SimpleNamespace(decision={'action': '买入', 'run': len(self.calls)}, risk_assessment={'level': '中'},
+                               report_file=f'reports/{stock_code}.md', duration_seconds=0.1)
+
+
+@pytest.fixture
+def api():
+    system = StubSystem()
+    daemon = AnalysisDaemon(system, max_workers=2)
+    handler = type('BoundHandler', (DaemonRequestHandler,), {'daemon': daemon})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    def call(path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(base + path, data=data, method='POST' if body is not None else 'GET',
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    yield system, call
+    system.release.set()
+    server.shutdown()
+    server.server_close()
+    daemon.shutdown()
+
+
+def wait_done(call, job_id):
+    for _ in range(200):
+        status, job = call(f'/jobs/{job_id}')
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"任务 {job_id} 未完成")
+
+
+def test_duplicate_submits_merge_then_return_cached(api):
+    system, call = api
+    status, first = call('/analyze', {'stock_code': '600519.SH'})
+    assert status == 202
+    status, second = call('/analyze', {'stock_code': '600519.SH'})
+    assert status == 202 and second['job_id'] == first['job_id'] and second['deduplicated']
+
+    # 两个工作线程都被占用时，第三只股票排队中，重复提交同样合并
+    call('/analyze', {'stock_code': '000858.SZ'})
+    _, queued = call('/analyze', {'stock_code': '601318.SH'})
+    status, again = call('/analyze', {'stock_code': '601318.SH'})
+    assert again['job_id'] == queued['job_id'] and again['status'] == 'queued' and again['deduplicated']
+
+    system.release.set()
+    job = wait_done(call, first['job_id'])
+    assert job['status'] == 'done' and job['finished_at']
+
+    status, third = call('/analyze', {'stock_code': '600519.SH'})
+    assert status == 200 and third['job_id'] == first['job_id'] and third['cached']
+    assert third['decision']['action'] == '买入'
+    assert system.calls.count(('600519.SH', 'standard')) == 1
+
+    # 不同分析模式是另一个任务
+    status, other = call('/analyze', {'stock_code': '600519.SH', 'analysis_mode': 'intraday'})
+    assert other['job_id'] != first['job_id']
+
+
+def test_force_starts_new_job(api):
+    system, call = api
+    system.release.set()
+    _, first = call('/analyze', {'stock_code': '600519.SH'})
+    wait_done(call, first['job_id'])
+
+    status, forced = call('/analyze', {'stock_code': '600519.SH', 'force': True})
+    assert status == 202 and forced['job_id'] != first['job_id']
+    job = wait_done(call, forced['job_id'])
+    assert job['decision']['run'] == 2
+    assert len(system.calls) == 2
+
+
+def test_decision_and_reports(api):
+    system, call = api
+    status, body = call('/decision/600519.SH')
+    assert status == 404
+
+    system.release.set()
+    _, job = call('/analyze', {'stock_code': '600519.SH'})
+    wait_done(call, job['job_id'])
+    status, decision = call('/decision/600519.SH')
+    assert status == 200 and decision['source'] == 'job'
+    assert decision['decision']['action'] == '买入' and decision['report_file'] == 'reports/600519.SH.md'
+
+    # 本进程没有任务时读取最新一份报告
+    status, decision = call('/decision/000858.SZ')
+    assert status == 200 and decision['source'] == 'report' and decision['decision'] == {'action': '持有'}
+
+    status, reports = call('/reports?stock=600519.SH&limit=5')
+    assert status == 200 and reports['reports'] == [REPORT]
+    assert call('/reports?limit=x')[0] == 400
+    assert call('/analyze', {'analysis_mode': 'standard'})[0] == 400
+
+
+def test_status_and_result_published_together(api):
+    """轮询方看到 done 时结果字段与 finished_at 已全部写入"""
+    system, call = api
+    _, job = call('/analyze', {'stock_code': '600519.SH'})
+    seen = []
+    stop = threading.Event()
+
+    def poll():
+        while not stop.is_set():
+            status, current = call(f"/jobs/{job['job_id']}")
+            seen.append(current)
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    time.sleep(0.05)
+    system.release.set()
+    wait_done(call, job['job_id'])
+    stop.set()
+    poller.join()
+    for current in seen:
+        if current['status'] == 'done':
+            assert 'finished_at' in current and 'decision' in current
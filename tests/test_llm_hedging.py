@@ -0,0 +1,159 @@
+"""
+多端点路由与对冲请求测试
+在本机启动两个 OpenAI 兼容的流式（SSE）桩服务器，验证对冲、关闭落后请求的连接、删失延迟样本、落后请求的估算计费和失败切换
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.llm_budget import RunBudget, UsageLedger
+from agents.llm_client import DeepSeekClient
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class StubServer:
+    """流式桩服务器：先等待 stall 秒（期间只发送 SSE 心跳注释），再每隔 interval 秒输出一段内容"""
+
+    def __init__(self, name: str, stall: float = 0.0, chunks: int = 5, interval: float = 0.02,
+                 fail: bool = False):
+        self.name, self.stall, self.chunks, self.interval, self.fail = name, stall, chunks, interval, fail
+        self.requests = 0
+        self.aborted_at = None  # 客户端断开连接的时刻
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.requests += 1
+                if server.fail:
+                    self.send_response(500)
+                    self.send_header('Content-Type', 'application/json')
+                    self.end_headers()
+                    self.wfile.write(b'{"error": {"message": "boom"}}')
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                try:
+                    deadline = time.monotonic() + server.stall
+                    while time.monotonic() < deadline:
+                        self.wfile.write(b": keep-alive\n\n")
+                        self.wfile.flush()
+                        time.sleep(0.05)
+                    for i in range(server.chunks):
+                        time.sleep(server.interval)
+                        self._send({"choices": [{"index": 0, "delta": {"content": f"{server.name}{i} "},
+                                                 "finish_reason": None}]}, body['model'])
+                    self._send({"choices": [], "usage": {"prompt_tokens": 100, "completion_tokens": 20,
+                                                         "total_tokens": 120}}, body['model'])
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    server.aborted_at = time.monotonic()
+
+            def _send(self, chunk, model):
+                chunk = {"id": "x", "object": "chat.completion.chunk", "created": 0, "model": model, **chunk}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def endpoint(self):
+        return {"name": self.name, "base_url": f"http://127.0.0.1:{self.httpd.server_port}/v1", "api_key": "k"}
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(*args, **kwargs):
+        server = StubServer(*args, **kwargs)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.close()
+
+
+def make_client(primary, backup, **kwargs):
+    client = DeepSeekClient('k', endpoints=[primary.endpoint, backup.endpoint], hedge_delay=0.3,
+                            min_hedge_delay=0.3, timeout=10, **kwargs)
+    client._pick = lambda exclude: next(e for e in client.endpoints if e not in exclude)  # 固定主端点
+    return client
+
+
+def test_hedge_closes_stalled_primary(servers):
+    """主请求在首个数据块前卡住：对冲请求胜出后立即关闭主请求的连接，不等到超时"""
+    primary, backup = servers('A', stall=5.0), servers('B')
+    client = make_client(primary, backup)
+
+    started = time.monotonic()
+    content = client.chat(MESSAGES)
+    assert content.startswith('B0')
+    assert time.monotonic() - started < 2
+
+    time.sleep(0.5)
+    assert primary.aborted_at is not None and primary.aborted_at - started < 2
+
+
+def test_cancelled_primary_recorded_as_censored_sample(servers):
+    """被取代的主请求按不短于 p95 的慢样本记录，成功率不变，p95 不会越对冲越低"""
+    primary, backup = servers('A', stall=5.0), servers('B')
+    client = make_client(primary, backup)
+    slow = client.endpoints[0]
+    slow.latencies.extend([0.3] * 10)  # 近期 p95 0.3 秒
+
+    before = slow.p95()
+    for _ in range(3):
+        client.chat(MESSAGES)
+    assert slow.p95() >= before
+    assert min(list(slow.latencies)[-3:]) >= before
+    assert slow.success_rate == 1.0
+
+
+def test_loser_usage_charged_as_estimate(servers, tmp_path):
+    """落后请求没有返回用量，按已收到的输出估算计入预算和台账"""
+    primary = servers('A', chunks=50, interval=0.05)  # 先输出一部分内容，再被对冲请求取代
+    backup = servers('B')
+    ledger = UsageLedger(str(tmp_path))
+    budget = RunBudget(pricing={'deepseek-chat': {'input': 2.0, 'output': 8.0}}, ledger=ledger)
+    client = make_client(primary, backup, budget=budget)
+
+    client.chat(MESSAGES, profile='news_triage')
+
+    entries = ledger.entries()
+    assert [e['endpoint'] for e in entries] == ['B', 'A']
+    hedge = entries[1]
+    assert hedge['estimated'] is True
+    assert hedge['prompt_tokens'] == 100 and hedge['completion_tokens'] > 0
+    assert budget.by_profile['news_triage']['calls'] == 2
+    assert budget.cost == pytest.approx(sum(e['cost'] for e in entries), abs=1e-5)
+
+
+def test_failover_to_healthy_endpoint(servers):
+    """端点返回错误时立即切换到其他端点"""
+    bad, good = servers('X', fail=True), servers('B')
+    client = make_client(bad, good)
+
+    assert client.chat(MESSAGES).startswith('B0')
+    assert bad.requests == 1 and good.requests == 1
+    assert client.endpoints[0].success_rate < 1.0
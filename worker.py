@@ -0,0 +1,203 @@
+"""
+队列工作进程
+从持久化任务队列领取单只股票分析任务，按该次运行的检查点执行并续写阶段结果；
+可在本机启动多个进程，也可在共享同一文件系统（检查点、报告、队列文件）的多台机器上同时运行。
+与进程内批量分析相同，有截止时间或超出LLM软预算时按剩余工作量对后续股票降级分析
+"""
+import multiprocessing
+import socket
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, Any, Optional
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config.config import QUEUE_DB_PATH, QUEUE_POLL_SECONDS, STOCK_ESTIMATE_SECONDS, MAX_DEBATE_ROUNDS
+from agents.llm_budget import BudgetExceeded, RunBudget, budget_scope, current_budget
+from data.batch_planner import DeadlinePlanner, DEPTH_LABELS
+from data.checkpoint import BatchCheckpoint
+from data.job_queue import JobQueue
+
+
+class QueueWorker:
+    """领取任务 → 分析 → 确认；执行期间后台线程定期续约"""
+
+    def __init__(self, analysis_system, queue: JobQueue, worker_id: str = None,
+                 poll_seconds: float = QUEUE_POLL_SECONDS):
+        self.system = analysis_system
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_seconds = poll_seconds
+        self._planners: Dict[str, DeadlinePlanner] = {}  # 运行ID → 降级决策（按本进程的实际耗时修正）
+        self._budgets: Dict[str, RunBudget] = {}  # 运行ID → 本进程内该运行的LLM预算
+
+    def run(self, run_id: Optional[str] = None, until_drained: bool = False,
+            exit_when_idle: bool = False) -> int:
+        """处理任务，返回本进程完成的任务数
+
+        until_drained: 只处理 run_id 的任务，直到该运行没有排队或执行中的任务（批量分析发起方使用）
+        exit_when_idle: 队列暂时为空时退出，否则持续轮询
+        """
+        processed = 0
+        while True:
+            job = self.queue.lease(self.worker_id, run_id)
+            if job is not None:
+                try:
+                    processed += self.process(job)
+                except BudgetExceeded as e:
+                    print(f"⛔ {e}，工作进程 {self.worker_id} 停止领取任务")
+                    return processed
+                continue
+
+            if until_drained:
+                status = self.queue.run_status(run_id)
+                if status['pending'] + status['leased'] == 0:
+                    return processed
+                print(f"⏳ 等待其他工作进程: 执行中 {status['leased']}，"
+                      f"已完成 {status['done']}，失败 {status['failed']}")
+            elif exit_when_idle:
+                return processed
+            time.sleep(self.poll_seconds)
+
+    def process(self, job: Dict[str, Any]) -> bool:
+        """执行一个任务，成功返回 True；失败时按尝试次数重新排队或标记失败"""
+        code = job['ts_code']
+        print(f"\n📦 [{self.worker_id}] 领取任务 {job['run_id']} / {code}（第 {job['attempts']} 次尝试）")
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job['id'], stop), daemon=True)
+        heartbeat.start()
+        try:
+            batch_checkpoint = BatchCheckpoint.load(job['run_id'])
+            if batch_checkpoint is None:
+                raise RuntimeError(f"未找到运行 {job['run_id']} 的检查点目录（是否未挂载共享存储？）")
+            checkpoint = batch_checkpoint.stock(code)
+            context = checkpoint.get('context') or {}
+            budget = self._budget(job['run_id'], batch_checkpoint.created_at[:10])
+            planner = self._planner(job['run_id'], context.get('deadline'))
+            depth = self._choose_depth(job, planner, budget)
+            resumed = bool(checkpoint.stages)
+            planner.start(code, depth)
+            completed = False
+            try:
+                with budget_scope(budget) if budget is not None else nullcontext():
+                    self.system.analyze_stock(code, analysis_mode=job['analysis_mode'], checkpoint=checkpoint,
+                                              sector_context=context.get('sector_context'),
+                                              portfolio_risk=context.get('portfolio_risk'),
+                                              debate_rounds=planner.debate_rounds(depth))
+                completed = True
+            finally:
+                planner.finish(code, record=completed and not resumed)
+        except (KeyboardInterrupt, BudgetExceeded):
+            # 放回队列（不计尝试次数），预算恢复或次日可继续处理
+            self.queue.release(job['id'], self.worker_id)
+            raise
+        except Exception as e:
+            print(f"❌ 任务 {code} 失败: {e}")
+            self.queue.fail(job['id'], self.worker_id, str(e))
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if not self.queue.complete(job['id'], self.worker_id):
+            print(f"⚠️ 任务 {code} 的租约已被其他进程接管（结果已写入检查点，不影响汇总）")
+        return True
+
+    def _planner(self, run_id: str, deadline: Optional[str]) -> DeadlinePlanner:
+        if run_id not in self._planners:
+            deadline = datetime.fromisoformat(deadline) if deadline else None
+            if deadline is not None and deadline <= datetime.now():
+                deadline = None  # 续跑已过截止时间的运行时不做降级
+            self._planners[run_id] = DeadlinePlanner(deadline, 1, STOCK_ESTIMATE_SECONDS, MAX_DEBATE_ROUNDS)
+        return self._planners[run_id]
+
+    def _budget(self, run_id: str, since: str) -> Optional[RunBudget]:
+        """该运行的预算：发起批量分析的进程沿用 batch_analyze 的预算，其他工作进程按运行各自创建"""
+        active = current_budget.get()
+        if active is not None and active.label == run_id:
+            return active
+        default = getattr(self.system, 'run_budget', None)
+        if default is None:
+            return None
+        if run_id not in self._budgets:
+            self._budgets[run_id] = default.spawn(run_id, since)
+        return self._budgets[run_id]
+
+    def _choose_depth(self, job: Dict[str, Any], planner: DeadlinePlanner,
+                      budget: Optional[RunBudget] = None) -> str:
+        """按运行的LLM软预算和截止时间选择分析深度；剩余工作量取队列中排队和执行中的任务（含其他进程）"""
+        over_budget = budget.exhausted if budget is not None else None
+        if over_budget:
+            print(f"💸 {over_budget}，{job['ts_code']} 仅做筛查")
+            return 'screening'
+        if planner.deadline is None:
+            return 'full'
+        status = self.queue.run_status(job['run_id'])
+        # 本任务已被领取：排队数不含本只，执行中的任务数含本只；执行中的任务数也近似当前并发的工作进程数
+        depth = planner.choose_depth(status['pending'] + 1, workers=status['leased'],
+                                     in_flight=status['leased'] - 1)
+        if depth != 'full':
+            print(f"⏰ 截止时间 {planner.deadline:%H:%M} 前来不及完整分析，{job['ts_code']} [{DEPTH_LABELS[depth]}]")
+        return depth
+
+    def _heartbeat(self, job_id: int, stop: threading.Event):
+        interval = max(self.queue.visibility_timeout / 3, 1)
+        while not stop.wait(interval):
+            if not self.queue.heartbeat(job_id, self.worker_id):
+                print(f"⚠️ 任务 {job_id} 续约失败，租约可能已过期")
+                return
+
+
+def _worker_process(index: int, queue_path: str, run_id: Optional[str], exit_when_idle: bool):
+    """子进程入口：各自创建分析系统（客户端和缓存互不共享）"""
+    from main import StockAnalysisSystem
+
+    system = StockAnalysisSystem()
+    worker = QueueWorker(system, JobQueue(queue_path),
+                         worker_id=f"{socket.gethostname()}:{os.getpid()}:{index}")
+    try:
+        processed = worker.run(run_id=run_id, exit_when_idle=exit_when_idle)
+        print(f"👋 工作进程 {worker.worker_id} 退出，完成 {processed} 个任务")
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    """主函数"""
+    import argparse
+    from config.config import validate_config
+
+    parser = argparse.ArgumentParser(description='批量分析队列工作进程')
+    parser.add_argument('--processes', '-p', type=int, default=1, help='本机启动的工作进程数')
+    parser.add_argument('--queue', default=QUEUE_DB_PATH, help=f'队列文件（默认 {QUEUE_DB_PATH}）')
+    parser.add_argument('--run', metavar='RUN_ID', help='只处理指定运行的任务')
+    parser.add_argument('--exit-when-idle', action='store_true', help='队列为空时退出')
+
+    args = parser.parse_args()
+
+    validate_config()
+    print(f"🧵 启动 {args.processes} 个工作进程，队列: {args.queue}")
+    processes = [
+        multiprocessing.Process(target=_worker_process, name=f'worker-{i}',
+                                args=(i, args.queue, args.run, args.exit_when_idle))
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n\n⏹️ 工作进程已停止（执行中的任务已放回队列）")
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()